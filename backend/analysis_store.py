@@ -0,0 +1,80 @@
+"""
+Persisted analyses in the project folder
+
+A full /analyze result is saved next to the document as
+projects/{username}/{document_name}/_analysis_{hash}.json, where the hash
+covers the analyzed text and the custom prompt. /analyze returns a saved
+result without a model call when both match, so reopening a project shows
+its analysis at once.
+
+With PRECOMPUTE_ANALYSIS on (off by default: it spends a model call on
+every upload), the analysis with the default prompt is computed in the
+background after an upload, usually finishing before the user clicks
+analyze; a click while it is still running joins the same call through
+single_flight. Results saved that way carry "precomputed": true.
+"""
+import hashlib
+import json
+import os
+
+from log_utils import get_logger
+from storage import get_storage, join_key
+
+logger = get_logger("analysis_store")
+
+PRECOMPUTE_ANALYSIS = os.getenv("PRECOMPUTE_ANALYSIS", "false").lower() in ("1", "true", "yes")
+# Saved analyses kept per document (one per prompt and text version), newest first
+ANALYSIS_STORE_MAX_FILES = int(os.getenv("ANALYSIS_STORE_MAX_FILES", "5"))
+FILE_PREFIX = "_analysis_"
+
+
+def analysis_hash(text, custom_prompt=""):
+    """Identity of an analysis: the text and the prompt it was made with"""
+    return hashlib.sha256(json.dumps([text, custom_prompt or ""], ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def analysis_key(username, document_name, text, custom_prompt=""):
+    return join_key("projects", username, document_name, f"{FILE_PREFIX}{analysis_hash(text, custom_prompt)}.json")
+
+
+def load(username, document_name, text, custom_prompt=""):
+    """
+    The saved analysis of text with custom_prompt
+
+    Returns:
+        dict or None when there is none (or it is unreadable)
+    """
+    if not document_name:
+        return None
+    try:
+        return json.loads(get_storage().read_text(analysis_key(username, document_name, text, custom_prompt)))
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning("saved_analysis_invalid", extra={"username": username, "document_name": document_name, "error": str(e)})
+        return None
+
+
+def save(username, document_name, text, custom_prompt, result):
+    """
+    Save an analysis result, dropping the oldest saved analyses beyond ANALYSIS_STORE_MAX_FILES
+
+    Returns:
+        str: The stored key, or None when the document has no project folder
+    """
+    storage = get_storage()
+    folder = join_key("projects", username, document_name)
+    if not storage.dir_exists(folder):
+        return None
+    stored_key = storage.write_text(
+        analysis_key(username, document_name, text, custom_prompt), json.dumps(result, ensure_ascii=False)
+    )
+    _, files = storage.list_dir(folder)
+    saved = sorted(
+        (info for info in files if info["name"].startswith(FILE_PREFIX)),
+        key=lambda info: info["modified"],
+        reverse=True,
+    )
+    for info in saved[ANALYSIS_STORE_MAX_FILES:]:
+        storage.delete(f"{folder}/{info['name']}")
+    return stored_key
@@ -0,0 +1,255 @@
+"""
+Anchoring model issues to character offsets
+
+The model reports each issue as a snippet of the text (original_text). The
+snippets often differ from the document in case, in whitespace (line
+breaks from PDF extraction, double spaces) or in typographic quotes and
+dashes, and the same phrase can occur many times.
+
+TextIndex normalizes the document once: quotes and dashes are folded to
+ASCII, the text is lowercased and whitespace runs become one space. A
+segment table maps normalized offsets back to the original text. A word
+index (normalized word -> sorted offsets) is built on first need; a
+snippet is then looked up by its rarest whole word and verified at each
+of that word's occurrences, so each lookup costs a few comparisons
+instead of a scan of the document.
+
+Issues are anchored in the order the model reported them: each snippet
+resolves to its first unused occurrence after the previous issue,
+wrapping around to the start. A snippet with no exact occurrence is
+matched approximately (difflib) around the occurrences of its rarest
+words. Anchored issues get the document's text as original_text, so a
+later find-and-replace in the editor works.
+"""
+import bisect
+import difflib
+import re
+
+# Rewritten snippets below this share of matching characters are not anchored
+ANCHOR_FUZZY_MIN_RATIO = 0.8
+# Occurrences of a word tried per fuzzy lookup
+ANCHOR_FUZZY_CANDIDATES = 20
+# Below this many characters scanned (snippets x document length) plain find is cheaper than the index
+ANCHOR_SCAN_BUDGET = 20_000_000
+# Shortest matching block kept at the edges of a fuzzy match
+_MIN_EDGE_BLOCK = 3
+
+# One-to-one translations keep offsets valid
+_FOLD = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"',
+    "\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2013": "-", "\u2014": "-",
+})
+# Whitespace that changes under normalization: runs, and single characters other than a space
+_COLLAPSE = re.compile(r"\s{2,}|[^\S ]")
+_SPACES = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _lower(text):
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters lowercase to two ("İ"); keep those as they are
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+def normalize(snippet):
+    """The form of a snippet that is searched in TextIndex.normalized"""
+    return _SPACES.sub(" ", _lower(snippet.translate(_FOLD))).strip()
+
+
+class TextIndex:
+    """A document normalized for snippet lookup, with a map back to the original offsets"""
+
+    def __init__(self, text):
+        self.text = text
+        folded = _lower(text.translate(_FOLD))
+        parts = []
+        # Segment k starts at _norm_starts[k] in the normalized text and _orig_starts[k] in the original
+        self._norm_starts = [0]
+        self._orig_starts = [0]
+        position = 0
+        normalized_length = 0
+        for match in _COLLAPSE.finditer(folded):
+            parts.append(folded[position:match.start()])
+            parts.append(" ")
+            normalized_length += match.start() - position + 1
+            position = match.end()
+            self._norm_starts.append(normalized_length)
+            self._orig_starts.append(position)
+        parts.append(folded[position:])
+        self.normalized = "".join(parts)
+        self._words = None
+
+    def original_offset(self, offset):
+        """Original offset of a normalized offset"""
+        segment = bisect.bisect_right(self._norm_starts, offset) - 1
+        return self._orig_starts[segment] + offset - self._norm_starts[segment]
+
+    def original_span(self, start, end):
+        """Original (start, end) of a normalized span that does not end in whitespace"""
+        return self.original_offset(start), self.original_offset(end - 1) + 1
+
+    @property
+    def words(self):
+        """Word index: normalized word -> sorted normalized offsets (built on first use)"""
+        if self._words is None:
+            words = {}
+            for match in _WORD.finditer(self.normalized):
+                words.setdefault(match.group(), []).append(match.start())
+            self._words = words
+        return self._words
+
+    def _anchor_word(self, needle):
+        """The rarest whole word of needle, with its offset in needle and its occurrences"""
+        matches = list(_WORD.finditer(needle))
+        # Words cut off at the snippet's edges are not whole words of the document
+        whole = [
+            match for match in matches
+            if (match.start() > 0 or not needle[:1].isalnum()) and (match.end() < len(needle) or not needle[-1:].isalnum())
+        ] or matches[1:-1]
+        best = None
+        for match in whole:
+            positions = self.words.get(match.group(), ())
+            if best is None or len(positions) < len(best[1]):
+                best = (match.start(), positions)
+        return best
+
+    def occurrences(self, needle, use_index=True):
+        """
+        Normalized offsets where needle occurs, in document order
+
+        Args:
+            needle (str): A normalize()d snippet
+            use_index (bool): Look up through the word index instead of scanning
+        """
+        anchor = self._anchor_word(needle) if use_index else None
+        if anchor is None:
+            start = self.normalized.find(needle)
+            while start != -1:
+                yield start
+                start = self.normalized.find(needle, start + 1)
+            return
+        offset, positions = anchor
+        for position in positions:
+            start = position - offset
+            if start >= 0 and self.normalized.startswith(needle, start):
+                yield start
+
+    def fuzzy(self, needle, cursor=0, accept=None):
+        """
+        Best approximate occurrence of needle
+
+        Args:
+            needle (str): A normalize()d snippet
+            cursor (int): Normalized offset; at equal similarity a match after it wins
+            accept (callable): Optional filter on the normalized (start, end)
+
+        Returns:
+            tuple: Normalized (start, end) or None
+        """
+        if not needle:
+            return None
+        tried = set()
+        slack = len(needle) // 4 + 5
+        best = None
+        # Candidate windows around the occurrences of the needle's rarest words
+        words = sorted(
+            (
+                (match.start(), positions) for match in _WORD.finditer(needle)
+                for positions in [self.words.get(match.group())] if positions
+            ),
+            key=lambda item: len(item[1]),
+        )
+        for offset, positions in words[:3]:
+            # Occurrences from the cursor on, then from the start
+            after = bisect.bisect_left(positions, cursor)
+            candidates = positions[after:after + ANCHOR_FUZZY_CANDIDATES]
+            candidates += positions[:ANCHOR_FUZZY_CANDIDATES - len(candidates)]
+            for position in candidates:
+                window_start = max(0, position - offset - slack)
+                if window_start in tried:
+                    continue
+                tried.add(window_start)
+                window = self.normalized[window_start:position - offset + len(needle) + slack]
+                matcher = difflib.SequenceMatcher(None, needle, window, autojunk=False)
+                blocks = [block for block in matcher.get_matching_blocks() if block.size]
+                while len(blocks) > 1 and blocks[0].size < _MIN_EDGE_BLOCK:
+                    blocks.pop(0)
+                while len(blocks) > 1 and blocks[-1].size < _MIN_EDGE_BLOCK:
+                    blocks.pop()
+                if not blocks:
+                    continue
+                ratio = sum(block.size for block in blocks) / len(needle)
+                start = window_start + blocks[0].b
+                end = window_start + blocks[-1].b + blocks[-1].size
+                if ratio < ANCHOR_FUZZY_MIN_RATIO or not 0.5 * len(needle) <= end - start <= 1.5 * len(needle):
+                    continue
+                if accept is not None and not accept(start, end):
+                    continue
+                rank = (ratio, start >= cursor, -start)
+                if best is None or rank > best[0]:
+                    best = (rank, start, end)
+        return best[1:] if best else None
+
+
+def anchor_issues(text, issues, ranges=None, index=None):
+    """
+    Set start/end on issues that have none, keeping the order in which they were reported
+
+    Args:
+        text (str): The analyzed text
+        issues (list): Structured issues; located ones are left alone
+        ranges (list): Optional sorted (start, end) original spans matches must fall in
+        index (TextIndex): Optional prebuilt index of text
+
+    Returns:
+        list: The same issues, with offsets filled in where the snippet was found.
+            original_text becomes the document's text; approximate matches get anchor "fuzzy".
+    """
+    pending = [issue for issue in issues if issue.get("start") is None and issue.get("original_text")]
+    if not pending:
+        return issues
+    index = index or TextIndex(text)
+    use_index = len(pending) * len(text) > ANCHOR_SCAN_BUDGET
+    range_starts = [start for start, _ in ranges] if ranges else None
+
+    def allowed(start, end):
+        if ranges is None:
+            return True
+        start, end = index.original_span(start, end)
+        position = bisect.bisect_right(range_starts, start) - 1
+        return position >= 0 and end <= ranges[position][1]
+
+    cursor = 0
+    used = set()
+    for issue in pending:
+        needle = normalize(issue["original_text"])
+        if not needle:
+            continue
+        span = None
+        first_unused = None
+        for start in index.occurrences(needle, use_index):
+            if (start, needle) in used or not allowed(start, start + len(needle)):
+                continue
+            if start >= cursor:
+                span = (start, start + len(needle))
+                break
+            if first_unused is None:
+                first_unused = (start, start + len(needle))
+        span = span or first_unused
+        fuzzy = False
+        if span is None:
+            span = index.fuzzy(needle, cursor, allowed)
+            fuzzy = span is not None
+        if span is None:
+            continue
+        used.add((span[0], needle))
+        cursor = span[1]
+        issue["start"], issue["end"] = index.original_span(*span)
+        # The document's own text, so a find-and-replace in the editor matches it
+        issue["original_text"] = text[issue["start"]:issue["end"]]
+        if fuzzy:
+            issue["anchor"] = "fuzzy"
+    return issues
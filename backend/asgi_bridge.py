@@ -0,0 +1,187 @@
+"""
+Serve an ASGI application (the FastAPI app) from a WSGI server
+
+All requests are dispatched onto one persistent event loop, run by a
+daemon thread shared by every WSGI worker thread, so the async routes,
+connection pools and caches of the FastAPI app behave as they do under
+uvicorn.
+
+The WSGI response is returned as soon as the application sends its last
+body chunk; the application coroutine keeps running on the loop, so
+Starlette BackgroundTasks (e.g. the analysis warm-up after an upload) do
+not hold up the response. Body chunks are handed to the WSGI server
+through a queue as they are sent, so StreamingResponse stages (cascade
+NDJSON) reach the client one at a time, as far as the WSGI server flushes
+them. On platforms that freeze the process after the response (Lambda),
+background tasks only run until then.
+"""
+import asyncio
+import queue
+import sys
+import threading
+from http import HTTPStatus
+
+
+class _LoopRunner:
+    """An event loop running forever in a daemon thread"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="asgi-bridge-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the loop without waiting for it"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def shared_runner():
+    """The process-wide loop runner, started on first use"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = _LoopRunner()
+    return _runner
+
+
+def build_scope(environ):
+    """Translate a WSGI environ into an ASGI HTTP scope"""
+    headers = []
+    for key, value in environ.items():
+        if key.startswith("HTTP_"):
+            name = key[5:].replace("_", "-").lower()
+        elif key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            if not value:
+                continue
+            name = key.replace("_", "-").lower()
+        else:
+            continue
+        headers.append((name.encode("latin-1"), value.encode("latin-1")))
+
+    # PEP 3333 passes the path as latin-1 decoded bytes
+    raw_path = environ.get("PATH_INFO", "").encode("latin-1")
+    server_port = environ.get("SERVER_PORT") or "80"
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": environ.get("SERVER_PROTOCOL", "HTTP/1.1").split("/")[-1],
+        "method": environ["REQUEST_METHOD"],
+        "scheme": environ.get("wsgi.url_scheme", "http"),
+        "path": raw_path.decode("utf-8", "replace"),
+        "raw_path": raw_path,
+        "query_string": environ.get("QUERY_STRING", "").encode("latin-1"),
+        "root_path": environ.get("SCRIPT_NAME", ""),
+        "headers": headers,
+        "server": (environ.get("SERVER_NAME", "localhost"), int(server_port)),
+        "client": (environ.get("REMOTE_ADDR", ""), int(environ.get("REMOTE_PORT") or 0)),
+    }
+
+
+def read_body(environ):
+    """Read the full request body from wsgi.input"""
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    stream = environ.get("wsgi.input")
+    if stream is None:
+        return b""
+    if length > 0:
+        return stream.read(length)
+    # Chunked uploads have no Content-Length; servers that support them end the stream
+    if environ.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked" or environ.get("wsgi.input_terminated"):
+        return stream.read()
+    return b""
+
+
+class ASGIWSGIBridge:
+    """WSGI callable that dispatches requests into an ASGI application"""
+
+    def __init__(self, asgi_app):
+        self.asgi_app = asgi_app
+
+    async def _handle(self, scope, body, messages, state):
+        """Run the app, putting ("start", status, headers), ("body", chunk, more) and ("end", exc_info) on messages"""
+        # Created on the loop's thread (Python < 3.10 binds events to the current loop)
+        response_complete = state["response_complete"] = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Nothing more to read; report a disconnect once the response is done
+            await response_complete.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                messages.put(("start", message["status"], message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                more_body = message.get("more_body", False)
+                messages.put(("body", message.get("body", b""), more_body))
+                if not more_body:
+                    response_complete.set()
+
+        exc_info = None
+        try:
+            # Returns after background tasks; the WSGI side stopped waiting at the last body chunk
+            await self.asgi_app(scope, receive, send)
+        except Exception:
+            exc_info = sys.exc_info()
+        finally:
+            response_complete.set()
+            messages.put(("end", exc_info))
+
+    def __call__(self, environ, start_response):
+        scope = build_scope(environ)
+        body = read_body(environ)
+        runner = shared_runner()
+        messages = queue.Queue()
+        state = {}
+        runner.submit(self._handle(scope, body, messages, state))
+
+        message = messages.get()
+        if message[0] != "start":
+            start_response(
+                "500 Internal Server Error",
+                [("Content-Type", "application/json")],
+                message[1] if message[0] == "end" else None,
+            )
+            return [b'{"detail":"Internal Server Error"}']
+
+        _, status, headers = message
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        start_response(
+            f"{status} {reason}".strip(),
+            [(name.decode("latin-1"), value.decode("latin-1")) for name, value in headers],
+        )
+        return self._body(messages, runner, state)
+
+    def _body(self, messages, runner, state):
+        try:
+            while True:
+                message = messages.get()
+                if message[0] != "body":
+                    # The app ended (or failed) without a final chunk
+                    return
+                if message[1]:
+                    yield message[1]
+                if not message[2]:
+                    return
+        finally:
+            # Client gone or response done: let the app see the disconnect
+            runner.loop.call_soon_threadsafe(state["response_complete"].set)
@@ -0,0 +1,100 @@
+"""
+Benchmark JSON serialization and response compression on large payloads
+
+Builds /analyze- and /upload-pdf-shaped responses for multi-MB documents and
+compares the stdlib encoder with orjson, and raw vs gzip/brotli transfer
+sizes and estimated transfer time on a slow link.
+
+Usage:
+    python bench_responses.py --sizes 1 4 16 --link-mbps 2
+"""
+import argparse
+import json
+import random
+import time
+
+import orjson
+
+from response_compression import BROTLI_SUPPORT, compress_body
+
+WORDS = (
+    "whereas the party hereinafter referred to as licensor agrees pursuant to "
+    "section indemnify hold harmless against all claims damages liabilities "
+    "notwithstanding anything to the contrary herein contained shall"
+).split()
+
+
+def make_text(size_mb):
+    """Generate pseudo-legal text of roughly size_mb megabytes"""
+    rng = random.Random(42)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    length = 0
+    while length < target:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + ". "
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)
+
+
+def make_analyze_payload(text):
+    """Build a response shaped like /analyze, with highlighted spans and issues"""
+    span = "<span style='background-color: #fff3cd; color: #856404;' title='Style issue' data-issue-index='{}'>shall</span>"
+    highlighted = text
+    for index in range(0, 200):
+        highlighted = highlighted.replace(" shall ", " " + span.format(index) + " ", 1)
+    issues = [
+        f"Style: shall → must | Use mandatory language consistently | Appeal: clearer obligations {index}"
+        for index in range(2000)
+    ]
+    return {
+        "highlighted_text": highlighted,
+        "issues_found": issues,
+        "total_issues": len(issues),
+        "contextual_insights": ["🔄 Structure: group related clauses → easier review"] * 20,
+        "strategic_recommendations": ["🎯 Legal Strength: define all capitalised terms"] * 20,
+    }
+
+
+def timed(fn, repeat):
+    """Return the best wall time of fn() over repeat runs, and its result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes, link_mbps, repeat):
+    bytes_per_second = link_mbps * 1_000_000 / 8
+    encodings = ["gzip"] + (["br"] if BROTLI_SUPPORT else [])
+    for size_mb in sizes:
+        text = make_text(size_mb)
+        for name, payload in (("analyze", make_analyze_payload(text)), ("upload-pdf", {"text": text, "filename": "contract.pdf"})):
+            json_time, json_body = timed(lambda: json.dumps(payload).encode("utf-8"), repeat)
+            orjson_time, orjson_body = timed(lambda: orjson.dumps(payload), repeat)
+            print(f"\n{name} @ {size_mb} MB text")
+            print(f"  json.dumps   {json_time * 1000:8.1f} ms  {len(json_body) / 1e6:7.2f} MB  transfer {len(json_body) / bytes_per_second:7.2f} s")
+            print(f"  orjson.dumps {orjson_time * 1000:8.1f} ms  {len(orjson_body) / 1e6:7.2f} MB  ({json_time / orjson_time:.1f}x faster)")
+            for encoding in encodings:
+                compress_time, compressed = timed(lambda: compress_body(orjson_body, encoding), repeat)
+                total = orjson_time + compress_time + len(compressed) / bytes_per_second
+                print(
+                    f"  orjson+{encoding:<5} {compress_time * 1000:8.1f} ms  {len(compressed) / 1e6:7.2f} MB  "
+                    f"transfer {len(compressed) / bytes_per_second:7.2f} s  total {total:7.2f} s"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 4, 16], help="Document sizes in MB")
+    parser.add_argument("--link-mbps", type=float, default=2.0, help="Client link speed in Mbit/s")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+    run(args.sizes, args.link_mbps, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
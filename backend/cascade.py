@@ -0,0 +1,40 @@
+"""
+Cascade analysis: rule engine first, Mistral only where it is needed
+
+The rule engine runs over the whole document in milliseconds. Paragraphs
+with word-level rule findings (spelling, rule packs, repeats, learned
+corrections) are the ones likely to need an editor, so only those are sent
+to the model; clean paragraphs cost no tokens. Sentence-level findings
+(long sentences, passive voice) don't count: nearly every paragraph has
+one. Paragraphs the model already checked for this document (same content)
+are not sent again. Rule and model findings are merged like every other
+analysis, by suggestion_merge.merge_suggestions.
+"""
+import bisect
+import os
+
+# Paragraphs with fewer word-level rule findings than this are not sent to the model
+CASCADE_MIN_FINDINGS = int(os.getenv("CASCADE_MIN_FINDINGS", "1"))
+
+
+def flag_paragraphs(paragraphs, issues, min_findings=CASCADE_MIN_FINDINGS):
+    """
+    Pick the paragraphs worth a model call
+
+    Args:
+        paragraphs (list): Paragraph objects from incremental_analysis.split_paragraphs
+        issues (list): Rule findings with absolute offsets
+
+    Returns:
+        list: Indices of paragraphs with at least min_findings word-level
+            findings (ones with a suggested_text), in document order
+    """
+    starts = [paragraph.start for paragraph in paragraphs]
+    counts = [0] * len(paragraphs)
+    for issue in issues:
+        if issue.get("start") is None or not issue.get("suggested_text"):
+            continue
+        index = bisect.bisect_right(starts, issue["start"]) - 1
+        if index >= 0 and issue["start"] < paragraphs[index].end:
+            counts[index] += 1
+    return [index for index, count in enumerate(counts) if count >= min_findings]
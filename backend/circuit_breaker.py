@@ -0,0 +1,150 @@
+"""
+Circuit breaker for upstream LLM calls
+
+The breaker keeps a rolling window of recent call outcomes. Calls slower than
+a threshold count as failures too, because a degraded upstream usually gets
+slow before it starts returning errors. When the failure rate crosses the
+threshold the circuit opens and callers fail immediately with
+CircuitOpenError. After a cool-down the circuit is half-open. A limited
+number of trial calls go through: one success closes the circuit and one
+failure opens it again.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import counter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_TRANSITIONS_TOTAL = counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes by breaker and new state",
+)
+BREAKER_REJECTED_TOTAL = counter(
+    "circuit_breaker_rejected_total",
+    "Calls rejected by an open circuit breaker",
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency based circuit breaker
+
+    Args:
+        name (str): Breaker name, used in errors and metrics
+        window_seconds (float): Length of the rolling outcome window
+        min_calls (int): Calls needed in the window before the breaker can open
+        failure_rate (float): Failure fraction (0-1) that opens the circuit
+        slow_call_seconds (float): Calls slower than this count as failures
+        open_seconds (float): How long the circuit stays open before probing
+        half_open_calls (int): Concurrent trial calls allowed while half-open
+    """
+
+    def __init__(self, name, window_seconds=60.0, min_calls=10, failure_rate=0.5,
+                 slow_call_seconds=30.0, open_seconds=30.0, half_open_calls=1):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            return self._state
+
+    def _set_state(self, state, now):
+        self._state = state
+        if state == OPEN:
+            self._opened_at = now
+        if state != HALF_OPEN:
+            self._trials = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        BREAKER_TRANSITIONS_TOTAL.inc(breaker=self.name, state=state)
+
+    def _refresh_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN, now)
+
+    def before_call(self):
+        """Reserve a call slot, raising CircuitOpenError if the upstream should not be called"""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_state(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            retry_after = max(0.0, self.open_seconds - (now - self._opened_at)) if self._state == OPEN else 1.0
+        BREAKER_REJECTED_TOTAL.inc(breaker=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self, duration):
+        """Record a completed call; slow calls count as failures"""
+        if duration >= self.slow_call_seconds:
+            self.record_failure()
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._set_state(CLOSED, now)
+            elif self._state == CLOSED:
+                self._add_outcome(now, False)
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if the failure rate is too high"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._set_state(OPEN, now)
+                return
+            if self._state == OPEN:
+                return
+            self._add_outcome(now, True)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._set_state(OPEN, now)
+
+    def release(self):
+        """Give back a reserved slot for a call whose outcome says nothing about upstream health"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def _add_outcome(self, now, failed):
+        self._outcomes.append((now, failed))
+        cutoff = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+
+mistral_breaker = CircuitBreaker(
+    "mistral",
+    window_seconds=float(os.getenv("LLM_BREAKER_WINDOW", "60")),
+    min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+    failure_rate=float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL", "30")),
+    open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+)
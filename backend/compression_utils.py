@@ -0,0 +1,121 @@
+"""
+Transparent compression for text artifacts in storage
+
+Extracted text, activity logs, change logs and transcript files are written
+through the storage text helpers, which use these codecs. The codec is
+selected with the STORAGE_COMPRESSION environment variable ("none", "gzip" or
+"zstd"); readers detect the codec from the key suffix, so plain and compressed
+files can live side by side while a project is being migrated.
+"""
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    ZSTD_SUPPORT = False
+
+CODEC_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# Suffixes of the artifacts that are eligible for compression
+COMPRESSIBLE_SUFFIXES = (
+    "_extracted.txt",
+    "_activity.log",
+    "_changes.txt",
+    "_metadata.json",
+)
+
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "none").lower()
+COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "6"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+if STORAGE_COMPRESSION == "zstd" and not ZSTD_SUPPORT:
+    from log_utils import get_logger
+    get_logger("storage").warning("zstd_unavailable", extra={"fallback": "gzip"})
+
+
+def get_codec(codec=None):
+    """
+    Resolve the codec to use for new files
+
+    Args:
+        codec (str): Explicit codec name, defaults to STORAGE_COMPRESSION
+
+    Returns:
+        str: "none", "gzip" or "zstd"
+    """
+    codec = (codec or STORAGE_COMPRESSION).lower()
+    if codec == "zstd" and not ZSTD_SUPPORT:
+        return "gzip"
+    if codec not in CODEC_EXTENSIONS:
+        return "none"
+    return codec
+
+
+def codec_from_name(filename):
+    """Detect the codec of a stored file from its suffix"""
+    for codec, extension in CODEC_EXTENSIONS.items():
+        if filename.endswith(extension):
+            return codec
+    return "none"
+
+
+def logical_name(filename):
+    """Strip the compression suffix so callers see the original artifact name"""
+    extension = CODEC_EXTENSIONS.get(codec_from_name(filename))
+    if extension:
+        return filename[:-len(extension)]
+    return filename
+
+
+def is_compressible(filename):
+    """Check whether a file is one of the text artifacts we compress"""
+    return logical_name(filename).endswith(COMPRESSIBLE_SUFFIXES)
+
+
+def stored_name(name, codec=None):
+    """Return the stored name for a logical name written with the given codec"""
+    extension = CODEC_EXTENSIONS.get(get_codec(codec))
+    return name + extension if extension else name
+
+
+def variant_names(name):
+    """All stored names a logical name may have, plain first"""
+    return [name] + [name + extension for extension in CODEC_EXTENSIONS.values()]
+
+
+def compress_bytes(data, codec):
+    """Compress a byte string as one self-contained gzip member or zstd frame"""
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data)
+    return data
+
+
+def decompress_bytes(data, codec):
+    """Decompress a byte string, including concatenated members/frames"""
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+    return data
+
+
+def wrap_reader(fileobj, codec):
+    """
+    Wrap a binary file object in a streaming decompressor
+
+    The caller stays responsible for closing the underlying file object.
+    """
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+    return fileobj
@@ -0,0 +1,333 @@
+"""
+Readability and sentence-structure statistics
+
+compute_stats() tokenizes a document once and returns per-sentence and
+per-paragraph metrics: word and syllable counts, complex (3+ syllable)
+words, passive-voice flags and long-sentence outliers, plus Flesch reading
+ease, Flesch-Kincaid grade and Gunning fog scores.
+
+With NumPy installed the text is classified character by character as an
+array, and all counts are array operations, so a book-length filing takes
+milliseconds. Without NumPy the same metrics are computed with regexes and
+plain lists.
+"""
+import bisect
+import os
+import re
+
+from incremental_analysis import split_paragraphs
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+LONG_SENTENCE_WORDS = int(os.getenv("LONG_SENTENCE_WORDS", "40"))
+# Sentences this many standard deviations above the document's mean length are outliers too
+LONG_SENTENCE_SIGMA = float(os.getenv("LONG_SENTENCE_SIGMA", "2.5"))
+# ...but only from this length on, so short documents don't flag ordinary sentences
+OUTLIER_MIN_WORDS = 25
+
+_AUXILIARIES = ("is", "are", "was", "were", "be", "been", "being")
+_PASSIVE = re.compile(r"\b(?:" + "|".join(_AUXILIARIES) + r")\s+\w+ed\b", re.IGNORECASE)
+
+# Pure-Python tokenization, matching the NumPy classification below
+_WORD = re.compile(r"(?:[^\W_]|')+")
+_VOWEL_GROUP = re.compile(r"[aeiouy]+")
+_SENTENCE_BREAK = re.compile(r"(?:[!?]|\.(?!\d))(?![.!?])|\n(?=\n)")
+
+
+class DocumentStats:
+    """
+    Metrics of one document
+
+    Per-sentence and per-paragraph values are parallel sequences (NumPy
+    arrays when available, lists otherwise), indexed by sentence or
+    paragraph number.
+    """
+
+    def __init__(self, sentences, paragraphs):
+        self.sentences = sentences
+        self.paragraphs = paragraphs
+        self.words = _total(sentences["words"])
+        self.syllables = _total(sentences["syllables"])
+        self.complex_words = _total(sentences["complex_words"])
+
+    def summary(self):
+        """Whole-document metrics"""
+        sentence_count = len(self.sentences["words"])
+        scores = readability(self.words, sentence_count, self.syllables, self.complex_words)
+        return {
+            "words": self.words,
+            "sentences": sentence_count,
+            "paragraphs": len(self.paragraphs["start"]),
+            "syllables": self.syllables,
+            "complex_words": self.complex_words,
+            "average_sentence_words": round(self.words / sentence_count, 1) if sentence_count else 0.0,
+            "passive_sentences": _total(self.sentences["passive"]),
+            "long_sentences": _total(self.sentences["long"]),
+            **scores,
+        }
+
+    def sentence_columns(self):
+        """Per-sentence values as plain lists"""
+        return _columns(self.sentences)
+
+    def to_dict(self, include_sentences=False):
+        """JSON-ready metrics; per-sentence columns only when asked for"""
+        result = {
+            "document": self.summary(),
+            "paragraphs": _columns(self.paragraphs),
+        }
+        if include_sentences:
+            result["sentences"] = self.sentence_columns()
+        return result
+
+
+def _total(values):
+    return int(values.sum()) if hasattr(values, "sum") else int(sum(values))
+
+
+def _columns(table):
+    return {name: values.tolist() if hasattr(values, "tolist") else list(values) for name, values in table.items()}
+
+
+def readability(words, sentences, syllables, complex_words):
+    """
+    Flesch reading ease, Flesch-Kincaid grade and Gunning fog for the given counts
+
+    Returns:
+        dict: Scores rounded to one decimal, 0.0 for empty text
+    """
+    if not words or not sentences:
+        return {"flesch_reading_ease": 0.0, "flesch_kincaid_grade": 0.0, "gunning_fog": 0.0}
+    words_per_sentence = words / sentences
+    syllables_per_word = syllables / words
+    return {
+        "flesch_reading_ease": round(206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word, 1),
+        "flesch_kincaid_grade": round(0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59, 1),
+        "gunning_fog": round(0.4 * (words_per_sentence + 100 * complex_words / words), 1),
+    }
+
+
+def compute_stats(text):
+    """
+    Compute sentence, paragraph and document metrics for text
+
+    Returns:
+        DocumentStats
+    """
+    paragraph_starts = [paragraph.start for paragraph in split_paragraphs(text)]
+    if NUMPY_SUPPORT:
+        return _compute_numpy(text, paragraph_starts)
+    return _compute_python(text, paragraph_starts)
+
+
+def _key(word):
+    return sum(ord(char) << (8 * position) for position, char in enumerate(word))
+
+
+_AUXILIARY_KEYS = [_key(word) for word in _AUXILIARIES]
+_KEY_CHARS = max(map(len, _AUXILIARIES))
+
+
+def _word_keys(lower, word_starts, lengths):
+    """Pack the first few lowercased characters of each short word into one integer"""
+    keys = np.zeros(len(word_starts), dtype=np.int64)
+    for position in range(_KEY_CHARS):
+        has_char = lengths > position
+        chars = lower[np.minimum(word_starts + position, len(lower) - 1)].astype(np.int64)
+        keys |= np.where(has_char, chars << (8 * position), 0)
+    # Longer words never match
+    keys[lengths > _KEY_CHARS] = -1
+    return keys
+
+
+# Character classes of ASCII codes; index 128 stands for every non-ASCII character
+_WORD_CHAR, _VOWEL, _STOP, _SPACE, _DIGIT = 1, 2, 4, 8, 16
+
+
+def _ascii_tables():
+    classes = np.zeros(129, dtype=np.uint8)
+    lowered = np.zeros(129, dtype=np.uint8)
+    for code in range(128):
+        char = chr(code)
+        lowered[code] = ord(char.lower())
+        if char.isalnum() or char == "'":
+            classes[code] |= _WORD_CHAR
+        if char.lower() in "aeiouy":
+            classes[code] |= _VOWEL
+        if char in ".!?":
+            classes[code] |= _STOP
+        if char in " \t\r\n\f\v":
+            classes[code] |= _SPACE
+        if char.isdigit():
+            classes[code] |= _DIGIT
+    return classes, lowered
+
+
+if NUMPY_SUPPORT:
+    _CLASSES, _LOWERED = _ascii_tables()
+
+
+def _compute_numpy(text, paragraph_starts):
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    ascii_codes = np.minimum(codes, 128)
+    classes = _CLASSES[ascii_codes]
+    # Lowercase ASCII, 0 for other characters: uint8 keeps the array work cheap
+    lower = _LOWERED[ascii_codes]
+    is_word = (classes & _WORD_CHAR).astype(bool)
+    # Non-ASCII characters are few and distinct: classify each once, like the \w regex does
+    non_ascii = np.flatnonzero(codes > 127)
+    if len(non_ascii):
+        unicode_word = [code for code in np.unique(codes[non_ascii]).tolist() if chr(code).isalnum()]
+        is_word[non_ascii] = np.isin(codes[non_ascii], unicode_word)
+    word_starts = np.flatnonzero(is_word & ~np.concatenate(([False], is_word[:-1])))
+    word_ends = np.flatnonzero(is_word & ~np.concatenate((is_word[1:], [False]))) + 1
+
+    # Syllables: groups of vowels, less a silent final "e" ("make", but not "table")
+    vowel = (classes & _VOWEL).astype(bool)
+    group_start = (vowel & ~np.concatenate(([False], vowel[:-1]))).astype(np.int32)
+    if len(word_starts):
+        syllables = np.add.reduceat(group_start, word_starts)
+        last = lower[word_ends - 1]
+        before_last = lower[np.maximum(word_ends - 2, 0)]
+        silent_e = (last == 101) & (before_last != 108) & (word_ends - word_starts >= 3) & (syllables > 1)
+        syllables = np.maximum(syllables - silent_e, 1)
+    else:
+        syllables = np.zeros(0, dtype=np.int32)
+
+    # Sentence breaks: . ! ? (not inside "2.5" or "..."), and blank lines
+    is_stop = (classes & _STOP).astype(bool)
+    next_stop = np.concatenate((is_stop[1:], [False]))
+    next_digit = np.concatenate(((classes[1:] & _DIGIT).astype(bool), [False]))
+    next_newline = np.concatenate((lower[1:] == 10, [False]))
+    decimal_point = (lower == 46) & next_digit
+    blank_line = (lower == 10) & next_newline
+    breaks = np.flatnonzero((is_stop & ~next_stop & ~decimal_point) | blank_line) + 1
+
+    sentence_of_word = np.searchsorted(breaks, word_starts, side="right")
+    sentence_ids, first_word, word_counts = np.unique(sentence_of_word, return_index=True, return_counts=True)
+    last_word = first_word + word_counts - 1
+    starts = word_starts[first_word]
+    ends = word_ends[last_word]
+    sentence_syllables = np.add.reduceat(syllables, first_word) if len(first_word) else np.zeros(0, dtype=np.int64)
+    complex_words = np.add.reduceat((syllables >= 3).astype(np.int32), first_word) if len(first_word) else np.zeros(0, dtype=np.int64)
+
+    # Passive voice: an auxiliary ("was") followed, after whitespace only, by a word ending in "ed"
+    passive = np.zeros(len(starts), dtype=bool)
+    if len(word_starts) > 1:
+        lengths = word_ends - word_starts
+        auxiliary = np.isin(_word_keys(lower, word_starts, lengths), _AUXILIARY_KEYS)
+        ends_ed = (lengths >= 3) & (lower[word_ends - 1] == 100) & (lower[np.maximum(word_ends - 2, 0)] == 101)
+        spaces = np.concatenate(([0], np.cumsum((classes & _SPACE) >> 3, dtype=np.int64)))
+        gap = word_starts[1:] - word_ends[:-1]
+        whitespace_gap = spaces[word_starts[1:]] - spaces[word_ends[:-1]] == gap
+        pairs = np.flatnonzero(auxiliary[:-1] & ends_ed[1:] & whitespace_gap)
+        passive[np.searchsorted(sentence_ids, sentence_of_word[pairs])] = True
+
+    long = word_counts > LONG_SENTENCE_WORDS
+    if len(word_counts) > 1:
+        threshold = word_counts.mean() + LONG_SENTENCE_SIGMA * word_counts.std()
+        long |= (word_counts > threshold) & (word_counts >= OUTLIER_MIN_WORDS)
+
+    sentences = {
+        "start": starts,
+        "end": ends,
+        "words": word_counts,
+        "syllables": sentence_syllables,
+        "complex_words": complex_words,
+        "passive": passive,
+        "long": long,
+    }
+
+    paragraph_starts = np.asarray(paragraph_starts, dtype=np.int64)
+    count = len(paragraph_starts)
+    paragraph_of_sentence = np.maximum(np.searchsorted(paragraph_starts, starts, side="right") - 1, 0)
+    paragraph_words = np.bincount(paragraph_of_sentence, weights=word_counts, minlength=count)
+    paragraph_sentences = np.bincount(paragraph_of_sentence, minlength=count)
+    paragraph_syllables = np.bincount(paragraph_of_sentence, weights=sentence_syllables, minlength=count)
+    paragraph_complex = np.bincount(paragraph_of_sentence, weights=complex_words, minlength=count)
+    safe_words = np.maximum(paragraph_words, 1)
+    words_per_sentence = paragraph_words / np.maximum(paragraph_sentences, 1)
+    syllables_per_word = paragraph_syllables / safe_words
+    has_text = paragraph_words > 0
+    paragraphs = {
+        "start": paragraph_starts,
+        "sentences": paragraph_sentences,
+        "words": paragraph_words.astype(np.int64),
+        "flesch_reading_ease": np.where(
+            has_text, np.round(206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word, 1), 0.0
+        ),
+        "gunning_fog": np.where(
+            has_text, np.round(0.4 * (words_per_sentence + 100 * paragraph_complex / safe_words), 1), 0.0
+        ),
+    }
+    return DocumentStats(sentences, paragraphs)
+
+
+def _syllables(word):
+    word = word.lower()
+    count = len(_VOWEL_GROUP.findall(word))
+    if count > 1 and len(word) >= 3 and word.endswith("e") and not word.endswith("le"):
+        count -= 1
+    return max(count, 1)
+
+
+def _compute_python(text, paragraph_starts):
+    breaks = [match.end() for match in _SENTENCE_BREAK.finditer(text)]
+    sentences = {name: [] for name in ("start", "end", "words", "syllables", "complex_words", "passive", "long")}
+    current = None
+    for match in _WORD.finditer(text):
+        sentence = bisect.bisect_right(breaks, match.start())
+        syllables = _syllables(match.group(0))
+        if sentence != current:
+            current = sentence
+            sentences["start"].append(match.start())
+            sentences["end"].append(match.end())
+            sentences["words"].append(0)
+            sentences["syllables"].append(0)
+            sentences["complex_words"].append(0)
+        sentences["end"][-1] = match.end()
+        sentences["words"][-1] += 1
+        sentences["syllables"][-1] += syllables
+        sentences["complex_words"][-1] += syllables >= 3
+
+    starts = sentences["start"]
+    passive = [False] * len(starts)
+    for match in _PASSIVE.finditer(text):
+        index = bisect.bisect_right(starts, match.start()) - 1
+        if index >= 0:
+            passive[index] = True
+    sentences["passive"] = passive
+
+    word_counts = sentences["words"]
+    threshold = None
+    if len(word_counts) > 1:
+        mean = sum(word_counts) / len(word_counts)
+        std = (sum((count - mean) ** 2 for count in word_counts) / len(word_counts)) ** 0.5
+        threshold = mean + LONG_SENTENCE_SIGMA * std
+    sentences["long"] = [
+        count > LONG_SENTENCE_WORDS or (threshold is not None and count > threshold and count >= OUTLIER_MIN_WORDS)
+        for count in word_counts
+    ]
+
+    paragraphs = {name: [0] * len(paragraph_starts) for name in ("sentences", "words", "syllables", "complex_words")}
+    for index, start in enumerate(starts):
+        paragraph = max(bisect.bisect_right(paragraph_starts, start) - 1, 0)
+        paragraphs["sentences"][paragraph] += 1
+        paragraphs["words"][paragraph] += word_counts[index]
+        paragraphs["syllables"][paragraph] += sentences["syllables"][index]
+        paragraphs["complex_words"][paragraph] += sentences["complex_words"][index]
+    scores = [
+        readability(*counts)
+        for counts in zip(paragraphs["words"], paragraphs["sentences"], paragraphs["syllables"], paragraphs["complex_words"])
+    ]
+    return DocumentStats(sentences, {
+        "start": list(paragraph_starts),
+        "sentences": paragraphs["sentences"],
+        "words": paragraphs["words"],
+        "flesch_reading_ease": [score["flesch_reading_ease"] for score in scores],
+        "gunning_fog": [score["gunning_fog"] for score in scores],
+    })
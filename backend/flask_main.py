@@ -1,11 +1,16 @@
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before modules read their settings
+load_dotenv()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import re
 import json
 import tempfile
 import os
 from datetime import datetime
 from pdf_utils import extract_text_from_pdf
+from storage import get_storage, join_key
 try:
     from docx_utils import extract_text_from_docx
     DOCX_SUPPORT = True
@@ -15,27 +20,20 @@ except ImportError:
         return "DOCX processing is temporarily unavailable. Please use PDF format."
 import tempfile
 import os
-from mistralai import Mistral
-from dotenv import load_dotenv
+from llm_client import get_mistral_client, chat_complete, deadline_after, DeadlineExceeded, analyze_deadline_seconds
+from circuit_breaker import CircuitOpenError
+import model_router
+import rule_packs
+from json_repair import parse_model_json
+from log_utils import get_logger
 
-# Load environment variables from .env file
-load_dotenv()
+logger = get_logger("flask")
 
 app = Flask(__name__)
 CORS(app)
 
 # Initialize Mistral client
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "your-mistral-api-key-here")
-mistral_client = None
-
-try:
-    if MISTRAL_API_KEY and MISTRAL_API_KEY != "your-mistral-api-key-here":
-        mistral_client = Mistral(api_key=MISTRAL_API_KEY)
-        print("Mistral AI client initialized successfully")
-    else:
-        print("Mistral API key not found. Legal advice feature will be disabled.")
-except Exception as e:
-    print(f"Failed to initialize Mistral client: {e}")
+mistral_client = get_mistral_client()
 
 @app.route('/')
 def root():
@@ -48,55 +46,35 @@ def analyze_text():
     custom_prompt = data.get('custom_prompt', '')
     username = data.get('username', 'anonymous')
     document_name = data.get('document_name', '')
+    deadline = deadline_after(analyze_deadline_seconds(len(text)))
     
-    print(f"Received text: {text[:100]}...")  # Debug print (first 100 chars)
-    print(f"Custom prompt: {custom_prompt}")  # Debug print
+    logger.info("analyze_request", extra={"username": username, "document_name": document_name, "text_chars": len(text)})
+    logger.debug("analyze_input", extra={"text": text, "custom_prompt": custom_prompt})
 
     # Log the analysis request if document info is provided
     if username != "anonymous" and document_name:
         try:
-            user_projects_dir = os.path.join("projects", username)
-            document_folder = os.path.join(user_projects_dir, document_name)
-            if os.path.exists(document_folder):
-                log_file_path = os.path.join(document_folder, f"{document_name}_activity.log")
+            storage = get_storage()
+            document_folder = join_key("projects", username, document_name)
+            if storage.dir_exists(document_folder):
+                log_file_path = f"{document_folder}/{document_name}_activity.log"
                 log_entry = f"[{datetime.now().isoformat()}] ANALYZE - Document analyzed with prompt: '{custom_prompt}' (User: {username})\n"
-                with open(log_file_path, "a", encoding="utf-8") as log_file:
-                    log_file.write(log_entry)
+                storage.append_text(log_file_path, log_entry)
         except Exception as e:
-            print(f"Error logging analysis: {e}")
+            logger.warning("activity_log_failed", extra={"action": "analyze", "error": str(e)})
 
     if not mistral_client:
-        # Fallback analysis without AI
-        suggestions = []
-        
-        # Basic grammar checks
-        if re.search(r'\s+([.!?])', text):
-            suggestions.append({
-                "type": "spacing",
-                "message": "Remove space before punctuation",
-                "original": re.search(r'\s+([.!?])', text).group(),
-                "suggestion": re.search(r'\s+([.!?])', text).group(1)
-            })
-        
-        # Check for double spaces
-        if '  ' in text:
-            suggestions.append({
-                "type": "spacing",
-                "message": "Multiple spaces found - use single space",
-                "original": "  ",
-                "suggestion": " "
-            })
-        
-        # Check for missing capitalization after periods
-        period_lower = re.findall(r'\.\s+[a-z]', text)
-        if period_lower:
-            suggestions.append({
-                "type": "capitalization",
-                "message": "Capitalize first letter after period",
-                "original": period_lower[0],
-                "suggestion": period_lower[0][:-1] + period_lower[0][-1].upper()
-            })
-        
+        # Fallback analysis without AI: the user's rule packs (see rule_packs.py)
+        suggestions = [
+            {
+                "type": issue["category"].lower(),
+                "message": issue["explanation"],
+                "original": issue["original_text"],
+                "suggestion": issue["suggested_text"],
+            }
+            for issue in rule_packs.registry.rules_for(username).issues(text)
+        ]
+
         return jsonify({
             "suggestions": suggestions,
             "enhanced_suggestions": [],
@@ -159,21 +137,25 @@ Provide specific suggestions for improvement. Format your response as JSON with
     ]
 }"""
 
-        response = mistral_client.chat.complete(
-            model="mistral-large-latest",
+        response = chat_complete(
+            "/analyze",
+            model=model_router.route("analyze", len(text), custom_prompt, deadline).model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": text}
             ],
+            client=mistral_client,
+            deadline=deadline,
+            username=username,
             max_tokens=2000
         )
         
         ai_response = response.choices[0].message.content
-        print(f"AI Response: {ai_response}")  # Debug print
+        logger.debug("analyze_ai_response", extra={"response": ai_response})
         
         # Try to parse the JSON response
         try:
-            ai_suggestions = json.loads(ai_response)
+            ai_suggestions, _ = parse_model_json(ai_response, collect_key="enhanced_suggestions")
             return jsonify({
                 "suggestions": ai_suggestions.get("suggestions", []),
                 "enhanced_suggestions": ai_suggestions.get("enhanced_suggestions", []),
@@ -181,8 +163,8 @@ Provide specific suggestions for improvement. Format your response as JSON with
                 "character_count": len(text),
                 "status": "analysis_complete"
             })
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw response
+        except ValueError:
+            # If nothing could be recovered, return the raw response
             return jsonify({
                 "suggestions": [],
                 "enhanced_suggestions": [
@@ -198,8 +180,20 @@ Provide specific suggestions for improvement. Format your response as JSON with
                 "status": "analysis_complete_raw"
             })
             
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        # Fail fast instead of holding the worker while Mistral is down
+        logger.warning("analyze_unavailable", extra={"error": str(e)})
+        return jsonify({
+            "error": f"AI analysis is temporarily unavailable: {str(e)}",
+            "retry_after": round(getattr(e, "retry_after", 0)),
+            "suggestions": [],
+            "enhanced_suggestions": [],
+            "word_count": len(text.split()),
+            "character_count": len(text),
+            "status": "analysis_unavailable"
+        }), 503
     except Exception as e:
-        print(f"Error with Mistral API: {e}")
+        logger.error("analyze_failed", extra={"error": str(e)})
         return jsonify({
             "error": f"AI analysis failed: {str(e)}",
             "suggestions": [],
@@ -0,0 +1,82 @@
+"""
+HTML highlighting of analysis issues
+
+render_highlighted() builds the highlighted_text returned by /analyze from
+structured issues (see issues.py). Spans come from the issues' offsets into
+the raw text, so a snippet that appears several times is highlighted where
+the issue actually is. Overlapping suggestions are resolved beforehand by
+suggestion_merge.merge_suggestions, which keeps the displaced ones as
+alternates shown in the tooltip.
+"""
+from html import escape
+
+# Category keyword -> inline style, first match wins
+CATEGORY_STYLES = (
+    ("spelling", "background-color: #ffe0e0; color: #a00; border-left: 3px solid #d00;"),
+    ("grammar", "background-color: #d4edda; color: #155724; border-left: 3px solid #28a745;"),
+    ("style", "background-color: #fff3cd; color: #856404; border-left: 3px solid #ffc107;"),
+    ("legal", "background-color: #e2e3f0; color: #383d41; border-left: 3px solid #007bff;"),
+    ("clarity", "background-color: #d1ecf1; color: #0c5460; border-left: 3px solid #17a2b8;"),
+    ("punctuation", "background-color: #f8d7da; color: #721c24; border-left: 3px solid #dc3545;"),
+    ("formatting", "background-color: #e2e3f0; color: #383d41; border-left: 3px solid #6f42c1;"),
+)
+DEFAULT_STYLE = "background-color: #f8f9fa; color: #495057; border-left: 3px solid #6c757d;"
+
+
+def highlight_style(category):
+    """Inline style for a highlight based on its category"""
+    category = category.lower()
+    for keyword, style in CATEGORY_STYLES:
+        if keyword in category:
+            return style
+    return DEFAULT_STYLE
+
+
+def tooltip(issue):
+    """Tooltip text for a highlighted issue"""
+    tooltip_parts = [f"CHANGE: {issue['original_text']} → {issue['suggested_text']}"]
+    if issue.get("explanation"):
+        tooltip_parts.append(f"WHY: {issue['explanation']}")
+    if issue.get("appeal_impact"):
+        tooltip_parts.append(f"APPEAL: {issue['appeal_impact']}")
+    if issue.get("context_fit"):
+        tooltip_parts.append(f"CONTEXT: {issue['context_fit']}")
+    if issue.get("alternates"):
+        tooltip_parts.append("ALSO: " + "; ".join(
+            f"{alternate['original_text']} → {alternate['suggested_text']}" for alternate in issue["alternates"]
+        ))
+    return " | ".join(tooltip_parts)
+
+
+def render_highlighted(text, issues):
+    """
+    Wrap each located issue in a highlight span
+
+    Args:
+        text (str): The analyzed text
+        issues (list): Structured issues; data-issue-index is the position in this list
+
+    Returns:
+        str: text with <span> highlights. Issues should be merged first (see
+            suggestion_merge.py); overlapping issues after the first are not highlighted
+    """
+    located = sorted(
+        (issue["start"], issue["end"], index)
+        for index, issue in enumerate(issues)
+        # Sentence-level findings (no replacement) are listed but not highlighted
+        if issue.get("start") is not None and issue.get("suggested_text")
+    )
+    parts = []
+    position = 0
+    for start, end, index in located:
+        if start < position:
+            continue
+        issue = issues[index]
+        parts.append(text[position:start])
+        parts.append(
+            f"<span style='{highlight_style(issue['category'])} padding: 2px 4px; border-radius: 3px;' "
+            f"title='{escape(tooltip(issue), quote=True)}' data-issue-index='{index}'>{text[start:end]}</span>"
+        )
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
@@ -0,0 +1,214 @@
+"""
+Incremental re-analysis of edited documents
+
+The text is split into paragraphs and each paragraph is hashed. For every
+document (username, document name, prompt, model) the last analysis is kept
+as per-paragraph issues, with offsets relative to the paragraph start. On
+re-analysis only new or changed paragraphs are sent to the model, with a
+little surrounding context. Cached issues of unchanged paragraphs are
+shifted to the paragraph's new position.
+
+The cache is in memory and per process. After a restart, or on another
+worker, the next request is a full analysis that fills the cache again.
+"""
+import bisect
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from anchoring import anchor_issues
+from issues import shift_issues
+
+INCREMENTAL_CACHE_DOCUMENTS = int(os.getenv("INCREMENTAL_CACHE_DOCUMENTS", "256"))
+# Above this share of changed paragraphs a full analysis is cheaper and more accurate
+INCREMENTAL_MAX_CHANGED_RATIO = float(os.getenv("INCREMENTAL_MAX_CHANGED_RATIO", "0.5"))
+# Blocks longer than this without blank lines are split on single newlines
+MAX_PARAGRAPH_CHARS = 2000
+CONTEXT_CHARS = 300
+
+# Document-level result fields carried over from the last full analysis
+DOCUMENT_FIELDS = (
+    "document_intelligence",
+    "contextual_insights",
+    "strategic_recommendations",
+    "appeal_score",
+    "colleague_analysis",
+)
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n+")
+
+PARAGRAPH_SYSTEM_PROMPT = """You are a senior legal editor checking edited paragraphs of a larger document.
+
+Only correct text inside the <edit id="..."> blocks. Text in <context> blocks is surrounding material for reference and must not be corrected.
+
+Find spelling, grammar, punctuation, clarity, style, legal terminology and formatting issues.
+
+Respond with JSON only:
+{
+    "issues": [
+        {
+            "category": "Spelling|Grammar|Punctuation|Clarity|Style|Legal|Formatting",
+            "original_text": "exact text copied from an edit block",
+            "suggested_text": "replacement text",
+            "explanation": "why the change helps"
+        }
+    ]
+}
+
+original_text must be copied exactly from an edit block so it can be located."""
+
+
+class Paragraph:
+    __slots__ = ("start", "end", "digest")
+
+    def __init__(self, start, end, digest):
+        self.start = start
+        self.end = end
+        self.digest = digest
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def split_paragraphs(text):
+    """
+    Split text into paragraphs with their offsets and content hashes
+
+    Returns:
+        list: Paragraph objects in document order (separators are not part of any paragraph)
+    """
+    paragraphs = []
+    position = 0
+    for match in list(_PARAGRAPH_BREAK.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        _add_block(text, position, end, paragraphs)
+        if match:
+            position = match.end()
+    return paragraphs
+
+
+def _add_block(text, start, end, paragraphs):
+    if start >= end:
+        return
+    if end - start <= MAX_PARAGRAPH_CHARS:
+        paragraphs.append(Paragraph(start, end, _digest(text[start:end])))
+        return
+    # Long block (e.g. PDF extraction without blank lines): split into line groups
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + MAX_PARAGRAPH_CHARS)
+        if chunk_end < end:
+            newline = text.rfind("\n", chunk_start + 1, chunk_end)
+            if newline > chunk_start:
+                chunk_end = newline + 1
+        paragraphs.append(Paragraph(chunk_start, chunk_end, _digest(text[chunk_start:chunk_end])))
+        chunk_start = chunk_end
+
+
+class ParagraphCache:
+    """LRU of per-document analyses: paragraph hash -> issues relative to the paragraph"""
+
+    def __init__(self, max_documents=INCREMENTAL_CACHE_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+            return entry
+
+    def store(self, key, text, issues, document_fields, paragraphs=None, covered=None):
+        """
+        Remember an analysis of text
+
+        Args:
+            key (tuple): Document identity
+            text (str): The analyzed text
+            issues (list): Structured issues with absolute offsets
+            document_fields (dict): Document-level result fields to reuse (intelligence, insights ...)
+            paragraphs (list): Optional precomputed split_paragraphs(text)
+            covered (list): Indices of the paragraphs that were analyzed, default all
+        """
+        paragraphs = paragraphs if paragraphs is not None else split_paragraphs(text)
+        indices = range(len(paragraphs)) if covered is None else covered
+        by_paragraph = {paragraphs[index].digest: [] for index in indices}
+        starts = [paragraph.start for paragraph in paragraphs]
+        for issue in issues:
+            if issue.get("start") is None:
+                continue
+            index = _paragraph_index(starts, issue["start"])
+            if index is None or issue["end"] > paragraphs[index].end:
+                continue
+            paragraph = paragraphs[index]
+            if paragraph.digest in by_paragraph:
+                by_paragraph[paragraph.digest].extend(shift_issues([issue], -paragraph.start))
+        entry = {"paragraphs": by_paragraph, "document": document_fields}
+        with self._lock:
+            self._documents[key] = entry
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return entry
+
+
+def _paragraph_index(starts, offset):
+    index = bisect.bisect_right(starts, offset) - 1
+    return index if index >= 0 else None
+
+
+def plan(text, entry):
+    """
+    Split text and sort paragraphs into cached and changed
+
+    Returns:
+        tuple: (paragraphs, reused issues with absolute offsets, indices of changed paragraphs)
+    """
+    paragraphs = split_paragraphs(text)
+    cached = entry["paragraphs"] if entry else {}
+    reused = []
+    changed = []
+    for index, paragraph in enumerate(paragraphs):
+        previous = cached.get(paragraph.digest)
+        if previous is None:
+            changed.append(index)
+        else:
+            reused.extend(shift_issues(previous, paragraph.start))
+    return paragraphs, reused, changed
+
+
+def build_prompt(text, paragraphs, changed):
+    """User prompt with the changed paragraphs as edit blocks and their neighbours as context"""
+    changed_set = set(changed)
+    blocks = []
+    for index in changed:
+        previous = paragraphs[index - 1] if index > 0 else None
+        # Skip context already emitted after the previous edit block
+        if previous is not None and index - 1 not in changed_set and index - 2 not in changed_set:
+            blocks.append(f"<context>{text[max(previous.start, previous.end - CONTEXT_CHARS):previous.end]}</context>")
+        paragraph = paragraphs[index]
+        blocks.append(f'<edit id="{index}">{text[paragraph.start:paragraph.end]}</edit>')
+        following = paragraphs[index + 1] if index + 1 < len(paragraphs) else None
+        if following is not None and index + 1 not in changed_set:
+            blocks.append(f"<context>{text[following.start:min(following.end, following.start + CONTEXT_CHARS)]}</context>")
+    return "Check these edited paragraphs:\n\n" + "\n\n".join(blocks)
+
+
+def anchor_in_paragraphs(text, issues, paragraphs, changed):
+    """
+    Locate model issues inside the changed paragraphs only
+
+    Snippets resolve in the order the model reported them (see
+    anchoring.anchor_issues). Issues that can't be found are dropped.
+    """
+    ranges = [(paragraphs[index].start, paragraphs[index].end) for index in changed]
+    anchor_issues(text, issues, ranges)
+    return [issue for issue in issues if issue.get("start") is not None]
+
+
+paragraph_cache = ParagraphCache()
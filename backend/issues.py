@@ -0,0 +1,68 @@
+"""
+Structured analysis issues
+
+Every finding (LLM, rule engine, spelling, learned corrections) is a dict
+with character offsets into the analyzed text:
+
+    {
+        "category": "Spelling",
+        "original_text": "wheras",
+        "suggested_text": "whereas",
+        "explanation": "...",
+        "start": 120,         # None if the snippet could not be located
+        "end": 126,
+        "source": "llm",
+        "confidence": None,
+    }
+
+Extra keys from the model (appeal_impact, context_fit) are kept as-is.
+Sentence-level findings have an empty suggested_text and a "message".
+After merging (see suggestion_merge.py) a suggestion may carry the
+overlapping suggestions it displaced in "alternates".
+"""
+
+
+def make_issue(category, original_text, suggested_text, explanation="", start=None, end=None,
+               source="llm", confidence=None, **extra):
+    """Build a structured issue dict"""
+    issue = {
+        "category": category,
+        "original_text": original_text,
+        "suggested_text": suggested_text,
+        "explanation": explanation,
+        "start": start,
+        "end": end,
+        "source": source,
+        "confidence": confidence,
+    }
+    issue.update(extra)
+    return issue
+
+
+def shift_issues(issues, delta):
+    """Return copies of issues with their offsets moved by delta"""
+    shifted = []
+    for issue in issues:
+        issue = dict(issue)
+        if issue.get("start") is not None:
+            issue["start"] += delta
+            issue["end"] += delta
+        if issue.get("alternates"):
+            issue["alternates"] = shift_issues(issue["alternates"], delta)
+        shifted.append(issue)
+    return shifted
+
+
+def format_issue(issue):
+    """Render an issue as the one-line summary used in issues_found"""
+    if issue.get("message"):
+        # Sentence-level findings have advice instead of a replacement
+        return f"{issue['category']}: {issue['message']}"
+    issue_text = f"{issue['category']}: {issue['original_text']} → {issue['suggested_text']}"
+    if issue.get("explanation"):
+        issue_text += f" | {issue['explanation']}"
+    if issue.get("appeal_impact"):
+        issue_text += f" | Appeal: {issue['appeal_impact']}"
+    if issue.get("context_fit"):
+        issue_text += f" | Context: {issue['context_fit']}"
+    return issue_text
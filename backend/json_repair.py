@@ -0,0 +1,254 @@
+"""
+Tolerant parsing of JSON produced by language models
+
+Model output is usually valid JSON. Sometimes it is wrapped in code fences,
+has trailing commas, is missing a comma or colon, or is cut off at
+max_tokens. IncrementalJSONParser scans the text once, character by
+character, and writes out a cleaned copy. It remembers the last point where
+the document could be closed validly. A truncated response is cut back to
+that point and its open arrays and objects are closed, so every complete
+issue is kept.
+
+The parser is incremental: feed() accepts chunks of a token stream and
+returns the items of the collected array (by default "issues") as soon as
+each one is complete.
+"""
+import json
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = ",:}]" + _WHITESPACE
+
+
+class _Frame:
+    __slots__ = ("kind", "state", "key")
+
+    def __init__(self, kind, state):
+        self.kind = kind
+        self.state = state
+        self.key = None
+
+
+class IncrementalJSONParser:
+    """
+    Single-pass, repairing JSON scanner
+
+    Args:
+        collect_key (str): Key of a top-level array whose complete items feed() returns
+    """
+
+    def __init__(self, collect_key="issues"):
+        self.collect_key = collect_key
+        self._out = []
+        self._stack = []
+        # Output offsets where each open container started, parallel to _stack
+        self._starts = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._scalar_start = None
+        self._started = False
+        self.complete = False
+        self.repaired = False
+        self._safe_len = 0
+        self._safe_closers = None
+        self._items = []
+        # Every complete item of the collected array, for the repaired result
+        self._collected = []
+
+    def _closers(self):
+        return "".join("}" if frame.kind == "{" else "]" for frame in reversed(self._stack))
+
+    def _mark_safe(self, length):
+        self._safe_len = length
+        self._safe_closers = self._closers()
+
+    def _begin_value(self):
+        """Prepare the enclosing container for a new value, repairing a missing comma or colon"""
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if frame.state == "comma":
+            self._out.append(",")
+            frame.state = "key" if frame.kind == "{" else "value"
+            self.repaired = True
+        elif frame.state == "colon":
+            self._out.append(":")
+            frame.state = "value"
+            self.repaired = True
+
+    def _value_done(self, start):
+        if not self._stack:
+            self.complete = True
+            self._mark_safe(len(self._out))
+            return
+        frame = self._stack[-1]
+        frame.state = "comma"
+        self._mark_safe(len(self._out))
+        # An item of the collected top-level array has just closed
+        if frame.kind == "[" and len(self._stack) == 2 and self._stack[0].key == self.collect_key:
+            try:
+                item = json.loads("".join(self._out[start:]), strict=False)
+            except ValueError:
+                return
+            self._items.append(item)
+            self._collected.append(item)
+
+    def _string_done(self):
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and frame.kind == "{" and frame.state == "key":
+            try:
+                frame.key = json.loads("".join(self._out[self._string_start:]), strict=False)
+            except ValueError:
+                frame.key = None
+            frame.state = "colon"
+        else:
+            self._value_done(self._string_start)
+
+    def _scalar_done(self):
+        start = self._scalar_start
+        self._scalar_start = None
+        self._value_done(start)
+
+    def feed(self, chunk):
+        """
+        Scan more text
+
+        Returns:
+            list: Items of the collected array completed by this chunk
+        """
+        out = self._out
+        for char in chunk:
+            if self.complete:
+                break
+            if not self._started:
+                # Skip code fences and any prose before the JSON
+                if char not in "{[":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                out.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._string_done()
+                continue
+
+            if self._scalar_start is not None:
+                if char not in _SCALAR_END:
+                    out.append(char)
+                    continue
+                self._scalar_done()
+                if self.complete:
+                    break
+
+            if char in _WHITESPACE:
+                continue
+            frame = self._stack[-1] if self._stack else None
+
+            if char == '"':
+                if frame is None or frame.kind != "{" or frame.state != "key":
+                    self._begin_value()
+                self._in_string = True
+                self._string_start = len(out)
+                out.append(char)
+            elif char in "{[":
+                self._begin_value()
+                start = len(out)
+                out.append(char)
+                self._stack.append(_Frame(char, "key" if char == "{" else "value"))
+                self._starts.append(start)
+                self._mark_safe(len(out))
+            elif char in "}]":
+                if frame is None:
+                    continue
+                if out and out[-1] == ",":
+                    out.pop()
+                    self.repaired = True
+                if frame.kind == "{" and frame.state in ("colon", "value"):
+                    # Key without a value: drop the dangling key
+                    self._drop_dangling_key()
+                self._stack.pop()
+                out.append("}" if frame.kind == "{" else "]")
+                if (char == "}") != (frame.kind == "{"):
+                    self.repaired = True
+                self._value_done(self._starts.pop())
+            elif char == ",":
+                if frame is not None and frame.state == "comma":
+                    out.append(",")
+                    frame.state = "key" if frame.kind == "{" else "value"
+                    self._mark_safe(len(out) - 1)
+                else:
+                    self.repaired = True
+            elif char == ":":
+                if frame is not None and frame.kind == "{" and frame.state == "colon":
+                    out.append(":")
+                    frame.state = "value"
+                else:
+                    self.repaired = True
+            else:
+                self._begin_value()
+                self._scalar_start = len(out)
+                out.append(char)
+
+        items, self._items = self._items, []
+        return items
+
+    def _drop_dangling_key(self):
+        # Cut the output back to the end of the last complete member
+        del self._out[self._safe_len:]
+        if self._out and self._out[-1] == ",":
+            self._out.pop()
+        self.repaired = True
+
+    def result(self):
+        """
+        Finish parsing and return the document, repairing it if it was cut off
+
+        Raises:
+            ValueError: No JSON value could be recovered
+        """
+        if self._scalar_start is not None:
+            try:
+                json.loads("".join(self._out[self._scalar_start:]))
+                self._scalar_done()
+            except ValueError:
+                # Cut off inside a number or literal
+                pass
+        if self.complete:
+            return json.loads("".join(self._out), strict=False)
+        if self._safe_closers is None:
+            raise ValueError("No JSON value found in model output")
+        self.repaired = True
+        text = "".join(self._out[:self._safe_len]).rstrip(",") + self._safe_closers
+        data = json.loads(text, strict=False)
+        # The last item may have been closed by the repair; keep only items that were complete
+        if isinstance(data, dict) and isinstance(data.get(self.collect_key), list):
+            data[self.collect_key] = list(self._collected)
+        return data
+
+
+def parse_model_json(text, collect_key="issues"):
+    """
+    Parse model output as JSON, repairing common defects
+
+    Args:
+        text (str): Raw model output
+        collect_key (str): Top-level array to salvage item by item
+
+    Returns:
+        tuple: (parsed value, repaired flag)
+
+    Raises:
+        ValueError: Nothing could be recovered
+    """
+    try:
+        return json.loads(text, strict=False), False
+    except ValueError:
+        pass
+    parser = IncrementalJSONParser(collect_key)
+    parser.feed(text)
+    return parser.result(), True
@@ -7,10 +7,15 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # Import your existing FastAPI app
 from main import app
+from storage import S3Storage, set_storage
 
 # S3 client for file storage
 s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'insync-edits-storage')
 
+# Lambda's /tmp is ephemeral, so projects, logs and transcripts live in S3
+if os.environ.get('STORAGE_BACKEND', 's3').lower() == 's3':
+    set_storage(S3Storage(bucket=BUCKET_NAME, client=s3_client))
+
 # Wrap FastAPI app for Lambda
 handler = Mangum(app)
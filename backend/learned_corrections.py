@@ -0,0 +1,212 @@
+"""
+Corrections learned from accepted suggestions
+
+Every change accepted in the editor is posted to /log-change. Besides the
+text log, short changes (a word or phrase) are counted per user and per
+organisation (the user's organisation in rule_packs assignments.json):
+
+    {"wheras": {"original": "wheras", "category": "Spelling",
+                "suggestions": {"whereas": 7, "where as": 1}}}
+
+Tables are stored as JSON (storage keys corrections/users/{username}.json
+and corrections/organisations/{name}.json) and updated in place on each
+accepted change. A correction accepted at least LEARNED_MIN_ACCEPTS times,
+more often than any other fix of the same text, is applied by the rule
+engine like a rule pack phrase: found in one pass over the text, before
+any model call. The user's own table wins over their organisation's.
+
+Tables are cached per process and re-read after LEARNED_TABLE_TTL seconds,
+so changes accepted on other workers show up within that time.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import rule_packs
+from log_utils import get_logger
+from storage import get_storage, join_key
+
+logger = get_logger("learned_corrections")
+
+LEARNED_MIN_ACCEPTS = int(os.getenv("LEARNED_MIN_ACCEPTS", "3"))
+LEARNED_TABLE_TTL = float(os.getenv("LEARNED_TABLE_TTL", "60"))
+# Longer changes are rewrites of one passage, not reusable corrections
+LEARNED_MAX_WORDS = 6
+LEARNED_MAX_CHARS = 120
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def learnable(original, suggested):
+    """Whether an accepted change is short and self-contained enough to reapply elsewhere"""
+    original, suggested = original.strip(), suggested.strip()
+    return (
+        bool(original) and bool(suggested)
+        and original != suggested
+        and len(original) <= LEARNED_MAX_CHARS
+        and len(original.split()) <= LEARNED_MAX_WORDS
+        and _WORD_CHAR.search(original) is not None
+    )
+
+
+class CorrectionTable:
+    """Accepted changes of one user or organisation: lowercased original -> suggestions with counts"""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def add(self, original, suggested, category):
+        """Count one accepted change"""
+        original, suggested = original.strip(), suggested.strip()
+        entry = self.entries.setdefault(original.lower(), {"original": original, "category": category, "suggestions": {}})
+        entry["category"] = category or entry["category"]
+        entry["suggestions"][suggested] = entry["suggestions"].get(suggested, 0) + 1
+
+    @property
+    def version(self):
+        """Total accepts counted; changes whenever the table does"""
+        return sum(sum(entry["suggestions"].values()) for entry in self.entries.values())
+
+    def ranked(self):
+        """
+        Every original with its most accepted fix, most frequent first
+
+        Returns:
+            list: dicts with original, suggested, category, count and the total accepts of the original
+        """
+        rows = []
+        for entry in self.entries.values():
+            suggested, count = max(entry["suggestions"].items(), key=lambda item: item[1])
+            rows.append({
+                "original": entry["original"],
+                "suggested": suggested,
+                "category": entry["category"],
+                "count": count,
+                "total": sum(entry["suggestions"].values()),
+            })
+        rows.sort(key=lambda row: (-row["count"], row["original"].lower()))
+        return rows
+
+    def active(self, min_accepts=LEARNED_MIN_ACCEPTS):
+        """Corrections to apply: accepted at least min_accepts times and more often than any alternative"""
+        rows = []
+        for entry in self.entries.values():
+            counts = sorted(entry["suggestions"].items(), key=lambda item: item[1], reverse=True)
+            suggested, count = counts[0]
+            if count >= min_accepts and (len(counts) == 1 or count > counts[1][1]):
+                rows.append((entry["original"], suggested, entry["category"], count))
+        return rows
+
+
+def _table_key(scope, name):
+    return join_key("corrections", scope, f"{name}.json")
+
+
+class LearnedCorrections:
+    """Correction tables of users and organisations, and their compiled rules"""
+
+    def __init__(self, min_accepts=LEARNED_MIN_ACCEPTS, ttl=LEARNED_TABLE_TTL):
+        self.min_accepts = min_accepts
+        self.ttl = ttl
+        # (scope, name) -> (loaded at, CorrectionTable, version)
+        self._tables = {}
+        # ((scope, name, version), ...) -> CompiledRules
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _scopes(self, username):
+        """Tables that apply to a user, organisation first so the user's own entries override it"""
+        if not username or username == "anonymous":
+            return []
+        organisation = rule_packs.registry.organisation_of(username)
+        scopes = [("organisations", organisation)] if organisation else []
+        return scopes + [("users", username)]
+
+    def _load(self, scope, name, fresh=False):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._tables.get((scope, name))
+            if cached is not None and not fresh and now - cached[0] < self.ttl:
+                return cached
+        try:
+            entries = json.loads(get_storage().read_text(_table_key(scope, name)))
+            if not isinstance(entries, dict):
+                raise ValueError("a correction table is a JSON object")
+            table = CorrectionTable(entries)
+        except FileNotFoundError:
+            table = CorrectionTable()
+        except ValueError as e:
+            # A corrupt table must not fail the analysis; it is rebuilt by the next accepted change
+            logger.warning("correction_table_invalid", extra={"scope": scope, "table": name, "error": str(e)})
+            table = CorrectionTable()
+        with self._lock:
+            self._tables[(scope, name)] = (now, table, table.version)
+        return now, table, table.version
+
+    def table(self, username):
+        """A user's own correction table"""
+        return self._load("users", username)[1]
+
+    def record(self, username, original, suggested, category):
+        """
+        Count an accepted change in the user's and organisation's tables
+
+        Returns:
+            bool: False when the change is not learnable or there is no user
+        """
+        if not learnable(original, suggested):
+            return False
+        scopes = self._scopes(username)
+        for scope, name in scopes:
+            # Re-read so accepts counted by other workers are not overwritten
+            loaded_at, table, _ = self._load(scope, name, fresh=True)
+            table.add(original, suggested, category)
+            get_storage().write_text(_table_key(scope, name), json.dumps(table.entries, ensure_ascii=False))
+            with self._lock:
+                self._tables[(scope, name)] = (loaded_at, table, table.version)
+        return bool(scopes)
+
+    def rules_for(self, username):
+        """
+        Active corrections of a user and their organisation compiled as one rule set
+
+        Returns:
+            rule_packs.CompiledRules
+        """
+        loaded = [(scope, name) + self._load(scope, name) for scope, name in self._scopes(username)]
+        key = tuple((scope, name, version) for scope, name, _, _, version in loaded)
+        with self._lock:
+            compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        packs = []
+        for scope, name, _, table, version in loaded:
+            rules = [
+                {
+                    "category": category,
+                    "match": original,
+                    "suggestion": suggested,
+                    "explanation": f'Learned correction: "{suggested}" was accepted {count} times',
+                }
+                for original, suggested, category, count in table.active(self.min_accepts)
+            ]
+            packs.append(rule_packs.RulePack(f"learned:{scope}:{name}", str(version), "", {}, rules))
+        compiled = rule_packs.CompiledRules(packs)
+        with self._lock:
+            # Superseded versions of the same tables are dropped
+            for stale in [other for other in self._compiled if [part[:2] for part in other] == [part[:2] for part in key]]:
+                del self._compiled[stale]
+            self._compiled[key] = compiled
+        return compiled
+
+    def issues(self, text, username):
+        """Learned corrections found in text, as structured issues (source "learned")"""
+        issues = self.rules_for(username).issues(text)
+        for issue in issues:
+            issue["source"] = "learned"
+        return issues
+
+
+learned_corrections = LearnedCorrections()
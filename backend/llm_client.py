@@ -0,0 +1,345 @@
+"""
+Process-wide Mistral client with a keep-alive connection pool
+
+All entry points (FastAPI, Flask and the WSGI deployment) share one lazily
+created client, so each LLM call reuses a pooled HTTPS connection instead of
+paying for a new TCP connection and TLS handshake.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from log_utils import get_logger
+from profiling import follow_thread
+from server_timing import record
+from circuit_breaker import mistral_breaker
+from llm_scheduler import llm_scheduler, estimate_tokens, QueueTimeout
+from model_router import record_latency, SMALL_MODEL_MAX_CHARS
+from metrics import (
+    MISTRAL_REQUEST_SECONDS, MISTRAL_CONNECT_SECONDS,
+    MISTRAL_CALL_SECONDS, MISTRAL_TOKENS_TOTAL, MISTRAL_ERRORS_TOTAL,
+    counter,
+)
+
+logger = get_logger("llm")
+
+MISTRAL_POOL_SIZE = int(os.getenv("MISTRAL_POOL_SIZE", "20"))
+MISTRAL_KEEPALIVE_CONNECTIONS = int(os.getenv("MISTRAL_KEEPALIVE_CONNECTIONS", str(MISTRAL_POOL_SIZE)))
+MISTRAL_KEEPALIVE_EXPIRY = float(os.getenv("MISTRAL_KEEPALIVE_EXPIRY", "60"))
+MISTRAL_CONNECT_TIMEOUT = float(os.getenv("MISTRAL_CONNECT_TIMEOUT", "5"))
+MISTRAL_READ_TIMEOUT = float(os.getenv("MISTRAL_READ_TIMEOUT", "120"))
+
+# Overall per-request budgets; past these the caller falls back or errors out
+LLM_ANALYZE_DEADLINE = os.getenv("LLM_ANALYZE_DEADLINE", "")
+# /analyze budget for documents the router sends to the small model; see analyze_deadline_seconds()
+ANALYZE_DEADLINE_SECONDS = float(LLM_ANALYZE_DEADLINE or "20")
+# Unless LLM_ANALYZE_DEADLINE is set, longer documents get this much more per 1,000 characters, up to the maximum
+LLM_ANALYZE_SECONDS_PER_KCHAR = float(os.getenv("LLM_ANALYZE_SECONDS_PER_KCHAR", "1"))
+LLM_ANALYZE_MAX_DEADLINE = float(os.getenv("LLM_ANALYZE_MAX_DEADLINE", "90"))
+CHAT_DEADLINE_SECONDS = float(os.getenv("LLM_CHAT_DEADLINE", "45"))
+# Don't start an upstream call with less time than this left
+LLM_MIN_CALL_SECONDS = float(os.getenv("LLM_MIN_CALL_SECONDS", "1"))
+
+# Retries for 429/5xx and connection errors, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+MISTRAL_RETRIES_TOTAL = counter(
+    "mistral_retries_total",
+    "Retried Mistral calls by endpoint and upstream status",
+)
+
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the LLM call could complete"""
+
+
+def deadline_after(seconds):
+    """Return an absolute deadline (time.monotonic() based) seconds from now"""
+    return time.monotonic() + seconds
+
+
+def analyze_deadline_seconds(text_chars):
+    """
+    Time budget of an /analyze request for a document of text_chars characters
+
+    Documents the model router keeps on the small model get
+    ANALYZE_DEADLINE_SECONDS. Longer ones go to the large model, whose
+    answer grows with the document, so the budget grows with the characters
+    past SMALL_MODEL_MAX_CHARS instead of sending every large document to
+    the rule-based fallback. An explicit LLM_ANALYZE_DEADLINE is used as is.
+    """
+    if LLM_ANALYZE_DEADLINE:
+        return ANALYZE_DEADLINE_SECONDS
+    extra = max(0, text_chars - SMALL_MODEL_MAX_CHARS) / 1000 * LLM_ANALYZE_SECONDS_PER_KCHAR
+    return min(max(ANALYZE_DEADLINE_SECONDS, LLM_ANALYZE_MAX_DEADLINE), ANALYZE_DEADLINE_SECONDS + extra)
+
+
+def _is_upstream_failure(exc):
+    # Bad requests (4xx other than 429) say nothing about upstream health
+    status = getattr(exc, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+def _is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        return isinstance(exc, httpx.TransportError) and not isinstance(exc, httpx.TimeoutException)
+    return status == 429 or status >= 500
+
+
+def _retry_delay(attempt, exc):
+    """Full-jitter backoff, but never sooner than the upstream's Retry-After"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    raw_response = getattr(exc, "raw_response", None)
+    retry_after = raw_response.headers.get("retry-after") if raw_response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+_client = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+
+def _trace_connection(request):
+    """Request hook: record whether the call opened a new connection and how long it took"""
+    state = {"started": time.perf_counter(), "connect_started": None, "connect_seconds": None}
+
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            state["connect_started"] = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if state["connect_started"] is not None:
+                state["connect_seconds"] = time.perf_counter() - state["connect_started"]
+
+    request.extensions["trace"] = trace
+    request.extensions["llm_timing"] = state
+
+
+def _record_latency(response):
+    """Response hook: observe request latency labelled by connection reuse"""
+    state = response.request.extensions.get("llm_timing")
+    if not state:
+        return
+    new_connection = state["connect_seconds"] is not None
+    MISTRAL_REQUEST_SECONDS.observe(
+        time.perf_counter() - state["started"],
+        connection="new" if new_connection else "reused",
+    )
+    if new_connection:
+        MISTRAL_CONNECT_SECONDS.observe(state["connect_seconds"])
+
+
+def _build_http_client():
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MISTRAL_POOL_SIZE,
+            max_keepalive_connections=MISTRAL_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=MISTRAL_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(MISTRAL_READ_TIMEOUT, connect=MISTRAL_CONNECT_TIMEOUT),
+        event_hooks={"request": [_trace_connection], "response": [_record_latency]},
+    )
+
+
+def get_mistral_client():
+    """
+    Return the shared Mistral client, creating it on first use
+
+    Returns:
+        Mistral: The pooled client, or None if no API key is configured
+    """
+    global _client, _client_initialized
+    if _client_initialized:
+        return _client
+    with _client_lock:
+        if _client_initialized:
+            return _client
+        # Read the key at first use so load_dotenv() in the entry points has run
+        api_key = os.getenv("MISTRAL_API_KEY", "your-mistral-api-key-here")
+        try:
+            if api_key and api_key != "your-mistral-api-key-here":
+                from mistralai import Mistral
+                _client = Mistral(
+                    api_key=api_key,
+                    client=_build_http_client(),
+                    timeout_ms=int(MISTRAL_READ_TIMEOUT * 1000),
+                )
+                logger.info("mistral_client_initialized", extra={"pool_size": MISTRAL_POOL_SIZE})
+            else:
+                logger.warning("mistral_api_key_missing")
+        except Exception as e:
+            logger.error("mistral_client_init_failed", extra={"error": str(e)})
+        _client_initialized = True
+    return _client
+
+
+def _complete_once(endpoint, client, model, messages, deadline, kwargs):
+    """One upstream attempt through the circuit breaker"""
+    if deadline is not None and "timeout_ms" not in kwargs:
+        remaining = deadline - time.monotonic()
+        if remaining < LLM_MIN_CALL_SECONDS:
+            raise DeadlineExceeded(f"{remaining:.1f}s left for {endpoint}")
+        kwargs = dict(kwargs, timeout_ms=int(remaining * 1000))
+    mistral_breaker.before_call()
+    start = time.perf_counter()
+    try:
+        response = client.chat.complete(model=model, messages=messages, **kwargs)
+    except Exception as e:
+        MISTRAL_ERRORS_TOTAL.inc(model=model, endpoint=endpoint)
+        if _is_upstream_failure(e):
+            mistral_breaker.record_failure()
+        else:
+            mistral_breaker.release()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"Mistral call for {endpoint} hit the deadline") from e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        MISTRAL_CALL_SECONDS.observe(elapsed, model=model, endpoint=endpoint)
+        record_latency(model, elapsed)
+        record("llm", elapsed)
+    mistral_breaker.record_success(elapsed)
+    return response
+
+
+def chat_complete(endpoint, model, messages, client=None, deadline=None, username=None, **kwargs):
+    """
+    Run a chat completion on the shared client and record its metrics
+
+    The call waits for a slot from the LLM scheduler (fair queueing by
+    username, global concurrency and token budget), then goes through the
+    shared circuit breaker. 429/5xx and connection errors are retried with
+    jittered exponential backoff while the deadline allows.
+
+    Args:
+        endpoint (str): Calling route, used as a metrics label
+        model (str): Mistral model name
+        messages (list): Chat messages
+        client (Mistral): Optional client override, defaults to the shared one
+        deadline (float): Optional time.monotonic() deadline for the whole request
+        username (str): Fairness key for the scheduler, defaults to "anonymous"
+        **kwargs: Passed through to chat.complete
+
+    Returns:
+        The Mistral chat completion response
+
+    Raises:
+        CircuitOpenError: The circuit is open
+        DeadlineExceeded: Not enough time left, or the call timed out at the deadline
+    """
+    client = client or get_mistral_client()
+    queued_at = time.perf_counter()
+    try:
+        ticket = llm_scheduler.acquire(username or "anonymous", estimate_tokens(messages, kwargs.get("max_tokens")), deadline)
+    except QueueTimeout as e:
+        raise DeadlineExceeded(str(e)) from e
+    finally:
+        record("queue", time.perf_counter() - queued_at)
+    return _complete_with_ticket(ticket, endpoint, client, model, messages, deadline, kwargs)
+
+
+def _complete_with_ticket(ticket, endpoint, client, model, messages, deadline, kwargs):
+    """Make the call a scheduler ticket was granted for, with retries, and release the ticket"""
+    started = time.perf_counter()
+    used_tokens = None
+    try:
+        attempt = 0
+        while True:
+            try:
+                response = _complete_once(endpoint, client, model, messages, deadline, kwargs)
+                break
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(attempt, e)
+                if deadline is not None and time.monotonic() + delay + LLM_MIN_CALL_SECONDS > deadline:
+                    raise
+                status = getattr(e, "status_code", None) or "transport"
+                MISTRAL_RETRIES_TOTAL.inc(endpoint=endpoint, status=str(status))
+                logger.info("mistral_retry", extra={"endpoint": endpoint, "attempt": attempt + 1, "status": status, "delay": round(delay, 2)})
+                time.sleep(delay)
+                attempt += 1
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            used_tokens = prompt_tokens + completion_tokens
+            MISTRAL_TOKENS_TOTAL.inc(prompt_tokens, model=model, endpoint=endpoint, kind="prompt")
+            MISTRAL_TOKENS_TOTAL.inc(completion_tokens, model=model, endpoint=endpoint, kind="completion")
+        return response
+    finally:
+        llm_scheduler.release(ticket, used_tokens, time.perf_counter() - started)
+
+
+def _complete_in_pool(*args):
+    # A profiled request's samples include the time spent waiting on Mistral here
+    with follow_thread():
+        return _complete_with_ticket(*args)
+
+
+_call_executor = None
+_call_executor_lock = threading.Lock()
+
+
+def _get_call_executor():
+    """
+    Threads for the blocking calls of async routes
+
+    Only calls holding a scheduler ticket run here, so the scheduler's
+    concurrency is all the pool needs, and they never compete with the
+    event loop's default executor (file I/O, to_thread work).
+    """
+    global _call_executor
+    with _call_executor_lock:
+        if _call_executor is None:
+            _call_executor = ThreadPoolExecutor(max_workers=llm_scheduler.max_concurrency, thread_name_prefix="llm-call")
+        return _call_executor
+
+
+async def chat_complete_async(endpoint, model, messages, client=None, deadline=None, username=None, **kwargs):
+    """
+    chat_complete() for async routes
+
+    The scheduler queue is awaited on the event loop, so queued calls hold
+    no thread. The blocking call then runs in the LLM call pool, sized to
+    the scheduler's concurrency, and the wait for it is capped at the
+    deadline.
+    """
+    client = client or get_mistral_client()
+    queued_at = time.perf_counter()
+    try:
+        ticket = await llm_scheduler.acquire_async(username or "anonymous", estimate_tokens(messages, kwargs.get("max_tokens")), deadline)
+    except QueueTimeout as e:
+        raise DeadlineExceeded(str(e)) from e
+    finally:
+        record("queue", time.perf_counter() - queued_at)
+
+    # Carry the request's context (Server-Timing, profiler) into the worker thread, as to_thread does
+    context = contextvars.copy_context()
+    try:
+        call = asyncio.get_running_loop().run_in_executor(_get_call_executor(), functools.partial(
+            context.run, _complete_in_pool, ticket, endpoint, client, model, messages, deadline, kwargs,
+        ))
+    except BaseException:
+        llm_scheduler.release(ticket)
+        raise
+    if deadline is None:
+        return await call
+    try:
+        return await asyncio.wait_for(call, timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Mistral call for {endpoint} hit the deadline")
@@ -0,0 +1,280 @@
+"""
+Process-wide scheduler for LLM calls
+
+Every Mistral call takes a slot from the scheduler before it goes upstream.
+The scheduler enforces:
+
+- a global concurrency limit (LLM_MAX_CONCURRENCY)
+- a tokens-per-minute budget (LLM_TOKENS_PER_MINUTE), as a token bucket
+  charged with each call's estimated tokens and corrected with the actual
+  usage afterwards
+- weighted fair queueing by username: each request gets a virtual finish
+  tag of max(virtual time, user's last tag) + tokens / weight, and the
+  smallest tag goes next. A user with dozens of queued documents is
+  interleaved with everyone else instead of blocking them.
+
+Waiters whose deadline can't be met are rejected up front, so the caller
+can fall back immediately. Limits apply per process.
+
+Threads wait with acquire(); async routes wait with acquire_async(), which
+suspends the coroutine instead of holding a worker thread while queued.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from metrics import histogram
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "500000"))
+# Completion tokens assumed when the caller sets no max_tokens
+LLM_DEFAULT_COMPLETION_TOKENS = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "1500"))
+
+LLM_QUEUE_WAIT_SECONDS = histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM calls waited in the scheduler queue",
+)
+
+
+class QueueTimeout(Exception):
+    """The request could not be scheduled before its deadline"""
+
+    def __init__(self, message, eta):
+        super().__init__(message)
+        self.eta = eta
+
+
+def parse_weights(spec):
+    """Parse "alice=2,bob=0.5" into {"alice": 2.0, "bob": 0.5}"""
+    weights = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Rough token estimate for a chat call: ~4 characters per prompt token plus the completion"""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + (max_tokens or LLM_DEFAULT_COMPLETION_TOKENS)
+
+
+class _Ticket:
+    __slots__ = ("username", "cost", "tag", "previous_tag", "seq", "enqueued_at")
+
+    def __init__(self, username, cost, tag, previous_tag, seq):
+        self.username = username
+        self.cost = cost
+        self.tag = tag
+        self.previous_tag = previous_tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class LLMScheduler:
+    """
+    Concurrency, token-rate and fairness governor for LLM calls
+
+    Args:
+        max_concurrency (int): Calls allowed upstream at once
+        tokens_per_minute (int): Token budget, refilled continuously
+        weights (dict): Optional username -> weight (default 1.0)
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, tokens_per_minute=LLM_TOKENS_PER_MINUTE, weights=None):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_tag = {}
+        # (loop, asyncio.Event) of coroutines waiting in acquire_async
+        self._async_waiters = set()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        # Moving average of call duration, for ETAs
+        self._avg_call_seconds = 5.0
+
+    def _refill(self, now):
+        rate = self.tokens_per_minute / 60.0
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    def _eta(self, position, cost=0):
+        """Estimated seconds until the request at a queue position (0-based) starts"""
+        # Calls that must finish before this one gets a slot
+        blocking = self._active + position - self.max_concurrency + 1
+        rounds = -(-max(0, blocking) // self.max_concurrency)
+        token_wait = max(0.0, cost - self._tokens) / (self.tokens_per_minute / 60.0)
+        return max(rounds * self._avg_call_seconds, token_wait)
+
+    def _enqueue(self, username, tokens, deadline):
+        """Queue a ticket, rejecting it at once when the deadline can't be met (lock held)"""
+        # A single call larger than the whole budget would never be scheduled
+        cost = min(tokens, self.tokens_per_minute)
+        weight = self.weights.get(username, 1.0)
+        previous_tag = self._last_tag.get(username)
+        tag = max(self._virtual_time, previous_tag or 0.0) + cost / weight
+        self._last_tag[username] = tag
+        ticket = _Ticket(username, cost, tag, previous_tag, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+
+        if deadline is not None:
+            self._refill(time.monotonic())
+            eta = self._eta(sorted(self._queue).index(ticket), cost)
+            if time.monotonic() + eta > deadline:
+                self._remove(ticket)
+                raise QueueTimeout(f"LLM queue wait of ~{eta:.0f}s exceeds the deadline", eta)
+        return ticket
+
+    def _try_start(self, ticket, deadline):
+        """
+        Start the ticket if it is its turn (lock held)
+
+        Returns:
+            tuple: (started, seconds to wait before trying again or None for until notified)
+        """
+        now = time.monotonic()
+        self._refill(now)
+        wait = None
+        if self._queue[0] is ticket and self._active < self.max_concurrency:
+            if self._tokens >= ticket.cost:
+                heapq.heappop(self._queue)
+                self._active += 1
+                self._tokens -= ticket.cost
+                self._virtual_time = ticket.tag
+                self._notify_all()
+                LLM_QUEUE_WAIT_SECONDS.observe(now - ticket.enqueued_at)
+                return True, None
+            # Head of the queue, waiting only for the token bucket
+            wait = (ticket.cost - self._tokens) / (self.tokens_per_minute / 60.0)
+        if deadline is not None:
+            remaining = deadline - now
+            if remaining <= 0:
+                self._remove(ticket)
+                raise QueueTimeout("LLM call was still queued at the deadline", 0.0)
+            wait = remaining if wait is None else min(wait, remaining)
+        return False, wait
+
+    def acquire(self, username, tokens, deadline=None):
+        """
+        Wait for this caller's turn
+
+        Args:
+            username (str): Fairness key
+            tokens (int): Estimated tokens for the call
+            deadline (float): Optional time.monotonic() deadline
+
+        Returns:
+            _Ticket: Pass to release() when the call is done
+
+        Raises:
+            QueueTimeout: The call can't start before the deadline
+        """
+        with self._cond:
+            ticket = self._enqueue(username, tokens, deadline)
+            while True:
+                started, wait = self._try_start(ticket, deadline)
+                if started:
+                    return ticket
+                self._cond.wait(wait)
+
+    async def acquire_async(self, username, tokens, deadline=None):
+        """
+        acquire() for coroutines: waits on the event loop instead of in a thread
+
+        A cancelled waiter leaves the queue, so it never holds up the calls behind it.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._cond:
+            ticket = self._enqueue(username, tokens, deadline)
+        try:
+            while True:
+                with self._cond:
+                    started, wait = self._try_start(ticket, deadline)
+                    if started:
+                        return ticket
+                    waiter[1].clear()
+                    self._async_waiters.add(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        self._async_waiters.discard(waiter)
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._queue:
+                    self._remove(ticket)
+            raise
+
+    def release(self, ticket, actual_tokens=None, duration=None):
+        """Return a slot, correcting the token bucket with the call's actual usage"""
+        with self._cond:
+            self._active -= 1
+            if actual_tokens is not None:
+                # May go negative: an underestimated call borrows from the next minute
+                self._tokens = min(float(self.tokens_per_minute), self._tokens + ticket.cost - actual_tokens)
+            if duration is not None:
+                self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * duration
+            self._notify_all()
+
+    def _notify_all(self):
+        """Wake every waiter, threads and coroutines alike (lock held)"""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _remove(self, ticket):
+        """Drop a ticket that never ran, handing back the share of the user's budget it claimed"""
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        # A later ticket of the same user already built on this tag; only the newest one is undone
+        if self._last_tag.get(ticket.username) == ticket.tag:
+            if ticket.previous_tag is None:
+                del self._last_tag[ticket.username]
+            else:
+                self._last_tag[ticket.username] = ticket.previous_tag
+        self._notify_all()
+
+    def status(self, username=None):
+        """
+        Snapshot of the queue for feedback to callers
+
+        Returns:
+            dict: Active calls, queue length, tokens available and, for a
+                username, the position and ETA of each of their queued calls
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            ordered = sorted(self._queue)
+            result = {
+                "active": self._active,
+                "queued": len(ordered),
+                "max_concurrency": self.max_concurrency,
+                "tokens_available": int(self._tokens),
+                "tokens_per_minute": self.tokens_per_minute,
+                "estimated_wait_seconds": round(self._eta(len(ordered)), 1),
+            }
+            if username is not None:
+                result["requests"] = [
+                    {"position": position + 1, "eta_seconds": round(self._eta(position), 1)}
+                    for position, ticket in enumerate(ordered)
+                    if ticket.username == username
+                ]
+            return result
+
+
+llm_scheduler = LLMScheduler(weights=parse_weights(os.getenv("LLM_USER_WEIGHTS", "")))
@@ -0,0 +1,116 @@
+"""
+Structured, leveled logging
+
+Records are emitted as one JSON object per line. Formatting and writing to
+stdout happen on a background thread (QueueHandler/QueueListener), so a log
+call on the request path only enqueues the record. Long fields are truncated
+and DEBUG records can be sampled.
+
+Settings:
+    LOG_LEVEL                 - minimum level (default INFO)
+    LOG_MAX_FIELD_CHARS       - truncate string fields longer than this (default 500)
+    LOG_MAX_LIST_ITEMS        - truncate list fields longer than this (default 10)
+    LOG_DEBUG_SAMPLE_RATE     - fraction of DEBUG records to keep (default 1.0)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+LOG_MAX_LIST_ITEMS = int(os.getenv("LOG_MAX_LIST_ITEMS", "10"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def truncate(value, max_chars=None, max_items=None):
+    """
+    Shorten a value for logging
+
+    Strings keep their first max_chars characters plus the original length;
+    lists and tuples keep their first max_items items.
+    """
+    max_chars = LOG_MAX_FIELD_CHARS if max_chars is None else max_chars
+    max_items = LOG_MAX_LIST_ITEMS if max_items is None else max_items
+    if isinstance(value, str):
+        if len(value) > max_chars:
+            return f"{value[:max_chars]}...[{len(value)} chars]"
+        return value
+    if isinstance(value, (list, tuple)):
+        items = [truncate(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"...[{len(value)} items]")
+        return items
+    if isinstance(value, dict):
+        return {key: truncate(item, max_chars, max_items) for key, item in value.items()}
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record and its extra fields as one JSON line"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = truncate(value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Keep only a fraction of DEBUG records"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+_configured = False
+
+
+def _configure():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+
+    # Records are formatted and written by the listener thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger("app")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    root.propagate = False
+
+
+def get_logger(name):
+    """Return a structured logger under the "app" hierarchy"""
+    _configure()
+    return logging.getLogger(f"app.{name}")
@@ -1,12 +1,27 @@
-from fastapi import FastAPI, Request, File, UploadFile, Form, HTTPException
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before modules read their settings
+load_dotenv()
+
+from fastapi import FastAPI, Request, File, UploadFile, Form, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 import re
 import json
 import tempfile
 import os
+import time
 from datetime import datetime
 from pdf_utils import extract_text_from_pdf
+from compression_utils import logical_name, codec_from_name
+from storage import get_storage, join_key
+from response_compression import CompressionMiddleware
+from server_timing import ServerTimingMiddleware, phase, record
+from log_utils import get_logger
+import profiling
+import transcript_sessions
+import transcript_index
 try:
     from docx_utils import extract_text_from_docx
     DOCX_SUPPORT = True
@@ -14,29 +29,58 @@ except ImportError:
     DOCX_SUPPORT = False
     def extract_text_from_docx(file_path):
         return "DOCX processing is temporarily unavailable. Please use PDF format."
-import tempfile
-import os
-from mistralai import Mistral
-from dotenv import load_dotenv
+from llm_client import (
+    get_mistral_client, chat_complete_async, deadline_after, DeadlineExceeded,
+    analyze_deadline_seconds, CHAT_DEADLINE_SECONDS,
+)
+from circuit_breaker import CircuitOpenError
+from llm_scheduler import llm_scheduler
+from single_flight import analysis_flight, flight_key
+import model_router
+from json_repair import parse_model_json
+from issues import make_issue, format_issue, shift_issues
+from anchoring import anchor_issues
+from highlighting import render_highlighted
+from suggestion_merge import merge_suggestions
+import incremental_analysis
+from incremental_analysis import paragraph_cache
+from rule_engine import run_rules
+from document_stats import compute_stats
+import spelling
+import cascade
+import analysis_store
+import rule_packs
+from learned_corrections import learned_corrections
+from metrics import (
+    MetricsMiddleware, render_prometheus, Timer,
+    FALLBACK_ANALYSIS_TOTAL, EXTRACTION_SECONDS_PER_PAGE, UPLOAD_SIZE_BYTES,
+    MODEL_OUTPUT_REPAIRED_TOTAL, record_cache_lookup,
+)
 
-# Load environment variables from .env file
-load_dotenv()
+logger = get_logger("api")
 
-app = FastAPI()
+# orjson serializes the large analysis/extraction payloads several times faster
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Initialize Mistral client (you'll need to set your API key)
 # For now, we'll use a placeholder - you should set this as an environment variable
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "your-mistral-api-key-here")
-mistral_client = None
+mistral_client = get_mistral_client()
 
-try:
-    if MISTRAL_API_KEY and MISTRAL_API_KEY != "your-mistral-api-key-here":
-        mistral_client = Mistral(api_key=MISTRAL_API_KEY)
-        print("Mistral AI client initialized successfully")
-    else:
-        print("Mistral API key not found. Legal advice feature will be disabled.")
-except Exception as e:
-    print(f"Failed to initialize Mistral client: {e}")
+# Map the spelling index now rather than on the first request
+spelling.get_index()
+
+# Compress large responses (gzip, or brotli when available) for slow links
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency histograms, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Server-Timing header with extraction/llm/parsing/highlighting phases
+app.add_middleware(ServerTimingMiddleware)
+
+# Admin-gated sampling profiler; only installed when PROFILING_TOKEN is set
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,11 +93,66 @@ app.add_middleware(
 async def root():
     return {"message": "AI Legal Document Editor API", "status": "running", "version": "1.0.0"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus-format metrics: latencies, token counts, cache hit rates and fallbacks"""
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm-queue")
+async def get_llm_queue(username: str = None):
+    """LLM scheduler state; with a username, the position and ETA of each of their queued calls"""
+    return llm_scheduler.status(username)
+
+@app.get("/diagnostics/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "collapsed"):
+    """
+    Download a request profile recorded by the profiling middleware
+
+    Requires the profiling token in the X-Profile header. format is
+    "collapsed" (flamegraph.pl / speedscope import) or "speedscope".
+    """
+    from fastapi.responses import PlainTextResponse, Response
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not profiling.is_authorized(request.headers.get("x-profile")):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    try:
+        if format == "speedscope":
+            return Response(
+                profiling.profile_as_json(profile_id),
+                media_type="application/json",
+                headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'},
+            )
+        return PlainTextResponse(profiling.load_profile(profile_id))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
 class AnalyzeRequest(BaseModel):
     text: str
     custom_prompt: str = ""
     username: str = "anonymous"
     document_name: str = ""
+    # Re-analyze only paragraphs changed since the last analysis of this document
+    incremental: bool = False
+    # Rule engine first, then Mistral only on the paragraphs the rules flag
+    cascade: bool = False
+    # With cascade: stream NDJSON, the rule findings first and the merged result when ready
+    stream: bool = False
+
+class DocumentStatsRequest(BaseModel):
+    text: str
+    # Per-sentence columns (offsets, word counts, flags) besides the document and paragraph metrics
+    include_sentences: bool = False
+
+class SpellCheckRequest(BaseModel):
+    text: str
+    username: str = "anonymous"
+
+class DictionaryWordsRequest(BaseModel):
+    words: list
 
 class LegalAdviceRequest(BaseModel):
     text: str
@@ -74,33 +173,317 @@ class ChatRequest(BaseModel):
     username: str = "anonymous"
     document_name: str = ""
 
+class TranscriptSessionRequest(BaseModel):
+    username: str
+    sessionInfo: dict = {}
+
+class TranscriptSegmentsRequest(BaseModel):
+    username: str
+    segments: list = []
+
+class TranscriptFinalizeRequest(BaseModel):
+    username: str
+    sessionInfo: dict = {}
+
 @app.post("/analyze")
 async def analyze_text(payload: AnalyzeRequest):
     text = payload.text
     custom_prompt = payload.custom_prompt or ""
     username = payload.username
     document_name = payload.document_name
+    # The whole request, including the rule-based fallback, should fit this budget
+    deadline = deadline_after(analyze_deadline_seconds(len(text)))
     
-    print(f"Received text: {text[:100]}...")  # Debug print (first 100 chars)
-    print(f"Custom prompt: {custom_prompt}")  # Debug print
+    logger.info("analyze_request", extra={"username": username, "document_name": document_name, "text_chars": len(text)})
+    logger.debug("analyze_input", extra={"text": text, "custom_prompt": custom_prompt})
 
     # Log the analysis request if document info is provided
     if username != "anonymous" and document_name:
         try:
-            user_projects_dir = os.path.join("projects", username)
-            document_folder = os.path.join(user_projects_dir, document_name)
-            if os.path.exists(document_folder):
-                log_file_path = os.path.join(document_folder, f"{document_name}_activity.log")
+            storage = get_storage()
+            document_folder = join_key("projects", username, document_name)
+            if storage.dir_exists(document_folder):
+                log_file_path = f"{document_folder}/{document_name}_activity.log"
                 log_entry = f"[{datetime.now().isoformat()}] ANALYZE - Document analyzed with prompt: '{custom_prompt}' (User: {username})\n"
-                with open(log_file_path, "a", encoding="utf-8") as log_file:
-                    log_file.write(log_entry)
+                storage.append_text(log_file_path, log_entry)
         except Exception as e:
-            print(f"Error logging analysis: {e}")
+            logger.warning("activity_log_failed", extra={"action": "analyze", "error": str(e)})
+
+    # A saved analysis of the same text and prompt needs no model call (see analysis_store.py)
+    if document_name and not payload.cascade:
+        saved = analysis_store.load(username, document_name, text, custom_prompt)
+        record_cache_lookup("saved_analysis", saved is not None)
+        if saved is not None:
+            return saved
 
     if not mistral_client:
         # Fallback to rule-based analysis if Mistral is not available
-        return fallback_rule_based_analysis(text)
-    
+        FALLBACK_ANALYSIS_TOTAL.inc(reason="no_client")
+        return fallback_rule_based_analysis(text, username)
+
+    model = model_router.route("analyze", len(text), custom_prompt, deadline).model
+    if payload.cascade:
+        return await analyze_cascade(text, custom_prompt, model, username, document_name, deadline, payload.stream)
+    if payload.incremental and document_name:
+        return await analyze_incremental(text, custom_prompt, model, username, document_name, deadline)
+
+    result = await shared_analysis(text, custom_prompt, model, username, deadline)
+    if document_name:
+        persist_analysis(username, document_name, text, custom_prompt, result)
+    return result
+
+async def shared_analysis(text, custom_prompt, model, username, deadline):
+    """
+    Full Mistral analysis, shared with identical analyses already in flight
+
+    Double clicks, two reviewers and the upload warm-up share one Mistral
+    call. Only the model result is shared: the rule-based fallback depends
+    on the user (rule packs, dictionary, learned corrections), so callers
+    that did not lead the call compute their own.
+    """
+    led = False
+
+    async def lead():
+        nonlocal led
+        led = True
+        return await analyze_with_mistral(text, custom_prompt, model, username, deadline)
+
+    result = await analysis_flight.run(flight_key(text, custom_prompt, model), lead)
+    if result.get("fallback") and not led:
+        result = fallback_rule_based_analysis(text, username)
+    return result
+
+def persist_analysis(username, document_name, text, custom_prompt, result):
+    """Save a model analysis in the project folder; rule-based fallbacks are not saved"""
+    if result.get("fallback"):
+        return
+    try:
+        analysis_store.save(username, document_name, text, custom_prompt, result)
+    except Exception as e:
+        logger.warning("analysis_save_failed", extra={"username": username, "document_name": document_name, "error": str(e)})
+
+async def precompute_analysis(text, username, document_name):
+    """Analyze an uploaded document with the default prompt and save the result, after the upload response"""
+    if analysis_store.load(username, document_name, text) is not None:
+        return
+    deadline = deadline_after(analyze_deadline_seconds(len(text)))
+    model = model_router.route("analyze", len(text), "", deadline).model
+    started = time.perf_counter()
+    try:
+        result = await shared_analysis(text, "", model, username, deadline)
+    except Exception as e:
+        logger.warning("analysis_precompute_failed", extra={"username": username, "document_name": document_name, "error": str(e)})
+        return
+    # Marked only in the saved copy; the result may be shared with a waiting /analyze
+    persist_analysis(username, document_name, text, "", dict(result, precomputed=True))
+    logger.info("analysis_precomputed", extra={
+        "username": username,
+        "document_name": document_name,
+        "fallback": bool(result.get("fallback")),
+        "seconds": round(time.perf_counter() - started, 2),
+    })
+
+async def analyze_incremental(text, custom_prompt, model, username, document_name, deadline):
+    """Re-analyze only the paragraphs that changed since the last analysis of this document"""
+    cache_key = (username, document_name, custom_prompt, model)
+    entry = paragraph_cache.get(cache_key)
+    paragraphs, reused_issues, changed = incremental_analysis.plan(text, entry)
+
+    if entry is None or len(changed) > len(paragraphs) * incremental_analysis.INCREMENTAL_MAX_CHANGED_RATIO:
+        result = await shared_analysis(text, custom_prompt, model, username, deadline)
+        # Rule-based fallback results are not cached as model analyses
+        if not result.get("fallback"):
+            document_fields = {field: result[field] for field in incremental_analysis.DOCUMENT_FIELDS if field in result}
+            paragraph_cache.store(cache_key, text, result["issues"], document_fields, paragraphs)
+        return result
+
+    new_issues = []
+    if changed:
+        try:
+            new_issues = await analyze_paragraphs_with_mistral(text, paragraphs, changed, model, username, deadline)
+        except Exception as e:
+            logger.error("incremental_analyze_failed", extra={"error": str(e)})
+            FALLBACK_ANALYSIS_TOTAL.inc(reason="incremental_exception")
+            return fallback_rule_based_analysis(text, username)
+
+    with phase("highlighting"):
+        all_issues = sorted(reused_issues + new_issues, key=lambda issue: issue["start"])
+        paragraph_cache.store(cache_key, text, all_issues, entry["document"], paragraphs)
+        all_issues = merge_suggestions(all_issues)
+        issues_found = [format_issue(issue) for issue in all_issues]
+        highlighted = render_highlighted(text, all_issues)
+
+    logger.info("analyze_incremental_complete", extra={
+        "username": username,
+        "paragraphs": len(paragraphs),
+        "reanalyzed": len(changed),
+        "issues": len(all_issues),
+    })
+    result = dict(entry["document"])
+    result.update({
+        "highlighted_text": highlighted,
+        "issues_found": issues_found,
+        "total_issues": len(issues_found),
+        "issues": all_issues,
+        "incremental": {
+            "paragraphs": len(paragraphs),
+            "reanalyzed": len(changed),
+            "cached": len(paragraphs) - len(changed),
+        },
+    })
+    return result
+
+@app.post("/document-stats")
+async def get_document_stats(payload: DocumentStatsRequest):
+    """Readability and sentence-structure metrics: Flesch, Gunning fog, passive voice, long sentences"""
+    with phase("stats"):
+        stats = compute_stats(payload.text)
+    return stats.to_dict(payload.include_sentences)
+
+@app.post("/spell-check")
+async def spell_check(payload: SpellCheckRequest):
+    """Check every word against the spelling index and the user's dictionary"""
+    if spelling.get_index() is None:
+        raise HTTPException(status_code=503, detail="Spelling index is not configured (set SPELLING_WORDLIST)")
+    with phase("rules"):
+        issues = spelling.check_text(payload.text, payload.username)
+    return {"issues": issues, "total_issues": len(issues)}
+
+@app.get("/dictionary/{username}")
+async def get_user_dictionary(username: str):
+    """Words in a user's custom spelling dictionary"""
+    return {"username": username, "words": sorted(spelling.user_words(username))}
+
+@app.post("/dictionary/{username}")
+async def add_to_user_dictionary(username: str, payload: DictionaryWordsRequest):
+    """Add words to a user's custom spelling dictionary"""
+    if username == "anonymous":
+        raise HTTPException(status_code=400, detail="A username is required")
+    words = [word for word in payload.words if isinstance(word, str)]
+    return {"username": username, "words": spelling.add_user_words(username, words)}
+
+@app.get("/rule-packs")
+async def list_rule_packs(username: str = None):
+    """Loaded rule packs, and the ones that apply to a user"""
+    packs = rule_packs.registry.packs()
+    return {
+        "packs": [
+            {"name": pack.name, "version": pack.version, "digest": pack.digest, "rules": len(pack.rules)}
+            for pack in packs.values()
+        ],
+        "active": rule_packs.registry.pack_names(username),
+    }
+
+async def analyze_cascade(text, custom_prompt, model, username, document_name, deadline, stream=False):
+    """Run the rule engine, then Mistral on the paragraphs the rules flag, and merge the findings"""
+    with phase("rules"):
+        stats = compute_stats(text)
+        rule_issues = run_rules(text, stats, username)
+    paragraphs = incremental_analysis.split_paragraphs(text)
+    flagged = cascade.flag_paragraphs(paragraphs, rule_issues)
+
+    # Paragraphs Mistral already checked for this document are taken from the cache
+    cache_key = ("cascade", username, document_name, custom_prompt, model) if document_name else None
+    entry = paragraph_cache.get(cache_key) if cache_key else None
+    cached = entry["paragraphs"] if entry else {}
+    reused_issues = []
+    targets = []
+    for index in flagged:
+        paragraph = paragraphs[index]
+        previous = cached.get(paragraph.digest)
+        if previous is None:
+            targets.append(index)
+        else:
+            reused_issues.extend(shift_issues(previous, paragraph.start))
+
+    cascade_stats = {
+        "paragraphs": len(paragraphs),
+        "flagged": len(flagged),
+        "sent_to_model": len(targets),
+        "cached": len(flagged) - len(targets),
+    }
+
+    def build_result(issues, stage):
+        with phase("highlighting"):
+            issues = merge_suggestions(issues)
+            issues_found = [format_issue(issue) for issue in issues]
+            highlighted = render_highlighted(text, issues)
+        return {
+            "stage": stage,
+            "highlighted_text": highlighted,
+            "issues_found": issues_found,
+            "total_issues": len(issues_found),
+            "issues": issues,
+            "document_stats": stats.summary(),
+            "cascade": cascade_stats,
+        }
+
+    async def final_result():
+        llm_issues = []
+        if targets:
+            try:
+                llm_issues = await analyze_paragraphs_with_mistral(text, paragraphs, targets, model, username, deadline)
+            except Exception as e:
+                # The rule findings stand on their own; report them without the model's
+                logger.error("cascade_analyze_failed", extra={"error": str(e)})
+                FALLBACK_ANALYSIS_TOTAL.inc(reason="cascade_exception")
+                cascade_stats["model_error"] = True
+                return build_result(rule_issues, "final")
+        model_issues = reused_issues + llm_issues
+        if cache_key:
+            paragraph_cache.store(cache_key, text, model_issues, {}, paragraphs, covered=flagged)
+        logger.info("analyze_cascade_complete", extra={"username": username, **cascade_stats})
+        return build_result(rule_issues + model_issues, "final")
+
+    if not stream:
+        return await final_result()
+
+    async def stages():
+        yield json.dumps(build_result(rule_issues, "rules"), ensure_ascii=False) + "\n"
+        yield json.dumps(await final_result(), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stages(), media_type="application/x-ndjson")
+
+async def analyze_paragraphs_with_mistral(text, paragraphs, indices, model, username, deadline):
+    """
+    Check only some paragraphs of text with Mistral
+
+    Args:
+        text (str): The whole document
+        paragraphs (list): incremental_analysis.split_paragraphs(text)
+        indices (list): Paragraphs to check, in document order; their neighbours are sent as context
+
+    Returns:
+        list: Structured issues located inside the checked paragraphs
+
+    Raises:
+        Exception: Mistral errors, CircuitOpenError and DeadlineExceeded are left to the caller
+    """
+    response = await chat_complete_async(
+        "/analyze",
+        model=model,
+        messages=[
+            {"role": "system", "content": incremental_analysis.PARAGRAPH_SYSTEM_PROMPT},
+            {"role": "user", "content": incremental_analysis.build_prompt(text, paragraphs, indices)}
+        ],
+        client=mistral_client,
+        deadline=deadline,
+        username=username,
+        response_format={
+            "type": "json_object"
+        }
+    )
+    with phase("parsing"):
+        ai_data, _ = parse_model_json(response.choices[0].message.content)
+    candidates = [
+        make_issue(issue.get("category", "Issue"), issue["original_text"], issue["suggested_text"], issue.get("explanation", ""))
+        for issue in (ai_data.get("issues", []) if isinstance(ai_data, dict) else [])
+        if isinstance(issue, dict) and issue.get("original_text") and issue.get("suggested_text")
+    ]
+    return incremental_analysis.anchor_in_paragraphs(text, candidates, paragraphs, indices)
+
+async def analyze_with_mistral(text, custom_prompt, model, username, deadline):
+    """Run the Mistral analysis, falling back to the rule engine on failure"""
     try:
         # Use Mistral AI for intelligent document analysis
         base_system_prompt = """You are a comprehensive document intelligence agent - a senior editor who combines technical precision with strategic insight and contextual awareness.
@@ -178,36 +561,60 @@ async def analyze_text(payload: AnalyzeRequest):
 
         user_prompt = f"Please analyze this legal document and identify specific text corrections:\n\n{text}"
         
-        # Call Mistral AI
-        response = mistral_client.chat.complete(
-            model="mistral-large-latest",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={
-                "type": "json_object"
-            }
-        )
-        
-        ai_response = response.choices[0].message.content
-        print(f"AI Response: {ai_response}")  # Debug print
+        # Call Mistral AI; a small-model answer that fails validation is retried on the large model
+        while True:
+            response = await chat_complete_async(
+                "/analyze",
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                client=mistral_client,
+                deadline=deadline,
+                username=username,
+                response_format={
+                    "type": "json_object"
+                }
+            )
+            
+            ai_response = response.choices[0].message.content
+            logger.debug("analyze_ai_response", extra={"model": model, "response": ai_response})
+            
+            try:
+                # Tolerates code fences, trailing commas and truncation, keeping every complete issue
+                with phase("parsing"):
+                    ai_data, repaired = parse_model_json(ai_response)
+                if repaired:
+                    MODEL_OUTPUT_REPAIRED_TOTAL.inc(endpoint="/analyze", model=model)
+                    logger.warning("analyze_response_repaired", extra={"model": model, "response_chars": len(ai_response)})
+                problem = model_router.validate_analysis(ai_data)
+            except ValueError:
+                ai_data = None
+                problem = "invalid_json"
+            if problem is None:
+                break
+            next_model = model_router.escalate("analyze", model, problem, deadline)
+            if next_model is None:
+                break
+            model = next_model
         
         # Parse the AI response
         try:
-            ai_data = json.loads(ai_response)
+            if ai_data is None:
+                raise json.JSONDecodeError("Model response is not valid JSON", ai_response, 0)
             issues = ai_data.get("issues", [])
             document_intelligence = ai_data.get("document_intelligence", {})
             real_time_suggestions = ai_data.get("real_time_suggestions", [])
             projected_recommendations = ai_data.get("projected_recommendations", [])
             appeal_score = ai_data.get("appeal_score", {})
         except json.JSONDecodeError:
-            print("Failed to parse AI response as JSON, falling back to rule-based analysis")
-            return fallback_rule_based_analysis(text)
+            logger.warning("analyze_json_decode_failed", extra={"response_chars": len(ai_response)})
+            FALLBACK_ANALYSIS_TOTAL.inc(reason="json_decode")
+            return fallback_rule_based_analysis(text, username)
         
         # Process the AI suggestions and create highlighted text
-        highlighted = text
-        issues_found = []
+        highlighting_start = time.perf_counter()
         contextual_insights = []
         strategic_recommendations = []
         
@@ -245,73 +652,40 @@ async def analyze_text(payload: AnalyzeRequest):
         competitive_advantages = appeal_score.get("competitive_advantages", [])
         
         # Don't sort issues - keep original order to maintain index consistency
-        for issue_index, issue in enumerate(issues):
+        structured_issues = []
+        for issue in issues:
             original = issue.get("original_text", "")
             suggested = issue.get("suggested_text", "")
-            category = issue.get("category", "Issue")
-            explanation = issue.get("explanation", "")
-            appeal_impact = issue.get("appeal_impact", "")
-            context_fit = issue.get("context_fit", "")
-            
             if original and suggested:
-                # Create comprehensive issue entry
-                issue_text = f"{category}: {original} → {suggested}"
-                if explanation:
-                    issue_text += f" | {explanation}"
-                if appeal_impact:
-                    issue_text += f" | Appeal: {appeal_impact}"
-                if context_fit:
-                    issue_text += f" | Context: {context_fit}"
-                
-                issues_found.append(issue_text)
-                
-                # Create highlight based on category with original category colors
-                if "spelling" in category.lower():
-                    highlight_style = "background-color: #ffe0e0; color: #a00; border-left: 3px solid #d00;"
-                elif "grammar" in category.lower():
-                    highlight_style = "background-color: #d4edda; color: #155724; border-left: 3px solid #28a745;"
-                elif "style" in category.lower():
-                    highlight_style = "background-color: #fff3cd; color: #856404; border-left: 3px solid #ffc107;"
-                elif "legal" in category.lower():
-                    highlight_style = "background-color: #e2e3f0; color: #383d41; border-left: 3px solid #007bff;"
-                elif "clarity" in category.lower():
-                    highlight_style = "background-color: #d1ecf1; color: #0c5460; border-left: 3px solid #17a2b8;"
-                elif "punctuation" in category.lower():
-                    highlight_style = "background-color: #f8d7da; color: #721c24; border-left: 3px solid #dc3545;"
-                elif "formatting" in category.lower():
-                    highlight_style = "background-color: #e2e3f0; color: #383d41; border-left: 3px solid #6f42c1;"
-                else:
-                    highlight_style = "background-color: #f8f9fa; color: #495057; border-left: 3px solid #6c757d;"
-                
-                # Create comprehensive tooltip
-                tooltip_parts = [f"CHANGE: {original} → {suggested}"]
-                if explanation:
-                    tooltip_parts.append(f"WHY: {explanation}")
-                if appeal_impact:
-                    tooltip_parts.append(f"APPEAL: {appeal_impact}")
-                if context_fit:
-                    tooltip_parts.append(f"CONTEXT: {context_fit}")
-                
-                tooltip_text = " | ".join(tooltip_parts)
-                
-                # Replace text with highlighted version
-                pattern = re.compile(re.escape(original), re.IGNORECASE)
-                if pattern.search(highlighted):
-                    highlighted = pattern.sub(
-                        f"<span style='{highlight_style} padding: 2px 4px; border-radius: 3px;' title='{tooltip_text}' data-issue-index='{issue_index}'>{original}</span>",
-                        highlighted,
-                        count=1
-                    )
-        
-        print(f"Final highlighted text: {highlighted[:200]}...")  # Debug print
-        print(f"Issues found: {issues_found}")  # Debug print
-        print(f"Contextual insights: {contextual_insights}")  # Debug print
-        print(f"Strategic recommendations: {strategic_recommendations}")  # Debug print
+                structured_issues.append(make_issue(
+                    issue.get("category", "Issue"),
+                    original,
+                    suggested,
+                    issue.get("explanation", ""),
+                    appeal_impact=issue.get("appeal_impact", ""),
+                    context_fit=issue.get("context_fit", ""),
+                ))
+        
+        # Resolve snippets to offsets in the raw text, in reported order, then highlight by offset
+        anchor_issues(text, structured_issues)
+        structured_issues = merge_suggestions(structured_issues)
+        issues_found = [format_issue(issue) for issue in structured_issues]
+        highlighted = render_highlighted(text, structured_issues)
+        
+        record("highlighting", time.perf_counter() - highlighting_start)
+        logger.info("analyze_complete", extra={
+            "username": username,
+            "issues": len(issues_found),
+            "insights": len(contextual_insights),
+            "recommendations": len(strategic_recommendations),
+        })
+        logger.debug("analyze_result", extra={"highlighted_text": highlighted, "issues_found": issues_found})
         
         return {
             "highlighted_text": highlighted,
             "issues_found": issues_found,
             "total_issues": len(issues_found),
+            "issues": structured_issues,
             "document_intelligence": {
                 "type": doc_type,
                 "purpose": doc_purpose,
@@ -328,170 +702,46 @@ async def analyze_text(payload: AnalyzeRequest):
             "colleague_analysis": f"📋 {doc_type}" + (f" - {context_assessment}" if context_assessment else "")
         }
         
+    except CircuitOpenError as e:
+        # Mistral is failing; answer from the rule engine without waiting on it
+        logger.warning("analyze_circuit_open", extra={"retry_after": round(e.retry_after, 1)})
+        FALLBACK_ANALYSIS_TOTAL.inc(reason="circuit_open")
+        return fallback_rule_based_analysis(text, username)
+    except DeadlineExceeded as e:
+        logger.warning("analyze_deadline_exceeded", extra={"error": str(e)})
+        FALLBACK_ANALYSIS_TOTAL.inc(reason="deadline")
+        return fallback_rule_based_analysis(text, username)
     except Exception as e:
-        print(f"Error with Mistral AI analysis: {e}")
+        logger.error("analyze_failed", extra={"error": str(e)})
         # Fallback to rule-based analysis
-        return fallback_rule_based_analysis(text)
+        FALLBACK_ANALYSIS_TOTAL.inc(reason="exception")
+        return fallback_rule_based_analysis(text, username)
 
-def fallback_rule_based_analysis(text):
+def fallback_rule_based_analysis(text, username=None):
     """Fallback function with the original rule-based analysis"""
-    import re
-    highlighted = text
-    issues_found = []
-    
-    # 1. SPELLING ERRORS
-    spelling_errors = {
-        "wheras": "whereas",
-        "herebye": "hereby",
-        "aforementionedly": "aforementioned",
-        "cuboard": "cupboard",
-        "seperate": "separate",
-        "recieve": "receive",
-        "occured": "occurred",
-        "judgement": "judgment",
-        "priviledge": "privilege",
-        "neccessary": "necessary",
-        "occassion": "occasion",
-        "beleive": "believe",
-        "acheive": "achieve",
-    }
-    
-    issue_index = 0
-    for error, suggestion in spelling_errors.items():
-        pattern = re.compile(rf"\b({error})\b", re.IGNORECASE)
-        if pattern.search(highlighted):
-            issues_found.append(f"Spelling: {error} → {suggestion}")
-            highlighted = pattern.sub(
-                rf"<span style='background-color: #ffe0e0; color: #a00;' title='Spelling error: Did you mean \"{suggestion}\"?' data-issue-index='{issue_index}'>\1</span>",
-                highlighted,
-            )
-            issue_index += 1
-    
-    # 2. LEGAL WRITING STYLE ISSUES
-    style_issues = {
-        r"\bI think\b": ("I think", "I believe"),
-        r"\bmight\b": ("might", "may"),
-        r"\bkinda\b": ("kinda", "somewhat"),
-        r"\bgonna\b": ("gonna", "going to"),
-        r"\bwanna\b": ("wanna", "want to"),
-        r"\bretty\b": ("pretty", "rather"),
-        r"\bokay\b": ("okay", "acceptable"),
-        r"\bOK\b": ("OK", "acceptable"),
-    }
-    
-    for pattern_str, (error_word, suggestion) in style_issues.items():
-        pattern = re.compile(pattern_str, re.IGNORECASE)
-        matches = pattern.findall(highlighted)
-        if matches:
-            for match in matches:
-                issues_found.append(f"Style: {match} → {suggestion}")
-            highlighted = pattern.sub(
-                rf"<span style='background-color: #fff3cd; color: #856404;' title='Style issue: Use \"{suggestion}\" instead' data-issue-index='{issue_index}'>\g<0></span>",
-                highlighted,
-            )
-            issue_index += 1
-    
-    # 3. GRAMMAR AND PUNCTUATION
-    grammar_issues = {
-        r"\b(it's)\b(?=\s+(own|purpose|jurisdiction))": ("it's", "its"),
-        r"\b(your)\b(?=\s+going)": ("your", "you're"),
-        r"\b(there)\b(?=\s+(going|being))": ("there", "they're"),
-        r"\s{2,}": ("  ", " "),  # Multiple spaces to single space
-        r"[.]{2,}": ("...", "..."),  # Multiple periods to ellipsis
-    }
-    
-    for pattern_str, (error_text, suggestion) in grammar_issues.items():
-        pattern = re.compile(pattern_str, re.IGNORECASE)
-        matches = pattern.findall(highlighted)
-        if matches:
-            for match in matches:
-                if isinstance(match, tuple):
-                    match = match[0]  # Take first group if it's a tuple
-                issues_found.append(f"Grammar: {match} → {suggestion}")
-            highlighted = pattern.sub(
-                rf"<span style='background-color: #d4edda; color: #155724;' title='Grammar issue: Use \"{suggestion}\" instead' data-issue-index='{issue_index}'>\g<0></span>",
-                highlighted,
-            )
-            issue_index += 1
-    
-    # Special case for word repetition
-    repetition_pattern = r"(\w+)\s+(\w+)\s+\1\s+\2"
-    repetition_matches = re.findall(repetition_pattern, highlighted, re.IGNORECASE)
-    if repetition_matches:
-        for match in repetition_matches:
-            repeated_phrase = f"{match[0]} {match[1]}"
-            issues_found.append(f"Grammar: {repeated_phrase} {repeated_phrase} → {repeated_phrase}")
-        highlighted = re.sub(
-            repetition_pattern,
-            rf"<span style='background-color: #d4edda; color: #155724;' title='Grammar issue: Remove repeated words' data-issue-index='{issue_index}'>\1 \2 \1 \2</span>",
-            highlighted,
-            flags=re.IGNORECASE
-        )
-        issue_index += 1
-    
-    # 4. LEGAL TERMINOLOGY IMPROVEMENTS
-    legal_improvements = {
-        r"\baccording to\b": ("according to", "pursuant to"),
-        r"\babout\b": ("about", "regarding"),
-        r"\bbecause\b": ("because", "due to"),
-        r"\bget\b": ("get", "obtain"),
-        r"\bshow\b": ("show", "demonstrate"),
-        r"\bbig\b": ("big", "substantial"),
-        r"\bthing\b": ("thing", "matter"),
-    }
-    
-    for pattern_str, (error_word, suggestion) in legal_improvements.items():
-        pattern = re.compile(pattern_str, re.IGNORECASE)
-        matches = pattern.findall(highlighted)
-        if matches:
-            for match in matches:
-                issues_found.append(f"Legal terminology: {match} → {suggestion}")
-            highlighted = pattern.sub(
-                rf"<span style='background-color: #e2e3f0; color: #383d41;' title='Legal terminology: Consider \"{suggestion}\" for formal tone' data-issue-index='{issue_index}'>\g<0></span>",
-                highlighted,
-            )
-            issue_index += 1
-    
-    # 5. SENTENCE STRUCTURE ANALYSIS
-    sentences = re.split(r'[.!?]+', text)
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if sentence:
-            # Check for overly long sentences (>40 words)
-            word_count = len(sentence.split())
-            if word_count > 40:
-                issues_found.append(f"Sentence structure: Consider breaking down long sentence ({word_count} words)")
-            
-            # Check for passive voice (basic detection)
-            passive_patterns = [r'\bis\s+\w+ed\b', r'\bwas\s+\w+ed\b', r'\bwere\s+\w+ed\b', r'\bbeen\s+\w+ed\b']
-            for passive_pattern in passive_patterns:
-                if re.search(passive_pattern, sentence, re.IGNORECASE):
-                    issues_found.append("Writing style: Consider using active voice for clarity")
-                    break
-
-    print(f"Fallback analysis - Final highlighted text: {highlighted[:200]}...")  # Debug print
-    print(f"Fallback analysis - Issues found: {issues_found}")  # Debug print
+    start = time.perf_counter()
+    stats = compute_stats(text)
+    issues = merge_suggestions(run_rules(text, stats, username))
+    issues_found = [format_issue(issue) for issue in issues]
+    highlighted = render_highlighted(text, issues)
+
+    record("rules", time.perf_counter() - start)
+    logger.debug("fallback_analysis_result", extra={"highlighted_text": highlighted, "issues_found": issues_found})
     
     return {
         "highlighted_text": highlighted,
         "issues_found": issues_found,
-        "total_issues": len(issues_found)
+        "total_issues": len(issues_found),
+        "issues": issues,
+        "document_stats": stats.summary(),
+        "fallback": True
     }
 
 @app.post("/log-change")
 async def log_change(payload: LogChangeRequest):
     """Log applied changes to a user-specific document log file"""
     try:
-        # Create logs directory if it doesn't exist
-        import os
-        logs_dir = "logs"
-        if not os.path.exists(logs_dir):
-            os.makedirs(logs_dir)
-        
-        # Create user-specific directory
-        user_logs_dir = os.path.join(logs_dir, payload.username)
-        if not os.path.exists(user_logs_dir):
-            os.makedirs(user_logs_dir)
+        storage = get_storage()
         
         # Sanitize document name for filename
         safe_doc_name = "".join(c for c in payload.document_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
@@ -500,7 +750,7 @@ async def log_change(payload: LogChangeRequest):
             safe_doc_name = "untitled_document"
         
         # Create document-specific log file
-        log_file_path = os.path.join(user_logs_dir, f"{safe_doc_name}_changes.txt")
+        log_file_path = join_key("logs", payload.username, f"{safe_doc_name}_changes.txt")
         
         # Create log entry
         log_entry = f"""
@@ -516,10 +766,20 @@ REASON: {payload.reason if payload.reason else "No reason provided"}
 """
         
         # Append to log file
-        with open(log_file_path, "a", encoding="utf-8") as log_file:
-            log_file.write(log_entry)
+        log_file_path = storage.append_text(log_file_path, log_entry)
+
+        # Count the change towards the user's learned corrections
+        try:
+            learned_corrections.record(payload.username, payload.original_text, payload.suggested_text, payload.category)
+        except Exception as e:
+            logger.warning("learned_correction_failed", extra={"username": payload.username, "error": str(e)})
         
-        print(f"Logged change for user {payload.username}: {payload.category} - {payload.original_text} → {payload.suggested_text}")
+        logger.info("change_logged", extra={
+            "username": payload.username,
+            "category": payload.category,
+            "original_text": payload.original_text,
+            "suggested_text": payload.suggested_text,
+        })
         
         return {
             "status": "success",
@@ -527,26 +787,37 @@ REASON: {payload.reason if payload.reason else "No reason provided"}
             "log_file": log_file_path
         }
     except Exception as e:
-        print(f"Error logging change: {e}")
+        logger.error("log_change_failed", extra={"error": str(e)})
         return {
             "status": "error",
             "message": f"Failed to log change: {str(e)}"
         }
 
+@app.get("/corrections/{username}")
+async def get_learned_corrections(username: str):
+    """A user's accepted changes, most frequent first, and the ones applied as instant suggestions"""
+    table = learned_corrections.table(username)
+    return {
+        "username": username,
+        "min_accepts": learned_corrections.min_accepts,
+        "corrections": table.ranked(),
+        "active": len(table.active(learned_corrections.min_accepts)),
+    }
+
 @app.get("/get-log")
 async def get_log():
     """Retrieve the contents of the changes log file (legacy endpoint)"""
     try:
+        storage = get_storage()
         log_file_path = "changes_log.txt"
-        if not os.path.exists(log_file_path):
+        if not storage.resolve(log_file_path):
             return {
                 "status": "success",
                 "log_content": "No changes have been logged yet.",
                 "total_entries": 0
             }
         
-        with open(log_file_path, "r", encoding="utf-8") as log_file:
-            content = log_file.read()
+        content = storage.read_text(log_file_path)
         
         # Count entries by counting the separator lines
         entry_count = content.count("==========================================") // 2
@@ -557,7 +828,7 @@ async def get_log():
             "total_entries": entry_count
         }
     except Exception as e:
-        print(f"Error reading log file: {e}")
+        logger.error("read_log_failed", extra={"error": str(e)})
         return {
             "status": "error",
             "message": f"Failed to read log file: {str(e)}",
@@ -575,9 +846,10 @@ async def get_user_document_log(username: str, document_name: str):
         if not safe_doc_name:
             safe_doc_name = "untitled_document"
         
-        log_file_path = os.path.join("logs", username, f"{safe_doc_name}_changes.txt")
+        storage = get_storage()
+        log_file_path = join_key("logs", username, f"{safe_doc_name}_changes.txt")
         
-        if not os.path.exists(log_file_path):
+        if not storage.resolve(log_file_path):
             return {
                 "status": "success",
                 "log_content": f"No changes have been logged yet for document '{document_name}' by user '{username}'.",
@@ -586,8 +858,7 @@ async def get_user_document_log(username: str, document_name: str):
                 "username": username
             }
         
-        with open(log_file_path, "r", encoding="utf-8") as log_file:
-            content = log_file.read()
+        content = storage.read_text(log_file_path)
         
         # Count entries by counting the separator lines
         entry_count = content.count("==========================================") // 2
@@ -600,7 +871,7 @@ async def get_user_document_log(username: str, document_name: str):
             "username": username
         }
     except Exception as e:
-        print(f"Error reading user document log: {e}")
+        logger.error("read_document_log_failed", extra={"error": str(e)})
         return {
             "status": "error",
             "message": f"Failed to read log file: {str(e)}",
@@ -614,9 +885,11 @@ async def get_user_document_log(username: str, document_name: str):
 async def get_user_logs(username: str):
     """Retrieve all document logs for a specific user"""
     try:
-        user_logs_dir = os.path.join("logs", username)
+        storage = get_storage()
+        user_logs_dir = join_key("logs", username)
+        _, log_files = storage.list_dir(user_logs_dir)
         
-        if not os.path.exists(user_logs_dir):
+        if not log_files:
             return {
                 "status": "success",
                 "documents": [],
@@ -625,20 +898,18 @@ async def get_user_logs(username: str):
             }
         
         documents = []
-        for filename in os.listdir(user_logs_dir):
+        for stat in log_files:
+            filename = logical_name(stat["name"])
             if filename.endswith("_changes.txt"):
                 doc_name = filename.replace("_changes.txt", "").replace("_", " ")
-                file_path = os.path.join(user_logs_dir, filename)
-                
-                # Get file stats
-                stat = os.stat(file_path)
+                file_path = f"{user_logs_dir}/{filename}"
                 
-                # Count entries
+                # Count entries line by line so large logs are streamed
                 entry_count = 0
                 try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        entry_count = content.count("==========================================") // 2
+                    with storage.open_text_reader(file_path) as f:
+                        separators = sum(1 for line in f if line.startswith("=========================================="))
+                        entry_count = separators // 2
                 except:
                     entry_count = 0
                 
@@ -646,7 +917,7 @@ async def get_user_logs(username: str):
                     "document_name": doc_name,
                     "filename": filename,
                     "total_entries": entry_count,
-                    "last_modified": stat.st_mtime
+                    "last_modified": stat["modified"]
                 })
         
         # Sort by last modified (newest first)
@@ -659,7 +930,7 @@ async def get_user_logs(username: str):
             "username": username
         }
     except Exception as e:
-        print(f"Error reading user logs: {e}")
+        logger.error("read_user_logs_failed", extra={"error": str(e)})
         return {
             "status": "error",
             "message": f"Failed to read user logs: {str(e)}",
@@ -671,6 +942,7 @@ async def get_user_logs(username: str):
 @app.post("/legal-advice")
 async def get_legal_advice(payload: LegalAdviceRequest):
     """Get AI-powered legal advice and analysis using Mistral AI"""
+    deadline = deadline_after(CHAT_DEADLINE_SECONDS)
     
     if not mistral_client:
         return {
@@ -712,9 +984,13 @@ Please provide:
             {"role": "user", "content": user_prompt}
         ]
         
-        chat_response = mistral_client.chat.complete(
-            model="mistral-large-latest",
+        model = model_router.route("legal-advice", len(payload.text), deadline=deadline).model
+        chat_response = await chat_complete_async(
+            "/legal-advice",
+            model=model,
             messages=messages,
+            client=mistral_client,
+            deadline=deadline,
             temperature=0.3,  # Lower temperature for more focused legal advice
             max_tokens=1500
         )
@@ -723,12 +999,20 @@ Please provide:
         
         return {
             "advice": advice,
-            "model_used": "mistral-large-latest",
+            "model_used": model,
             "success": True
         }
         
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning("legal_advice_unavailable", extra={"error": str(e)})
+        return {
+            "advice": "Legal advice is temporarily unavailable because the AI service is not responding. Please try again shortly.",
+            "error": str(e),
+            "retry_after": round(getattr(e, "retry_after", 0)),
+            "success": False
+        }
     except Exception as e:
-        print(f"Error getting legal advice: {e}")
+        logger.error("legal_advice_failed", extra={"error": str(e)})
         return {
             "advice": f"Sorry, I encountered an error while generating legal advice: {str(e)}",
             "error": str(e),
@@ -742,22 +1026,22 @@ async def chat_with_document(payload: ChatRequest):
     question = payload.question
     username = payload.username
     document_name = payload.document_name
+    deadline = deadline_after(CHAT_DEADLINE_SECONDS)
     
-    print(f"Chat question: {question}")  # Debug print
-    print(f"Document text: {text[:100]}...")  # Debug print (first 100 chars)
+    logger.info("chat_request", extra={"username": username, "document_name": document_name, "text_chars": len(text)})
+    logger.debug("chat_input", extra={"question": question, "text": text})
 
     # Log the chat request if document info is provided
     if username != "anonymous" and document_name:
         try:
-            user_projects_dir = os.path.join("projects", username)
-            document_folder = os.path.join(user_projects_dir, document_name)
-            if os.path.exists(document_folder):
-                log_file_path = os.path.join(document_folder, f"{document_name}_activity.log")
+            storage = get_storage()
+            document_folder = join_key("projects", username, document_name)
+            if storage.dir_exists(document_folder):
+                log_file_path = f"{document_folder}/{document_name}_activity.log"
                 log_entry = f"[{datetime.now().isoformat()}] CHAT - Question asked: '{question}' (User: {username})\n"
-                with open(log_file_path, "a", encoding="utf-8") as log_file:
-                    log_file.write(log_entry)
+                storage.append_text(log_file_path, log_entry)
         except Exception as e:
-            print(f"Error logging chat: {e}")
+            logger.warning("activity_log_failed", extra={"action": "chat", "error": str(e)})
 
     if not mistral_client:
         return {
@@ -795,24 +1079,37 @@ Please answer this question: {question}
 Provide a helpful, specific answer based on the document content."""
         
         # Call Mistral AI for conversational response
-        response = mistral_client.chat.complete(
-            model="mistral-large-latest",
+        model = model_router.route("chat", len(text), deadline=deadline).model
+        response = await chat_complete_async(
+            "/chat",
+            model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
-            ]
+            ],
+            client=mistral_client,
+            deadline=deadline,
+            username=username
         )
         
         ai_response = response.choices[0].message.content
-        print(f"AI Chat Response: {ai_response[:200]}...")  # Debug print
+        logger.debug("chat_ai_response", extra={"response": ai_response})
         
         return {
             "response": ai_response,
             "success": True
         }
         
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning("chat_unavailable", extra={"error": str(e)})
+        return {
+            "response": "AI chat is temporarily unavailable because the AI service is not responding. Please try again shortly.",
+            "error": str(e),
+            "retry_after": round(getattr(e, "retry_after", 0)),
+            "success": False
+        }
     except Exception as e:
-        print(f"Error with chat response: {e}")
+        logger.error("chat_failed", extra={"error": str(e)})
         return {
             "response": f"Sorry, I encountered an error while processing your question: {str(e)}",
             "error": str(e),
@@ -820,7 +1117,7 @@ Provide a helpful, specific answer based on the document content."""
         }
 
 @app.post("/upload-pdf")
-async def upload_document(file: UploadFile = File(...), username: str = Form("anonymous")):
+async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...), username: str = Form("anonymous")):
     # Check if the file is a PDF or DOCX
     allowed_types = ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
     
@@ -828,31 +1125,19 @@ async def upload_document(file: UploadFile = File(...), username: str = Form("an
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
     
     try:
-        # Create projects folder structure: projects/username/documentname
-        projects_dir = "projects"
-        if not os.path.exists(projects_dir):
-            os.makedirs(projects_dir)
-        
-        # Create user-specific directory
-        user_projects_dir = os.path.join(projects_dir, username)
-        if not os.path.exists(user_projects_dir):
-            os.makedirs(user_projects_dir)
+        # Projects folder structure: projects/username/documentname
+        storage = get_storage()
         
         # Generate document folder name (remove file extension and sanitize)
         document_name = os.path.splitext(file.filename)[0]
         # Sanitize document name for folder creation
         document_name = re.sub(r'[<>:"/\\|?*]', '_', document_name)
-        document_folder = os.path.join(user_projects_dir, document_name)
-        
-        # Create document-specific folder
-        if not os.path.exists(document_folder):
-            os.makedirs(document_folder)
+        document_folder = join_key("projects", username, document_name)
         
         # Save original file in document folder
-        original_file_path = os.path.join(document_folder, file.filename)
-        with open(original_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        content = await file.read()
+        UPLOAD_SIZE_BYTES.observe(len(content), file_type="PDF" if file.content_type == "application/pdf" else "DOCX")
+        storage.write_bytes(f"{document_folder}/{os.path.basename(file.filename)}", content)
         
         # Create temporary file for processing
         file_extension = ".pdf" if file.content_type == "application/pdf" else ".docx"
@@ -864,23 +1149,25 @@ async def upload_document(file: UploadFile = File(...), username: str = Form("an
         is_pdf = file.content_type == "application/pdf"
         
         if is_pdf:
-            extracted_text = extract_text_from_pdf(temp_file_path)
+            # Per-page timing is recorded inside extract_text_from_pdf
+            with phase("extraction"):
+                extracted_text = extract_text_from_pdf(temp_file_path)
         else:
             if DOCX_SUPPORT:
-                extracted_text = extract_text_from_docx(temp_file_path)
+                # DOCX has no pages; the whole document counts as one
+                with phase("extraction"), Timer(EXTRACTION_SECONDS_PER_PAGE, file_type="DOCX"):
+                    extracted_text = extract_text_from_docx(temp_file_path)
             else:
                 extracted_text = "DOCX processing is temporarily unavailable. Please upload a PDF file instead."
         
         # Save extracted text in document folder
-        text_file_path = os.path.join(document_folder, f"{document_name}_extracted.txt")
-        with open(text_file_path, "w", encoding="utf-8") as text_file:
-            text_file.write(extracted_text)
+        text_file_path = f"{document_folder}/{document_name}_extracted.txt"
+        storage.write_text(text_file_path, extracted_text)
         
         # Create activity log for this document
-        log_file_path = os.path.join(document_folder, f"{document_name}_activity.log")
+        log_file_path = f"{document_folder}/{document_name}_activity.log"
         log_entry = f"[{datetime.now().isoformat()}] UPLOAD - Document uploaded: {file.filename} (User: {username})\n"
-        with open(log_file_path, "a", encoding="utf-8") as log_file:
-            log_file.write(log_entry)
+        storage.append_text(log_file_path, log_entry)
         
         # Clean up the temporary file
         os.unlink(temp_file_path)
@@ -888,6 +1175,10 @@ async def upload_document(file: UploadFile = File(...), username: str = Form("an
         if not extracted_text.strip():
             file_type = "PDF" if is_pdf else "DOCX"
             raise HTTPException(status_code=400, detail=f"Could not extract text from {file_type}")
+
+        # Warm-up: analyze with the default prompt while the user looks at the text
+        if analysis_store.PRECOMPUTE_ANALYSIS and mistral_client:
+            background_tasks.add_task(precompute_analysis, extracted_text, username, document_name)
         
         return {
             "text": extracted_text,
@@ -905,39 +1196,42 @@ async def upload_document(file: UploadFile = File(...), username: str = Form("an
 async def list_user_projects(username: str):
     """List all projects for a specific user"""
     try:
-        projects_dir = "projects"
-        user_projects_dir = os.path.join(projects_dir, username)
+        storage = get_storage()
+        user_projects_dir = join_key("projects", username)
         
-        if not os.path.exists(user_projects_dir):
+        # One recursive listing instead of one call per document folder
+        files_by_document = {}
+        for stats in storage.list_tree(user_projects_dir):
+            document_folder, sep, stored_file = stats["key"].partition("/")
+            if sep and "/" not in stored_file:
+                files_by_document.setdefault(document_folder, []).append(stats)
+        
+        if not files_by_document:
             return {"projects": [], "message": f"No projects found for user: {username}"}
         
         projects = []
-        for document_folder in os.listdir(user_projects_dir):
-            document_path = os.path.join(user_projects_dir, document_folder)
-            if os.path.isdir(document_path):
-                # Get files in the document folder
-                files = []
-                try:
-                    for file in os.listdir(document_path):
-                        file_path = os.path.join(document_path, file)
-                        if os.path.isfile(file_path):
-                            # Get file stats
-                            stats = os.stat(file_path)
-                            files.append({
-                                "name": file,
-                                "size": stats.st_size,
-                                "modified": datetime.fromtimestamp(stats.st_mtime).isoformat(),
-                                "type": "log" if file.endswith("_activity.log") else ("original" if not file.endswith("_extracted.txt") else "extracted")
-                            })
-                except Exception as e:
-                    print(f"Error reading files in {document_path}: {e}")
-                
-                projects.append({
-                    "document_name": document_folder,
-                    "path": document_path,
-                    "files": files,
-                    "created": datetime.fromtimestamp(os.path.getctime(document_path)).isoformat()
+        for document_folder, document_files in files_by_document.items():
+            # Get files in the document folder
+            files = []
+            for stats in document_files:
+                # Report compressed artifacts under their logical name
+                file = logical_name(stats["name"])
+                files.append({
+                    "name": file,
+                    "size": stats["size"],
+                    "modified": datetime.fromtimestamp(stats["modified"]).isoformat(),
+                    "type": "log" if file.endswith("_activity.log") else (
+                        "analysis" if file.startswith(analysis_store.FILE_PREFIX)
+                        else "original" if not file.endswith("_extracted.txt") else "extracted"
+                    )
                 })
+            
+            projects.append({
+                "document_name": document_folder,
+                "path": f"{user_projects_dir}/{document_folder}",
+                "files": files,
+                "created": datetime.fromtimestamp(min(f["modified"] for f in document_files)).isoformat()
+            })
         
         # Sort projects by creation date (newest first)
         projects.sort(key=lambda x: x["created"], reverse=True)
@@ -955,22 +1249,29 @@ async def list_user_projects(username: str):
 async def list_all_projects():
     """List all projects for all users"""
     try:
-        projects_dir = "projects"
-        
-        if not os.path.exists(projects_dir):
+        storage = get_storage()
+        
+        # Group one recursive listing by user and document folder
+        user_documents = {}
+        user_activity = {}
+        for stats in storage.list_tree("projects"):
+            parts = stats["key"].split("/")
+            if len(parts) < 3:
+                continue
+            username = parts[0]
+            user_documents.setdefault(username, set()).add(parts[1])
+            user_activity[username] = max(user_activity.get(username, 0), stats["modified"])
+        
+        if not user_documents:
             return {"users": [], "message": "No projects directory found"}
         
         all_users = []
-        for username in os.listdir(projects_dir):
-            user_path = os.path.join(projects_dir, username)
-            if os.path.isdir(user_path):
-                # Count documents for this user
-                document_count = len([d for d in os.listdir(user_path) if os.path.isdir(os.path.join(user_path, d))])
-                all_users.append({
-                    "username": username,
-                    "document_count": document_count,
-                    "last_activity": datetime.fromtimestamp(os.path.getmtime(user_path)).isoformat()
-                })
+        for username, documents in user_documents.items():
+            all_users.append({
+                "username": username,
+                "document_count": len(documents),
+                "last_activity": datetime.fromtimestamp(user_activity[username]).isoformat()
+            })
         
         # Sort users by last activity (newest first)
         all_users.sort(key=lambda x: x["last_activity"], reverse=True)
@@ -987,19 +1288,17 @@ async def list_all_projects():
 async def get_document_log(username: str, document_name: str):
     """Get the activity log for a specific document"""
     try:
-        projects_dir = "projects"
-        document_folder = os.path.join(projects_dir, username, document_name)
-        log_file_path = os.path.join(document_folder, f"{document_name}_activity.log")
+        storage = get_storage()
+        log_file_path = join_key("projects", username, document_name, f"{document_name}_activity.log")
         
-        if not os.path.exists(log_file_path):
+        if not storage.resolve(log_file_path):
             return {"log_entries": [], "message": "No activity log found for this document"}
         
-        with open(log_file_path, "r", encoding="utf-8") as log_file:
-            log_content = log_file.read()
-            
-        # Parse log entries
+        # Parse log entries while streaming the (possibly compressed) log
         log_entries = []
-        for line in log_content.strip().split('\n'):
+        with storage.open_text_reader(log_file_path) as log_file:
+            log_lines = [line.rstrip('\n') for line in log_file]
+        for line in log_lines:
             if line.strip():
                 # Parse log format: [timestamp] ACTION - description (User: username)
                 try:
@@ -1020,7 +1319,7 @@ async def get_document_log(username: str, document_name: str):
                                 "raw_line": line
                             })
                 except Exception as parse_error:
-                    print(f"Error parsing log line: {line}, Error: {parse_error}")
+                    logger.warning("log_line_parse_failed", extra={"line": line, "error": str(parse_error)})
                     log_entries.append({
                         "timestamp": "",
                         "action": "UNKNOWN",
@@ -1039,45 +1338,49 @@ async def get_document_log(username: str, document_name: str):
         raise HTTPException(status_code=500, detail=f"Error fetching document log: {str(e)}")
 
 @app.get("/projects/{username}/{document_name}/{file_name}")
-async def get_project_file(username: str, document_name: str, file_name: str):
+async def get_project_file(username: str, document_name: str, file_name: str, request: Request):
     """Serve a specific file from a user's project"""
     try:
-        projects_dir = "projects"
-        file_path = os.path.join(projects_dir, username, document_name, file_name)
+        storage = get_storage()
+        file_name = logical_name(file_name)
         
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Security check - ensure the file is within the projects directory
-        abs_file_path = os.path.abspath(file_path)
-        abs_projects_dir = os.path.abspath(projects_dir)
-        
-        if not abs_file_path.startswith(abs_projects_dir):
+        # Security check - keys may not escape the user's project folder
+        try:
+            file_path = join_key("projects", username, document_name, file_name)
+        except ValueError:
             raise HTTPException(status_code=403, detail="Access denied")
         
+        stored_file_path = storage.resolve(file_path)
+        if not stored_file_path:
+            raise HTTPException(status_code=404, detail="File not found")
+        
         # Read and return the file content
         if file_name.endswith('_extracted.txt') or file_name.endswith('_activity.log'):
-            # Serve text files directly
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
             if file_name.endswith('_activity.log'):
                 # For log files, return as downloadable content
-                from fastapi.responses import Response
-                return Response(
-                    content=content,
+                from fastapi.responses import FileResponse, StreamingResponse
+                headers = {"Content-Disposition": f"attachment; filename={file_name}"}
+                accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+                if codec_from_name(stored_file_path) == "gzip" and accepts_gzip:
+                    # Already gzip-encoded on disk - send the stored bytes as-is
+                    headers["Content-Encoding"] = "gzip"
+                    return FileResponse(storage.local_path(stored_file_path), media_type='text/plain', headers=headers)
+                return StreamingResponse(
+                    storage.iter_text_chunks(file_path),
                     media_type='text/plain',
-                    headers={"Content-Disposition": f"attachment; filename={file_name}"}
+                    headers=headers
                 )
             else:
+                # Serve text files directly
+                content = storage.read_text(file_path)
                 return {"content": content, "filename": file_name, "type": "text"}
         else:
             # For binary files, return file info
-            stats = os.stat(file_path)
+            stats = storage.stat(stored_file_path)
             return {
                 "filename": file_name,
-                "size": stats.st_size,
-                "modified": datetime.fromtimestamp(stats.st_mtime).isoformat(),
+                "size": stats["size"],
+                "modified": datetime.fromtimestamp(stats["modified"]).isoformat(),
                 "type": "binary",
                 "message": "Binary file - use direct download"
             }
@@ -1147,27 +1450,20 @@ async def save_transcript(request: Request):
         if not username:
             raise HTTPException(status_code=400, detail="Username is required")
         
-        # Create transcript directory structure
-        transcripts_dir = "transcripts"
-        if not os.path.exists(transcripts_dir):
-            os.makedirs(transcripts_dir)
-        
-        # Create user-specific directory
-        user_transcripts_dir = os.path.join(transcripts_dir, username)
-        if not os.path.exists(user_transcripts_dir):
-            os.makedirs(user_transcripts_dir)
+        # Transcript folder structure: transcripts/username
+        storage = get_storage()
+        user_transcripts_dir = join_key("transcripts", username)
         
         # Generate filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         transcript_filename = f"medical_transcript_{timestamp}.txt"
         metadata_filename = f"medical_transcript_{timestamp}_metadata.json"
         
-        transcript_path = os.path.join(user_transcripts_dir, transcript_filename)
-        metadata_path = os.path.join(user_transcripts_dir, metadata_filename)
+        transcript_path = f"{user_transcripts_dir}/{transcript_filename}"
+        metadata_path = f"{user_transcripts_dir}/{metadata_filename}"
         
         # Save transcript text
-        with open(transcript_path, 'w', encoding='utf-8') as f:
-            f.write(transcript)
+        storage.write_text(transcript_path, transcript)
         
         # Save metadata (session info and segments)
         metadata = {
@@ -1178,8 +1474,13 @@ async def save_transcript(request: Request):
             'transcript_file': transcript_filename
         }
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        storage.write_text(metadata_path, json.dumps(metadata, ensure_ascii=False, separators=(',', ':')))
+        
+        # Make the new segments searchable right away
+        try:
+            transcript_index.index_transcript(username, transcript_filename, session_info, segments)
+        except Exception as e:
+            logger.warning("transcript_index_failed", extra={"error": str(e)})
         
         return {
             "success": True,
@@ -1189,7 +1490,121 @@ async def save_transcript(request: Request):
         }
         
     except Exception as e:
-        print(f"Error saving transcript: {e}")
+        logger.error("save_transcript_failed", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Failed to save transcript: {str(e)}")
 
+@app.post("/transcript-sessions")
+async def open_transcript_session(payload: TranscriptSessionRequest):
+    """Open an append-only transcript session"""
+    try:
+        session = transcript_sessions.open_session(payload.username, payload.sessionInfo)
+        return {
+            "success": True,
+            "session_id": session["session_id"],
+            "message": "Transcript session opened"
+        }
+    except Exception as e:
+        logger.error("transcript_session_open_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to open transcript session: {str(e)}")
+
+@app.post("/transcript-sessions/{session_id}/segments")
+async def append_transcript_segments(session_id: str, payload: TranscriptSegmentsRequest):
+    """Append a batch of new segments to a transcript session"""
+    try:
+        appended = transcript_sessions.append_segments(payload.username, session_id, payload.segments)
+        return {
+            "success": True,
+            "session_id": session_id,
+            "appended": appended
+        }
+    except transcript_sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Transcript session not found")
+    except transcript_sessions.SessionFinalized:
+        raise HTTPException(status_code=409, detail="Transcript session is already finalized")
+    except Exception as e:
+        logger.error("transcript_segments_append_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to append segments: {str(e)}")
+
+@app.post("/transcript-sessions/{session_id}/finalize")
+async def finalize_transcript_session(session_id: str, payload: TranscriptFinalizeRequest):
+    """Close a transcript session; the transcript text is built on first read"""
+    try:
+        session = transcript_sessions.finalize_session(payload.username, session_id, payload.sessionInfo)
+        return {
+            "success": True,
+            "session_id": session_id,
+            "total_segments": session.get("total_segments", 0),
+            "message": "Transcript session finalized"
+        }
+    except transcript_sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Transcript session not found")
+    except Exception as e:
+        logger.error("transcript_session_finalize_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to finalize session: {str(e)}")
+
+@app.get("/transcript-sessions/{username}/{session_id}/transcript")
+async def get_transcript_session_text(username: str, session_id: str):
+    """Return the transcript text of a session, materializing it if needed"""
+    try:
+        transcript = transcript_sessions.get_transcript_text(username, session_id)
+        return {
+            "success": True,
+            "session_id": session_id,
+            "transcript": transcript
+        }
+    except transcript_sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Transcript session not found")
+    except Exception as e:
+        logger.error("transcript_session_read_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to read transcript: {str(e)}")
+
+@app.get("/transcripts/{username}/search")
+async def search_transcripts(username: str, q: str = "", start: str = "", end: str = "", speaker: str = "", limit: int = 50):
+    """Search a user's transcript segments by keywords, phrase ("..."), time range and speaker"""
+    try:
+        start_time = transcript_index.parse_time(start)
+        end_time = transcript_index.parse_time(end)
+        if (start and not start_time) or (end and not end_time):
+            raise HTTPException(status_code=400, detail="start and end must be ISO 8601 timestamps")
+        
+        index = transcript_index.get_index(username)
+        results = index.search(
+            q,
+            start=start_time.timestamp() if start_time else None,
+            end=end_time.timestamp() if end_time else None,
+            speaker=speaker or None,
+            limit=limit,
+        )
+        return {
+            "username": username,
+            "query": q,
+            "results": [
+                {
+                    **record,
+                    "time": datetime.fromtimestamp(record["time"]).isoformat() if record.get("time") is not None else None
+                }
+                for record in results
+            ],
+            "total_results": len(results)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("transcript_search_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to search transcripts: {str(e)}")
+
+@app.post("/transcripts/{username}/reindex")
+async def reindex_transcripts(username: str):
+    """Index transcripts that were saved before search indexing existed"""
+    try:
+        added = transcript_index.reindex_user(username)
+        return {
+            "success": True,
+            "username": username,
+            "indexed_segments": added
+        }
+    except Exception as e:
+        logger.error("transcript_reindex_failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Failed to reindex transcripts: {str(e)}")
+
 # For Zappa deployment - the app instance is used directly
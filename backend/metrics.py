@@ -0,0 +1,264 @@
+"""
+In-process metrics with low-overhead collectors
+
+Each collector keeps one shard per thread. Only the owning thread writes to a
+shard, so recording a value takes no lock; readers merge the shards when the
+metrics are reported. render_prometheus() formats everything in the
+Prometheus text exposition format for the /metrics endpoint.
+"""
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from fast cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class _ShardedCollector:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            # Only taken once per thread, when the shard is registered
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshot_shards(self):
+        with self._shards_lock:
+            return list(self._shards)
+
+
+class Counter(_ShardedCollector):
+    """Monotonically increasing count"""
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = _label_key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self):
+        """Merge all shards into {label tuple: total}"""
+        merged = {}
+        for shard in self._snapshot_shards():
+            for key, value in list(shard.items()):
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def value(self, **labels):
+        return self.collect().get(_label_key(labels), 0)
+
+
+class Histogram(_ShardedCollector):
+    """Distribution of observed values (e.g. latencies) in fixed buckets"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = _label_key(labels)
+        series = shard.get(key)
+        if series is None:
+            # [bucket counts..., +Inf count, sum]
+            series = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self):
+        """
+        Merge all shards
+
+        Returns:
+            dict: label tuple -> {"buckets": [(upper bound, cumulative count)], "count", "sum"}
+        """
+        merged = {}
+        for shard in self._snapshot_shards():
+            for key, series in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(series[:-1]) + [0.0])
+                for index, value in enumerate(series):
+                    total[index] += value
+        result = {}
+        for key, series in merged.items():
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            result[key] = {"buckets": buckets, "count": cumulative, "sum": series[-1]}
+        return result
+
+
+class Timer:
+    """Context manager that observes its elapsed time on a histogram"""
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    """Get or create a registered histogram"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, description, buckets)
+        return _registry[name]
+
+
+def counter(name, description):
+    """Get or create a registered counter"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, description)
+        return _registry[name]
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text format"""
+    with _registry_lock:
+        collectors = list(_registry.values())
+    lines = []
+    for collector in collectors:
+        lines.append(f"# HELP {collector.name} {collector.description}")
+        lines.append(f"# TYPE {collector.name} {collector.metric_type}")
+        if collector.metric_type == "counter":
+            for key, value in sorted(collector.collect().items()):
+                lines.append(f"{collector.name}{_format_labels(key)} {value}")
+        else:
+            for key, series in sorted(collector.collect().items()):
+                for bound, count in series["buckets"]:
+                    lines.append(f"{collector.name}_bucket{_format_labels(key, [('le', _format_bound(bound))])} {count}")
+                lines.append(f"{collector.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{collector.name}_count{_format_labels(key)} {series['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def record_cache_lookup(cache, hit):
+    """Count a cache lookup; hit rate = hits / (hits + misses)"""
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Use the route template, not the raw path, to bound label cardinality
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=str(status["code"]),
+            )
+
+
+MISTRAL_REQUEST_SECONDS = histogram(
+    "mistral_http_request_seconds",
+    "Time from sending a Mistral API request to receiving response headers, by connection reuse",
+)
+MISTRAL_CONNECT_SECONDS = histogram(
+    "mistral_connect_seconds",
+    "TCP connect and TLS handshake time for new Mistral API connections",
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template, method and status",
+)
+MISTRAL_CALL_SECONDS = histogram(
+    "mistral_call_seconds",
+    "Mistral chat completion latency by model and endpoint",
+)
+MISTRAL_TOKENS_TOTAL = counter(
+    "mistral_tokens_total",
+    "Mistral prompt and completion tokens by model and endpoint",
+)
+MISTRAL_ERRORS_TOTAL = counter(
+    "mistral_errors_total",
+    "Failed Mistral calls by model and endpoint",
+)
+CACHE_REQUESTS_TOTAL = counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+)
+FALLBACK_ANALYSIS_TOTAL = counter(
+    "fallback_analysis_total",
+    "Requests answered by fallback_rule_based_analysis, by reason",
+)
+MODEL_OUTPUT_REPAIRED_TOTAL = counter(
+    "model_output_repaired_total",
+    "Model responses that needed JSON repair (fences, trailing commas, truncation), by endpoint and model",
+)
+EXTRACTION_SECONDS_PER_PAGE = histogram(
+    "extraction_seconds_per_page",
+    "Text extraction time per page by file type",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+UPLOAD_SIZE_BYTES = histogram(
+    "upload_size_bytes",
+    "Size of uploaded documents by file type",
+    buckets=(10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000),
+)
@@ -0,0 +1,75 @@
+"""
+Migrate existing projects, logs and transcripts to a compression codec
+
+Usage:
+    python migrate_compression.py --codec gzip
+    python migrate_compression.py --codec zstd --dry-run
+    python migrate_compression.py --codec none   # decompress everything
+"""
+import argparse
+
+from compression_utils import get_codec, codec_from_name, is_compressible
+from storage import get_storage
+
+DEFAULT_ROOTS = ["projects", "logs", "transcripts"]
+
+
+def iter_artifacts(storage, root):
+    """Yield stored keys under root that hold compressible text artifacts"""
+    for info in storage.list_tree(root):
+        # Everything under transcripts/ is text or JSON
+        if is_compressible(info["name"]) or root == "transcripts":
+            yield f"{root}/{info['key']}"
+
+
+def migrate(roots, codec, dry_run=False, storage=None):
+    """
+    Recompress every artifact under the given roots
+
+    Args:
+        roots (list): Top-level storage prefixes to walk
+        codec (str): Target codec ("none", "gzip" or "zstd")
+        dry_run (bool): Only report what would change
+        storage (StorageBackend): Backend to migrate, defaults to the configured one
+
+    Returns:
+        dict: Totals for migrated files and bytes before/after
+    """
+    storage = storage or get_storage()
+    codec = get_codec(codec)
+    totals = {"files": 0, "bytes_before": 0, "bytes_after": 0}
+    for root in roots:
+        for key in list(iter_artifacts(storage, root)):
+            if codec_from_name(key) == codec:
+                continue
+            if dry_run:
+                print(f"Would migrate {key}")
+                totals["files"] += 1
+                continue
+            result = storage.recompress(key, codec)
+            if result:
+                new_key, before, after = result
+                totals["files"] += 1
+                totals["bytes_before"] += before
+                totals["bytes_after"] += after
+                print(f"Migrated {key} -> {new_key} ({before} -> {after} bytes)")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress stored text artifacts")
+    parser.add_argument("--codec", default=None, help="none, gzip or zstd (defaults to STORAGE_COMPRESSION)")
+    parser.add_argument("--dry-run", action="store_true", help="List files without changing them")
+    parser.add_argument("roots", nargs="*", default=DEFAULT_ROOTS, help="Storage prefixes to migrate")
+    args = parser.parse_args()
+
+    totals = migrate(args.roots, args.codec, dry_run=args.dry_run)
+    if totals["bytes_after"]:
+        ratio = totals["bytes_before"] / totals["bytes_after"]
+        print(f"Migrated {totals['files']} files: {totals['bytes_before']} -> {totals['bytes_after']} bytes ({ratio:.1f}x)")
+    else:
+        print(f"{totals['files']} files {'to migrate' if args.dry_run else 'migrated'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Model tiering for LLM calls
+
+route() picks the Mistral model for a call from the task, the document size,
+the custom prompt, the time left before the request's deadline and recent
+upstream latency. Short, mechanical edits (spelling, grammar, punctuation)
+go to the small model. Long documents, strategic prompts, chat and legal
+advice go to the large model. When the small model's output fails
+validation, escalate() says whether to retry on the large model.
+
+Every decision is logged and counted in model_route_decisions_total.
+"""
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from metrics import counter
+from log_utils import get_logger
+
+SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "mistral-small-latest")
+LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "mistral-large-latest")
+# Documents up to this many characters are analyzed on the small model
+SMALL_MODEL_MAX_CHARS = int(os.getenv("LLM_SMALL_MODEL_MAX_CHARS", "8000"))
+# Set to "large" or "small" to pin every call to one tier
+LLM_FORCE_TIER = os.getenv("LLM_FORCE_TIER", "").lower()
+
+# Prompts asking for more than mechanical corrections need the large model
+_STRATEGIC_PROMPT = re.compile(
+    r"\b(strateg\w*|legal|risk\w*|complian\w*|negotiat\w*|recommend\w*|clause\w*|liabilit\w*|tone|persua\w*)\b",
+    re.IGNORECASE,
+)
+_MECHANICAL_PROMPT = re.compile(r"\b(spell\w*|typo\w*|grammar|punctuat\w*|proofread\w*)\b", re.IGNORECASE)
+
+MODEL_ROUTE_DECISIONS_TOTAL = counter(
+    "model_route_decisions_total",
+    "Model routing decisions by task, model and reason",
+)
+MODEL_ESCALATIONS_TOTAL = counter(
+    "model_escalations_total",
+    "Retries on the large model after the small model's output failed validation, by task and problem",
+)
+
+logger = get_logger("model_router")
+
+_latency = {}
+_latency_lock = threading.Lock()
+
+
+@dataclass
+class RouteDecision:
+    model: str
+    reason: str
+
+
+def record_latency(model, seconds):
+    """Feed an observed call latency into the per-model moving average"""
+    with _latency_lock:
+        previous = _latency.get(model)
+        _latency[model] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+
+def recent_latency(model):
+    """Moving average latency in seconds for a model, or None before its first call"""
+    with _latency_lock:
+        return _latency.get(model)
+
+
+def _decide(task, text_chars, custom_prompt, deadline):
+    if LLM_FORCE_TIER in ("small", "large"):
+        return RouteDecision(SMALL_MODEL if LLM_FORCE_TIER == "small" else LARGE_MODEL, "forced")
+
+    remaining = deadline - time.monotonic() if deadline is not None else None
+    large_latency = recent_latency(LARGE_MODEL)
+    # The large model is currently too slow to answer within this request's budget
+    if remaining is not None and large_latency is not None and large_latency > remaining:
+        return RouteDecision(SMALL_MODEL, "latency_budget")
+
+    if task != "analyze":
+        return RouteDecision(LARGE_MODEL, "task")
+    if custom_prompt and _STRATEGIC_PROMPT.search(custom_prompt):
+        return RouteDecision(LARGE_MODEL, "strategic_prompt")
+    if custom_prompt and _MECHANICAL_PROMPT.search(custom_prompt):
+        return RouteDecision(SMALL_MODEL, "mechanical_prompt")
+    if text_chars > SMALL_MODEL_MAX_CHARS:
+        return RouteDecision(LARGE_MODEL, "long_document")
+    return RouteDecision(SMALL_MODEL, "short_document")
+
+
+def route(task, text_chars, custom_prompt="", deadline=None):
+    """
+    Choose the model for an LLM call
+
+    Args:
+        task (str): "analyze", "chat" or "legal-advice"
+        text_chars (int): Length of the document text
+        custom_prompt (str): Optional user instructions
+        deadline (float): Optional time.monotonic() deadline for the request
+
+    Returns:
+        RouteDecision: The model and the reason it was chosen
+    """
+    decision = _decide(task, text_chars, custom_prompt, deadline)
+    MODEL_ROUTE_DECISIONS_TOTAL.inc(task=task, model=decision.model, reason=decision.reason)
+    logger.info("model_routed", extra={
+        "task": task,
+        "model": decision.model,
+        "reason": decision.reason,
+        "text_chars": text_chars,
+    })
+    return decision
+
+
+def escalate(task, model, problem, deadline=None):
+    """
+    Decide whether to retry on the large model after a validation failure
+
+    Returns:
+        str: The model to retry with, or None to keep the result as it is
+    """
+    if model == LARGE_MODEL or LLM_FORCE_TIER == "small":
+        return None
+    if deadline is not None:
+        expected = recent_latency(LARGE_MODEL) or 0.0
+        if time.monotonic() + expected > deadline:
+            return None
+    MODEL_ESCALATIONS_TOTAL.inc(task=task, problem=problem)
+    logger.info("model_escalated", extra={"task": task, "from_model": model, "to_model": LARGE_MODEL, "problem": problem})
+    return LARGE_MODEL
+
+
+def validate_analysis(data):
+    """
+    Check the shape of an /analyze model response
+
+    Returns:
+        str: A short problem label, or None if the response is usable
+    """
+    if not isinstance(data, dict):
+        return "not_object"
+    issues = data.get("issues")
+    if not isinstance(issues, list):
+        return "missing_issues"
+    for issue in issues:
+        if not isinstance(issue, dict) or not isinstance(issue.get("original_text"), str) or not isinstance(issue.get("suggested_text"), str):
+            return "malformed_issue"
+    return None
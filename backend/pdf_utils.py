@@ -1,8 +1,14 @@
+import time
+
 import fitz  # PyMuPDF
 
+from metrics import EXTRACTION_SECONDS_PER_PAGE
+
 def extract_text_from_pdf(path):
     doc = fitz.open(path)
-    full_text = ""
+    page_texts = []
     for page in doc:
-        full_text += page.get_text()
-    return full_text
+        start = time.perf_counter()
+        page_texts.append(page.get_text())
+        EXTRACTION_SECONDS_PER_PAGE.observe(time.perf_counter() - start, file_type="PDF")
+    return "".join(page_texts)
@@ -0,0 +1,251 @@
+"""
+Opt-in per-request profiling
+
+When PROFILING_TOKEN is set, a request carrying that token in the
+X-Profile header (or a ?profile=<token> query parameter) runs under a
+sampling profiler. A background thread samples the stack of the thread that
+is serving the request every PROFILE_SAMPLE_INTERVAL seconds, so wall time
+spent in regexes, JSON parsing and HTML building shows up. Async endpoints
+run on the event loop thread, so samples can also include other requests
+that were running on the loop at the same time.
+
+Blocking work the request hands to other threads (the Mistral calls in
+llm_client's call pool) is sampled too while the thread runs it under
+follow_thread(); those stacks are rooted at a "[thread name]" frame. While
+the loop thread only awaits such a call, its own samples show the idle
+event loop.
+
+The profile is stored in collapsed-stack format under diagnostics/profiles/
+and its id is returned in the X-Profile-Id response header. The middleware
+is only installed when PROFILING_TOKEN is set, so there is no overhead
+otherwise.
+"""
+import contextvars
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+
+from storage import get_storage, join_key
+from log_utils import get_logger
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_ENABLED = bool(PROFILING_TOKEN)
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_PREFIX = "diagnostics/profiles"
+
+logger = get_logger("profiling")
+
+# Profiler of the request being served, copied into worker threads with the context
+_current_profiler = contextvars.ContextVar("request_profiler", default=None)
+
+
+def is_authorized(token):
+    """Check a profiling token against PROFILING_TOKEN"""
+    if not PROFILING_ENABLED or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8"))
+
+
+def _frame_label(code, lineno):
+    filename = code.co_filename.replace("\\", "/")
+    short_name = "/".join(filename.rsplit("/", 2)[-2:])
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({short_name}:{lineno})"
+
+
+class SamplingProfiler:
+    """Samples a thread's stack, and those of the threads it follows, at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        # Worker thread id -> root label, while the thread works for the request
+        self.followed = {}
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def follow(self, thread_id, name):
+        self.followed[thread_id] = f"[{name}]"
+
+    def unfollow(self, thread_id):
+        self.followed.pop(thread_id, None)
+
+    def _sample(self, frame, root=None):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        if root is not None:
+            stack.append(root)
+        key = ";".join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            frame = frames.get(self.thread_id)
+            if frame is None:
+                continue
+            self._sample(frame)
+            for thread_id, root in list(self.followed.items()):
+                if thread_id in frames:
+                    self._sample(frames[thread_id], root)
+            self.samples += 1
+
+    def collapsed(self):
+        """Render the samples as collapsed stacks ("frame;frame;frame count" per line)"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+@contextmanager
+def follow_thread():
+    """
+    Sample the current thread as part of the profiled request, if there is one
+
+    Use around blocking work run in a worker thread with the request's context
+    (contextvars.copy_context(), asyncio.to_thread).
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    thread = threading.current_thread()
+    profiler.follow(thread.ident, thread.name)
+    try:
+        yield
+    finally:
+        profiler.unfollow(thread.ident)
+
+
+def collapsed_to_speedscope(collapsed, name, interval=PROFILE_SAMPLE_INTERVAL):
+    """
+    Convert collapsed stacks into a speedscope sampled profile
+
+    Args:
+        collapsed (str): Collapsed-stack text
+        name (str): Profile name shown in speedscope
+        interval (float): Seconds represented by one sample
+
+    Returns:
+        dict: speedscope file contents
+    """
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    for line in collapsed.splitlines():
+        if not line.strip():
+            continue
+        stack, _, count = line.rpartition(" ")
+        indices = []
+        for label in stack.split(";"):
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indices.append(frame_index[label])
+        samples.append(indices)
+        weights.append(int(count) * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": name,
+        "exporter": "ai-editor profiling",
+    }
+
+
+def profile_key(profile_id):
+    return join_key(*PROFILE_PREFIX.split("/"), f"{profile_id}.collapsed")
+
+
+def load_profile(profile_id, storage=None):
+    """Return the stored collapsed stacks for a profile id (KeyError if missing)"""
+    storage = storage or get_storage()
+    key = profile_key(profile_id)
+    if not storage.exists(key):
+        raise KeyError(profile_id)
+    return storage.read_text(key)
+
+
+def _request_token(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile":
+            return value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        values = parse_qs(query.decode("latin-1")).get("profile")
+        if values:
+            return values[0]
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying a valid profiling token"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_authorized(_request_token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident()).start()
+        token = _current_profiler.set(profiler)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profiler.reset(token)
+            profiler.stop()
+            try:
+                get_storage().write_text(profile_key(profile_id), profiler.collapsed(), codec="none")
+                logger.info("request_profiled", extra={
+                    "profile_id": profile_id,
+                    "path": scope.get("path"),
+                    "samples": profiler.samples,
+                    "duration_ms": round(profiler.duration * 1000, 1),
+                })
+            except Exception as e:
+                logger.error("profile_save_failed", extra={"profile_id": profile_id, "error": str(e)})
+
+
+def profile_as_json(profile_id, storage=None):
+    """Return a stored profile as a speedscope JSON string"""
+    return json.dumps(collapsed_to_speedscope(load_profile(profile_id, storage), f"request {profile_id}"))
@@ -0,0 +1,227 @@
+"""
+Repeated word and phrase detection
+
+Finds accidental repetitions: doubled words ("the the"), repeated bigrams
+and trigrams ("the party the party") and repeated clauses ("the tenant
+shall pay, the tenant shall pay"). The text is lowercased and split into
+tokens once; repetitions are found by comparing the token list with itself
+shifted by one, two and three positions, so the cost is linear in the
+length of the text.
+
+With NumPy installed, token offsets, the punctuation between tokens and
+the shifted comparisons (on token hashes) are array operations, and only
+the repeats themselves are visited in Python: a 10 MB document takes well
+under a second. Without NumPy the same results come from a regex pass and
+plain lists.
+"""
+import bisect
+import operator
+import re
+from array import array
+from itertools import accumulate, compress, count, islice
+
+from issues import make_issue
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+# Longest word n-gram checked for immediate repetition; longer repeats are caught as clauses
+MAX_NGRAM = 3
+# Shortest clause (in words) reported when a clause is repeated
+MIN_CLAUSE_WORDS = 3
+# Correct English doubles ("he had had enough", "said that that clause")
+ALLOWED_DOUBLES = frozenset({"had", "that"})
+
+_PUNCTUATION = '.,;:!?()"[]\u201c\u201d'
+# One-to-one translations keep character offsets valid
+_WORDS_ONLY = str.maketrans({char: " " for char in _PUNCTUATION})
+_CLAUSE_BREAKS = str.maketrans({char: "\0" for char in ".,;:!?"})
+_TOKEN = re.compile(r"\S+")
+
+if NUMPY_SUPPORT:
+    # U+3000 is the highest whitespace code point; codes above it are clamped to U+3001
+    _CODE_LIMIT = 0x3001
+    # str.split() and \S+ both break on exactly the characters str.isspace() accepts
+    _BREAKS = np.array([chr(code).isspace() for code in range(_CODE_LIMIT + 1)], dtype=bool)
+    _IS_PUNCTUATION = np.zeros(_CODE_LIMIT + 1, dtype=bool)
+    _IS_PUNCTUATION[[ord(char) for char in _PUNCTUATION]] = True
+    _BREAKS |= _IS_PUNCTUATION
+
+
+class _Tokens:
+    """
+    Lowercased words of a text, with their character offsets
+
+    Punctuation is blanked out before splitting, so it only ever sits in the
+    gaps between tokens.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        # Lowercasing never adds or removes whitespace, so the split lines up with the offsets
+        self.tokens = text.translate(_WORDS_ONLY).lower().split()
+        self.vectorized = NUMPY_SUPPORT
+        if self.vectorized:
+            self._index_numpy(text)
+        else:
+            self._index_python(text)
+
+    def _index_numpy(self, text):
+        codes = np.minimum(np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32), _CODE_LIMIT)
+        is_word = ~_BREAKS[codes]
+        edges = np.diff(is_word.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        self.starts = np.flatnonzero(edges == 1)
+        self.ends = np.flatnonzero(edges == -1)
+        # Gap k lies between token k and token k + 1; count the gaps holding punctuation
+        marks = np.flatnonzero(_IS_PUNCTUATION[codes])
+        gap_has_mark = np.searchsorted(marks, self.starts[1:]) > np.searchsorted(marks, self.ends[:-1])
+        self._marked_gaps = np.concatenate(([0], np.cumsum(gap_has_mark)))
+        # Token ids: the position where each distinct token first occurs
+        first_seen = {}
+        self._ids = np.fromiter(map(first_seen.setdefault, self.tokens, count()), dtype=np.int64, count=len(self.tokens))
+        self._allowed_ids = np.array([position for token, position in first_seen.items() if _allowed_double(token)], dtype=np.int64)
+
+    def _index_python(self, text):
+        self.starts = array("q")
+        self.ends = array("q")
+        for match in _TOKEN.finditer(text.translate(_WORDS_ONLY)):
+            start, end = match.span()
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def repeats(self, n):
+        """
+        Immediate repeats of n-grams, in token order
+
+        Repeats straddling punctuation ("... the party. The party ...") and,
+        for single words, allowed doubles and numbers are left out.
+
+        Returns:
+            list: (first token, end token, start, end, first copy end) for
+                each token index where two or more copies of an n-gram start
+        """
+        if not self.vectorized:
+            return self._repeats_python(n)
+        if len(self.tokens) <= n:
+            return []
+        same = self._ids[:-n] == self._ids[n:]
+        candidates = np.flatnonzero(same)
+        breaks = np.append(np.flatnonzero(~same), len(same))
+        # Tokens equal to the one n places on, counted from each candidate; n of them make a repeat
+        run = breaks[np.searchsorted(breaks, candidates)] - candidates
+        keep = run >= n
+        first = candidates[keep]
+        last = first + (run[keep] + n) // n * n - 1
+        clean = self._marked_gaps[last] == self._marked_gaps[first]
+        if n == 1:
+            clean &= ~np.isin(self._ids[first], self._allowed_ids)
+        first, last = first[clean], last[clean]
+        return list(zip(
+            first.tolist(), (last + 1).tolist(),
+            self.starts[first].tolist(), self.ends[last].tolist(), self.ends[first + n - 1].tolist(),
+        ))
+
+    def _repeats_python(self, n):
+        tokens = self.tokens
+        found = []
+        for index in compress(count(), map(operator.eq, tokens, islice(tokens, n, None))):
+            gram = tokens[index:index + n]
+            if tokens[index + n:index + 2 * n] != gram or (n == 1 and _allowed_double(gram[0])):
+                continue
+            copies = 2
+            while tokens[index + copies * n:index + (copies + 1) * n] == gram:
+                copies += 1
+            start, end = self.starts[index], self.ends[index + copies * n - 1]
+            if any(char in _PUNCTUATION for char in self.text[start:end]):
+                continue
+            found.append((index, index + copies * n, start, end, self.ends[index + n - 1]))
+        return found
+
+
+def _allowed_double(token):
+    return token in ALLOWED_DOUBLES or token.isdigit()
+
+
+def ngram_repetitions(text, words):
+    """
+    Find immediately repeated n-grams
+
+    Shorter n-grams win: each n is swept in token order, skipping repeats
+    that overlap one already taken.
+
+    Args:
+        text (str): The original text
+        words (_Tokens): Its tokens
+
+    Returns:
+        list: (start, end, first copy end) character offsets, non-overlapping
+    """
+    found = []
+    # Token intervals [first, end) taken by shorter n-grams, sorted and disjoint
+    taken_starts, taken_ends = [], []
+    for n in range(1, MAX_NGRAM + 1):
+        accepted = []
+        free_from = 0
+        for first, end_index, start, end, first_end in words.repeats(n):
+            if first < free_from:
+                continue
+            if taken_starts:
+                position = bisect.bisect_right(taken_ends, first)
+                if position < len(taken_starts) and taken_starts[position] < end_index:
+                    continue
+            free_from = end_index
+            accepted.append((first, end_index))
+            found.append((start, end, first_end))
+        if accepted:
+            taken = sorted(list(zip(taken_starts, taken_ends)) + accepted)
+            taken_starts = [start for start, _ in taken]
+            taken_ends = [end for _, end in taken]
+    return found
+
+
+def clause_repetitions(text):
+    """
+    Find a clause repeated right after itself ("pay the rent, pay the rent")
+
+    Returns:
+        list: (start, end, first clause) character spans covering both copies
+    """
+    clauses = text.translate(_CLAUSE_BREAKS).split("\0")
+    stripped = list(map(str.lower, map(str.strip, clauses)))
+    found = []
+    starts = None
+    for index in compress(count(), map(operator.eq, stripped, islice(stripped, 1, None))):
+        if len(stripped[index].split()) < MIN_CLAUSE_WORDS:
+            continue
+        if starts is None:
+            starts = [0] + list(accumulate(len(clause) + 1 for clause in clauses))
+        first, second = clauses[index], clauses[index + 1]
+        start = starts[index] + len(first) - len(first.lstrip())
+        end = starts[index + 1] + len(second.rstrip())
+        found.append((start, end, first.strip()))
+    return found
+
+
+def repetition_issues(text):
+    """
+    Repeated words, phrases and clauses in text
+
+    Returns:
+        list: Structured "Grammar" issues with offsets; the suggestion is a single copy
+    """
+    words = _Tokens(text)
+    issues = []
+    for start, end, first_end in ngram_repetitions(text, words):
+        issues.append(make_issue(
+            "Grammar", text[start:end], text[start:first_end], "Grammar issue: Remove repeated words",
+            start, end, source="rules",
+        ))
+    for start, end, clause in clause_repetitions(text):
+        issues.append(make_issue(
+            "Grammar", text[start:end], clause, "Grammar issue: Remove repeated clause",
+            start, end, source="rules",
+        ))
+    return issues
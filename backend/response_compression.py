@@ -0,0 +1,178 @@
+"""
+Negotiated gzip/brotli compression for HTTP responses
+
+An ASGI middleware that compresses response bodies above a size threshold
+using the best encoding the client accepts. Brotli is used when the optional
+`brotli` package is installed; otherwise responses fall back to gzip.
+"""
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+    BROTLI_SUPPORT = True
+except ImportError:
+    BROTLI_SUPPORT = False
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+# Content types that are already compressed or not worth compressing
+SKIP_CONTENT_TYPES = ("image/", "video/", "audio/", "application/zip", "application/pdf", "application/gzip")
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into {encoding: q-value}
+
+    Args:
+        header (str): Raw header value, e.g. "gzip, br;q=0.9"
+
+    Returns:
+        dict: Accepted encodings with their quality values
+    """
+    accepted = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        encoding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[encoding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """Pick "br", "gzip" or None for the given Accept-Encoding header"""
+    accepted = parse_accept_encoding(header or "")
+    wildcard = accepted.get("*", 0.0)
+    candidates = []
+    if BROTLI_SUPPORT:
+        candidates.append(("br", accepted.get("br", wildcard)))
+    candidates.append(("gzip", accepted.get("gzip", wildcard)))
+    encoding, quality = max(candidates, key=lambda item: item[1])
+    return encoding if quality > 0 else None
+
+
+class _StreamCompressor:
+    """Incremental compressor with a common interface for gzip and brotli"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def sync_flush(self):
+        """Emit everything compressed so far without ending the stream"""
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_body(body, encoding):
+    """Compress a complete response body in one call"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses above minimum_size with the negotiated encoding
+
+    Complete bodies are compressed in one call; streaming responses are
+    compressed chunk by chunk. Responses that already carry a
+    Content-Encoding (e.g. pre-compressed files) pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Hold the start message until we know the body size
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["compressor"] is not None:
+                chunk = state["compressor"].compress(body)
+                # Flush each chunk so streamed results (e.g. NDJSON stages) reach the client immediately
+                chunk += state["compressor"].sync_flush() if more_body else state["compressor"].flush()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            start = state["start"]
+            response_headers = [(k.lower(), v) for k, v in start.get("headers", [])]
+            content_type = dict(response_headers).get(b"content-type", b"").decode("latin-1")
+            already_encoded = any(k == b"content-encoding" for k, _ in response_headers)
+            too_small = not more_body and len(body) < self.minimum_size
+
+            if already_encoded or too_small or content_type.startswith(SKIP_CONTENT_TYPES):
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            response_headers = [(k, v) for k, v in response_headers if k != b"content-length"]
+            response_headers.append((b"content-encoding", encoding.encode("latin-1")))
+            response_headers.append((b"vary", b"Accept-Encoding"))
+
+            if not more_body:
+                compressed = compress_body(body, encoding)
+                response_headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                await send({**start, "headers": response_headers})
+                await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+
+            # Streaming response - compress incrementally with chunked transfer
+            state["compressor"] = _StreamCompressor(encoding)
+            await send({**start, "headers": response_headers})
+            await send({
+                "type": "http.response.body",
+                "body": state["compressor"].compress(body) + state["compressor"].sync_flush(),
+                "more_body": True,
+            })
+
+        await self.app(scope, receive, send_wrapper)
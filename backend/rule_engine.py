@@ -0,0 +1,102 @@
+"""
+Rule-based document checks
+
+The rules that used to live inline in fallback_rule_based_analysis, run
+over the raw text and returning structured issues (see issues.py) with
+offsets. Style, grammar and terminology rules come from the user's rule
+packs (see rule_packs.py); corrections the user keeps accepting come from
+learned_corrections.py. The rule engine serves as the fallback when
+Mistral is unavailable, and as the fast first stage of the cascade
+analysis.
+"""
+import re
+
+import rule_packs
+from issues import make_issue
+from learned_corrections import learned_corrections
+from repetition import repetition_issues
+from document_stats import compute_stats
+from spelling import check_text
+
+# Common misspellings, reported even without a spelling index
+SPELLING_ERRORS = {
+    "wheras": "whereas",
+    "herebye": "hereby",
+    "aforementionedly": "aforementioned",
+    "cuboard": "cupboard",
+    "seperate": "separate",
+    "recieve": "receive",
+    "occured": "occurred",
+    "judgement": "judgment",
+    "priviledge": "privilege",
+    "neccessary": "necessary",
+    "occassion": "occasion",
+    "beleive": "believe",
+    "acheive": "achieve",
+}
+
+_SPELLING_PATTERN = re.compile(r"\b(" + "|".join(map(re.escape, SPELLING_ERRORS)) + r")\b", re.IGNORECASE)
+
+
+def spelling_issues(text, username=None):
+    """Known misspellings, then the dictionary check (see spelling.py) for everything else"""
+    issues = [
+        make_issue(
+            "Spelling", match.group(0), SPELLING_ERRORS[match.group(0).lower()],
+            f'Spelling error: Did you mean "{SPELLING_ERRORS[match.group(0).lower()]}"?',
+            match.start(), match.end(), source="rules",
+        )
+        for match in _SPELLING_PATTERN.finditer(text)
+    ]
+    known = {issue["start"] for issue in issues}
+    issues += [issue for issue in check_text(text, username) if issue["start"] not in known]
+    return issues
+
+
+def sentence_issues(text, stats=None):
+    """Long sentences and passive voice, one finding per sentence (see document_stats.py)"""
+    stats = stats if stats is not None else compute_stats(text)
+    sentences = stats.sentence_columns()
+    issues = []
+    for start, end, words, passive, long in zip(
+        sentences["start"], sentences["end"], sentences["words"], sentences["passive"], sentences["long"]
+    ):
+        if long:
+            issues.append(make_issue(
+                "Sentence structure", text[start:end], "", "", start, end, source="rules",
+                message=f"Consider breaking down long sentence ({words} words)",
+            ))
+        if passive:
+            issues.append(make_issue(
+                "Writing style", text[start:end], "", "", start, end, source="rules",
+                message="Consider using active voice for clarity",
+            ))
+    return issues
+
+
+def run_rules(text, stats=None, username=None):
+    """
+    Run every rule over text
+
+    Args:
+        text (str): Text to check
+        stats (DocumentStats): Optional precomputed compute_stats(text)
+        username (str): Whose custom dictionary, rule packs and learned corrections apply
+
+    Returns:
+        list: Structured issues sorted by position. Word-level issues have a
+            suggested_text; sentence-level findings have a message instead.
+    """
+    issues = spelling_issues(text, username)
+    issues += rule_packs.registry.rules_for(username).issues(text)
+    issues += repetition_issues(text)
+    # Corrections the user keeps accepting replace rule findings that suggest the same
+    learned = learned_corrections.issues(text, username)
+    taken = {(issue["start"], issue["end"], issue["suggested_text"].lower()) for issue in learned}
+    issues = learned + [
+        issue for issue in issues
+        if (issue["start"], issue["end"], issue["suggested_text"].lower()) not in taken
+    ]
+    issues += sentence_issues(text, stats)
+    issues.sort(key=lambda issue: (issue["start"], issue["end"]))
+    return issues
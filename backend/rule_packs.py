@@ -0,0 +1,388 @@
+"""
+Rule packs: style, grammar and terminology rules defined as data
+
+A rule pack is a JSON (or YAML, when PyYAML is installed) file in
+RULE_PACKS_DIR:
+
+    {
+        "name": "acme-house-style",
+        "version": "3",
+        "explanations": {"Style": "House style: Use \\"{suggestion}\\" instead"},
+        "rules": [
+            {"category": "Style", "match": "utilise", "suggestion": "use"},
+            {"category": "Grammar", "pattern": "\\\\byour(?=\\\\s+going\\\\b)", "suggestion": "you're"}
+        ]
+    }
+
+"match" rules are whole words or phrases, matched case-insensitively.
+"pattern" rules are regular expressions without backreferences, named
+groups or inline global flags such as "(?i)" (all rules share one
+expression, where those would change meaning or fail to compile); their
+suggestion may refer to groups ("\\\\1") and can be passed through a
+"transform" (upper, lower, capitalize). "case_sensitive" turns off the
+default case-insensitive matching for one rule. A rule's "explanation"
+overrides the pack's per-category template.
+
+assignments.json picks the packs for each request:
+
+    {
+        "default": ["default"],
+        "organisations": {"acme": {"members": ["alice"], "packs": ["default", "acme-house-style"]}},
+        "users": {"bob": ["default", "bob-drafts"]}
+    }
+
+A user's own entry wins over their organisation's, which wins over the
+default. When two packs define the same phrase, the later pack wins.
+
+All rules of the selected packs are compiled into one regular expression:
+the phrases as a character trie, so matching never retries alternatives
+that share a prefix, followed by the patterns as named groups. One pass
+over the text finds every rule. Compiled sets are cached keyed by the
+name, version and content hash of each pack, and the directory is checked
+for changed files at most every RULE_PACKS_POLL_SECONDS, so edited packs
+take effect without a restart. A pack that fails to load or compile keeps
+its previous version.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from issues import make_issue
+from log_utils import get_logger
+
+try:
+    import yaml
+    YAML_SUPPORT = True
+except ImportError:
+    YAML_SUPPORT = False
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # Before Python 3.11
+    import sre_parse
+
+logger = get_logger("rule_packs")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RULE_PACKS_DIR = os.getenv("RULE_PACKS_DIR", os.path.join(BACKEND_DIR, "data", "rule_packs"))
+RULE_PACKS_POLL_SECONDS = float(os.getenv("RULE_PACKS_POLL_SECONDS", "2"))
+ASSIGNMENTS_FILE = "assignments.json"
+DEFAULT_PACKS = ("default",)
+# Distinct pack combinations kept compiled
+COMPILED_CACHE_SIZE = 64
+
+_TRANSFORMS = {"upper": str.upper, "lower": str.lower, "capitalize": str.capitalize}
+_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+class RulePackError(ValueError):
+    """A rule pack file is malformed"""
+
+
+class RulePack:
+    __slots__ = ("name", "version", "digest", "explanations", "rules")
+
+    def __init__(self, name, version, digest, explanations, rules):
+        self.name = name
+        self.version = version
+        self.digest = digest
+        self.explanations = explanations
+        self.rules = rules
+
+    @property
+    def key(self):
+        return (self.name, self.version, self.digest)
+
+
+def _has_backreference(node):
+    if isinstance(node, sre_parse.SubPattern):
+        return any(str(op).startswith("GROUPREF") or _has_backreference(av) for op, av in node)
+    if isinstance(node, (tuple, list)):
+        return any(_has_backreference(item) for item in node)
+    return False
+
+
+def _pattern_problem(pattern):
+    """Why a pattern can't be part of the combined expression, or None"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        return str(e)
+    if parsed.state.flags & ~re.UNICODE:
+        return "inline global flags are not supported; use a scoped group such as (?i:...) or case_sensitive"
+    if parsed.state.groupdict:
+        return "named groups are not supported; use numbered groups"
+    if _has_backreference(parsed):
+        return "backreferences are not supported"
+    return None
+
+
+def parse_pack(raw, default_name):
+    """
+    Validate a pack file's content
+
+    Args:
+        raw (bytes): File content
+        default_name (str): Name used when the pack has none (the file name)
+
+    Returns:
+        RulePack
+
+    Raises:
+        RulePackError: If the content is not a valid pack
+    """
+    try:
+        data = yaml.safe_load(raw) if YAML_SUPPORT and not raw.lstrip().startswith(b"{") else json.loads(raw)
+    except Exception as e:
+        raise RulePackError(f"unreadable pack: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise RulePackError("a pack needs a list of rules")
+    rules = []
+    for position, rule in enumerate(data["rules"]):
+        if not isinstance(rule, dict) or not rule.get("category") or "suggestion" not in rule:
+            raise RulePackError(f"rule {position} needs a category and a suggestion")
+        if bool(rule.get("match")) == bool(rule.get("pattern")):
+            raise RulePackError(f"rule {position} needs exactly one of match or pattern")
+        if rule.get("transform") and rule["transform"] not in _TRANSFORMS:
+            raise RulePackError(f"rule {position} has an unknown transform {rule['transform']!r}")
+        if rule.get("pattern"):
+            problem = _pattern_problem(rule["pattern"])
+            if problem:
+                raise RulePackError(f"rule {position} has an invalid pattern: {problem}")
+        rules.append(rule)
+    return RulePack(
+        name=str(data.get("name") or default_name),
+        version=str(data.get("version", "0")),
+        digest=hashlib.sha1(raw).hexdigest()[:12],
+        explanations=data.get("explanations") or {},
+        rules=rules,
+    )
+
+
+def _trie_pattern(phrases):
+    """Regex source matching any of the phrases, factored as a character trie"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return emit(trie)
+
+
+class CompiledRules:
+    """The rules of one or more packs as a single regular expression"""
+
+    def __init__(self, packs):
+        self.packs = tuple(pack.name for pack in packs)
+        # Lowercased phrase -> (pack, rule); later packs override earlier ones
+        self.phrases = {}
+        # Group name -> (pack, rule, rule's own compiled pattern)
+        self.patterns = {}
+        sources = []
+        for pack in packs:
+            for rule in pack.rules:
+                if rule.get("match") and not rule.get("case_sensitive"):
+                    self.phrases[rule["match"].lower()] = (pack, rule)
+                    continue
+                pattern = rule.get("pattern") or r"(?<!\w)" + re.escape(rule["match"]) + r"(?!\w)"
+                flags = 0 if rule.get("case_sensitive") else re.IGNORECASE
+                name = f"r{len(self.patterns)}"
+                self.patterns[name] = (pack, rule, re.compile(pattern, flags))
+                sources.append(f"(?P<{name}>(?{'-' if flags == 0 else ''}i:{pattern}))")
+        if self.phrases:
+            sources.insert(0, r"(?P<phrase>(?<!\w)" + _trie_pattern(self.phrases) + r"(?!\w))")
+        self.regex = re.compile("|".join(sources), re.IGNORECASE) if sources else None
+
+    def issues(self, text):
+        """
+        Every rule match in text
+
+        Returns:
+            list: Structured issues (source "rules") in document order, with the pack name in "rule_pack"
+        """
+        if self.regex is None:
+            return []
+        issues = []
+        for match in self.regex.finditer(text):
+            start, end = match.span()
+            if start == end:
+                continue
+            if match.lastgroup == "phrase":
+                pack, rule = self.phrases[match.group().lower()]
+                suggestion = rule["suggestion"]
+            else:
+                pack, rule, own = self.patterns[match.lastgroup]
+                # Re-match with the rule's own pattern so its group numbers apply
+                suggestion = own.match(text, start).expand(rule["suggestion"])
+            if rule.get("transform"):
+                suggestion = _TRANSFORMS[rule["transform"]](suggestion)
+            explanation = rule.get("explanation") or pack.explanations.get(
+                rule["category"], '{category}: Use "{suggestion}" instead'
+            ).format(category=rule["category"], suggestion=suggestion)
+            issues.append(make_issue(
+                rule["category"], text[start:end], suggestion, explanation, start, end,
+                source="rules", rule_pack=pack.name,
+            ))
+        return issues
+
+
+def _compiles(pack):
+    try:
+        CompiledRules([pack])
+    except re.error:
+        return False
+    return True
+
+
+class RulePackRegistry:
+    """Pack files in a directory, reloaded when they change, and their compiled combinations"""
+
+    def __init__(self, directory=RULE_PACKS_DIR, poll_seconds=RULE_PACKS_POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._packs = {}
+        # File name -> (mtime, size, pack name)
+        self._files = {}
+        self._assignments = {}
+        self._assignments_stamp = None
+        self._checked_at = None
+        self._compiled = OrderedDict()
+        # Pack names -> the last CompiledRules that compiled for them
+        self._last_good = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Reload added, changed and removed pack files (at most every poll_seconds unless forced)"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.poll_seconds:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.poll_seconds:
+                return
+            self._checked_at = now
+            try:
+                entries = {entry.name: entry.stat() for entry in os.scandir(self.directory) if entry.is_file()}
+            except FileNotFoundError:
+                entries = {}
+            for filename in list(self._files):
+                if filename not in entries:
+                    _, _, name = self._files.pop(filename)
+                    self._packs.pop(name, None)
+                    logger.info("rule_pack_removed", extra={"pack": name})
+            for filename, stat in entries.items():
+                if filename == ASSIGNMENTS_FILE:
+                    self._load_assignments(stat)
+                elif filename.endswith(_EXTENSIONS):
+                    self._load_pack(filename, stat)
+
+    def _load_pack(self, filename, stat):
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        known = self._files.get(filename)
+        if known is not None and known[:2] == stamp:
+            return
+        try:
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                pack = parse_pack(f.read(), os.path.splitext(filename)[0])
+        except (OSError, RulePackError) as e:
+            # Keep serving the previous version until the file is fixed
+            logger.warning("rule_pack_invalid", extra={"file": filename, "error": str(e)})
+            self._files[filename] = stamp + (known[2] if known else None,)
+            return
+        self._files[filename] = stamp + (pack.name,)
+        self._packs[pack.name] = pack
+        logger.info("rule_pack_loaded", extra={"pack": pack.name, "version": pack.version, "rules": len(pack.rules)})
+
+    def _load_assignments(self, stat):
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._assignments_stamp:
+            return
+        self._assignments_stamp = stamp
+        try:
+            with open(os.path.join(self.directory, ASSIGNMENTS_FILE), encoding="utf-8") as f:
+                self._assignments = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("rule_pack_assignments_invalid", extra={"error": str(e)})
+
+    def organisation_of(self, username):
+        """Name of the organisation a user belongs to in assignments.json, or None"""
+        self.refresh()
+        for name, organisation in (self._assignments.get("organisations") or {}).items():
+            if username and username in organisation.get("members", ()):
+                return name
+        return None
+
+    def pack_names(self, username=None):
+        """Names of the packs that apply to a user, in override order"""
+        self.refresh()
+        assignments = self._assignments
+        users = assignments.get("users") or {}
+        if username and username in users:
+            return list(users[username])
+        organisation = self.organisation_of(username)
+        if organisation is not None:
+            return list(assignments["organisations"][organisation].get("packs", ()))
+        return list(assignments.get("default") or DEFAULT_PACKS)
+
+    def packs(self):
+        """Loaded packs: name -> RulePack"""
+        self.refresh()
+        return dict(self._packs)
+
+    def rules_for(self, username=None):
+        """
+        The compiled rules for a user
+
+        Returns:
+            CompiledRules: Shared, cached by the name, version and content hash of the packs
+        """
+        names = self.pack_names(username)
+        packs = [self._packs[name] for name in names if name in self._packs]
+        if len(packs) < len(names):
+            logger.warning("rule_pack_missing", extra={
+                "username": username, "packs": [name for name in names if name not in self._packs],
+            })
+        key = tuple(pack.key for pack in packs)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+        started = time.perf_counter()
+        try:
+            compiled = CompiledRules(packs)
+        except re.error as e:
+            # parse_pack checks each rule alone; keep serving what compiled before
+            with self._lock:
+                fallback = self._last_good.get(tuple(names))
+            logger.warning("rule_packs_compile_failed", extra={
+                "packs": [pack.name for pack in packs], "error": str(e), "kept_previous": fallback is not None,
+            })
+            return fallback or CompiledRules([pack for pack in packs if _compiles(pack)])
+        logger.info("rule_packs_compiled", extra={
+            "packs": list(compiled.packs), "ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+        with self._lock:
+            self._last_good[tuple(names)] = compiled
+            self._compiled[key] = compiled
+            while len(self._compiled) > COMPILED_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return compiled
+
+
+registry = RulePackRegistry()
@@ -0,0 +1,84 @@
+"""
+Per-request phase timings reported in the Server-Timing response header
+
+ServerTimingMiddleware starts an empty timing table for each request in a
+context variable; code on the request path wraps its phases in
+phase("name"), and the totals are sent as e.g.
+
+    Server-Timing: extraction;dur=41.2, llm;dur=2380.5, parsing;dur=0.8, total;dur=2431.0
+
+Durations are in milliseconds. Outside a request phase() only measures.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+@contextmanager
+def phase(name):
+    """Time a block and add it to the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def record(name, seconds):
+    """Add seconds to a named phase of the current request"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def current_timings():
+    """Return the phase timings (seconds) recorded so far in this request"""
+    return dict(_timings.get() or {})
+
+
+def format_header(timings, total=None):
+    """
+    Build a Server-Timing header value
+
+    Args:
+        timings (dict): phase name -> seconds
+        total (float): Optional total request time in seconds
+
+    Returns:
+        str: Header value with durations in milliseconds
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a Server-Timing header with the request's phases"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {}
+        token = _timings.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                value = format_header(timings, time.perf_counter() - start)
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
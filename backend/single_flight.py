@@ -0,0 +1,186 @@
+"""
+Single-flight coalescing of identical in-flight work
+
+While a call for a key is running, later callers with the same key wait for
+its result instead of starting their own. In-process waiters share a
+concurrent.futures.Future, which works across the per-thread event loops of
+the WSGI bridge as well as under uvicorn.
+
+With a lock directory (SINGLEFLIGHT_LOCK_DIR, shared by the workers on a
+host), the coalescing also spans worker processes. The leader creates
+{key}.lock exclusively and writes its result to {key}.json. Workers that
+find the lock poll for that result. If the leader dies, its lock goes
+stale after the TTL and the waiters run the work themselves.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import counter
+from log_utils import get_logger
+
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", "")
+SINGLEFLIGHT_LOCK_TTL = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "120"))
+SINGLEFLIGHT_POLL_INTERVAL = 0.1
+
+COALESCED_REQUESTS_TOTAL = counter(
+    "coalesced_requests_total",
+    "Requests served by another in-flight identical call, by flight and scope (process/shared)",
+)
+
+logger = get_logger("single_flight")
+
+
+def flight_key(*parts):
+    """Stable hash of the parts that make two calls identical"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class _LockTable:
+    """Cross-process lock and result files in a shared directory"""
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def try_lock(self, key):
+        path = self._path(key, ".lock")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        # Take over a lock whose owner died
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return self.try_lock(key)
+        except FileNotFoundError:
+            return self.try_lock(key)
+        return False
+
+    def is_held(self, key):
+        """True while a live (non-stale) lock exists"""
+        try:
+            return time.time() - os.path.getmtime(self._path(key, ".lock")) <= self.ttl
+        except FileNotFoundError:
+            return False
+
+    def unlock(self, key):
+        try:
+            os.remove(self._path(key, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def publish(self, key, result):
+        path = self._path(key, ".json")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def read_result(self, key, since):
+        """Return a result published at or after since, or None"""
+        path = self._path(key, ".json")
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def sweep(self):
+        """Remove results older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+
+    Args:
+        name (str): Flight name, used as a metrics label
+        lock_dir (str): Optional shared directory for cross-worker coalescing
+        lock_ttl (float): Seconds after which a leader's lock is considered stale
+    """
+
+    def __init__(self, name, lock_dir=None, lock_ttl=SINGLEFLIGHT_LOCK_TTL):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._table = _LockTable(lock_dir, lock_ttl) if lock_dir else None
+
+    async def run(self, key, fn):
+        """
+        Run fn() (a coroutine function returning a JSON-serializable result) once per key
+
+        Args:
+            key (str): Identity of the work, e.g. from flight_key()
+            fn (callable): Produces the result when this caller leads
+
+        Returns:
+            The result of the single execution shared by all concurrent callers
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = concurrent.futures.Future()
+
+        if not leader:
+            COALESCED_REQUESTS_TOTAL.inc(flight=self.name, scope="process")
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await (self._run_shared(key, fn) if self._table else fn())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def _run_shared(self, key, fn):
+        waiting_since = time.time()
+        while not self._table.try_lock(key):
+            # Another worker leads; wait for its result or for its lock to go away
+            while self._table.is_held(key):
+                await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+            result = self._table.read_result(key, waiting_since)
+            if result is not None:
+                COALESCED_REQUESTS_TOTAL.inc(flight=self.name, scope="shared")
+                return result
+
+        try:
+            result = await fn()
+            try:
+                self._table.publish(key, result)
+                self._table.sweep()
+            except (OSError, TypeError) as e:
+                logger.warning("single_flight_publish_failed", extra={"flight": self.name, "error": str(e)})
+            return result
+        finally:
+            self._table.unlock(key)
+
+
+analysis_flight = SingleFlight("analyze", lock_dir=SINGLEFLIGHT_LOCK_DIR or None)
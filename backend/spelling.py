@@ -0,0 +1,413 @@
+"""
+Offline spell checking with a SymSpell-style deletion index
+
+A word list is compiled once into an index file:
+
+    python spelling.py --wordlist /usr/share/dict/words
+    python spelling.py --wordlist en_US.dic --max-distance 1
+
+Every dictionary word is stored with all variants that delete up to
+max_distance characters from its first PREFIX_LENGTH characters. A
+misspelling shares a delete variant with the words it is close to, so
+suggestions are found by looking up the misspelling's own delete variants,
+then checking the true edit distance of the few candidates.
+
+The index is a flat binary file of sorted arrays. It is memory-mapped and
+searched with bisect, so loading costs a header read and the pages are
+shared between worker processes.
+
+Per-user dictionaries (storage key dictionaries/{username}.txt, one word
+per line) are accepted on top of the index.
+"""
+import argparse
+import bisect
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import combinations
+
+from issues import make_issue
+from log_utils import get_logger
+from storage import get_storage, join_key
+
+logger = get_logger("spelling")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# General word list, most frequent first; built into the index when the index is missing
+SPELLING_WORDLIST = os.getenv("SPELLING_WORDLIST", "")
+SPELLING_INDEX_PATH = os.getenv("SPELLING_INDEX_PATH", os.path.join(BACKEND_DIR, "data", "spelling.idx"))
+SPELLING_MAX_DISTANCE = int(os.getenv("SPELLING_MAX_DISTANCE", "2"))
+# Legal vocabulary that general word lists lack
+LEGAL_TERMS_PATH = os.path.join(BACKEND_DIR, "data", "legal_terms.txt")
+USER_DICTIONARY_TTL = float(os.getenv("USER_DICTIONARY_TTL", "60"))
+PREFIX_LENGTH = 7
+MAX_SUGGESTIONS = 3
+SUGGESTION_CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "20000"))
+
+_MAGIC = b"SPIX"
+_VERSION = 2
+# magic, version, max distance, prefix length, words, deletes, blob bytes
+_HEADER = struct.Struct("<4sIIIIII")
+_WORD = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)*")
+_POSSESSIVE = re.compile(r"'s$")
+
+
+def _hash(word):
+    # 32 bits keep the index compact; collisions only add candidates, which are checked anyway
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _deletes(word, max_distance, prefix_length=PREFIX_LENGTH):
+    """The word's prefix with up to max_distance characters removed, including the prefix itself"""
+    prefix = word[:prefix_length]
+    variants = {prefix}
+    for distance in range(1, min(max_distance, len(prefix) - 1) + 1):
+        for removed in combinations(range(len(prefix)), distance):
+            variants.add("".join(char for index, char in enumerate(prefix) if index not in removed))
+    return variants
+
+
+def edit_distance(first, second, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions)
+
+    Common prefixes and suffixes are skipped and only the diagonal band of
+    width 2 * max_distance + 1 is computed.
+
+    Returns:
+        int: The distance, or max_distance + 1 once it is known to be larger
+    """
+    too_far = max_distance + 1
+    if abs(len(first) - len(second)) > max_distance:
+        return too_far
+    start = 0
+    limit = min(len(first), len(second))
+    while start < limit and first[start] == second[start]:
+        start += 1
+    end_first, end_second = len(first), len(second)
+    while end_first > start and end_second > start and first[end_first - 1] == second[end_second - 1]:
+        end_first -= 1
+        end_second -= 1
+    first, second = first[start:end_first], second[start:end_second]
+    if not first or not second:
+        return min(max(len(first), len(second)), too_far)
+
+    previous_previous = None
+    previous = [column if column <= max_distance else too_far for column in range(len(second) + 1)]
+    for i in range(1, len(first) + 1):
+        current = [too_far] * (len(second) + 1)
+        if i <= max_distance:
+            current[0] = i
+        low = max(1, i - max_distance)
+        high = min(len(second), i + max_distance)
+        for j in range(low, high + 1):
+            cost = first[i - 1] != second[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (
+                previous_previous is not None and j > 1
+                and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]
+            ):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+        if min(current[low - 1:high + 1]) > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+def read_wordlist(path):
+    """Words of a plain list or hunspell .dic file, lowercased, in file order"""
+    with open(path, encoding="utf-8", errors="ignore") as handle:
+        for line in handle:
+            word = line.split("/", 1)[0].strip()
+            if not word or word.startswith("#") or word.isdigit():
+                continue
+            yield word.lower()
+
+
+def build_index(words, path=SPELLING_INDEX_PATH, max_distance=SPELLING_MAX_DISTANCE):
+    """
+    Compile words (most frequent first) into an index file
+
+    Returns:
+        int: Number of distinct words indexed
+    """
+    ranked = list(dict.fromkeys(word for word in words if _WORD.fullmatch(word)))
+    pairs = []
+    for word_id, word in enumerate(ranked):
+        for variant in _deletes(word, max_distance):
+            pairs.append((_hash(variant), word_id))
+    pairs.sort()
+    blob = "\n".join(ranked).encode("utf-8")
+    offsets = array("I", [0])
+    for word in ranked:
+        offsets.append(offsets[-1] + len(word.encode("utf-8")) + 1)
+    hashes = array("I", (pair[0] for pair in pairs))
+    ids = array("I", (pair[1] for pair in pairs))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(_HEADER.pack(_MAGIC, _VERSION, max_distance, PREFIX_LENGTH, len(ranked), len(pairs), len(blob)))
+        hashes.tofile(handle)
+        ids.tofile(handle)
+        offsets.tofile(handle)
+        handle.write(blob)
+    os.replace(temporary, path)
+    return len(ranked)
+
+
+class SpellingIndex:
+    """Read-only, memory-mapped view of an index file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_distance, self.prefix_length, word_count, delete_count, blob_size = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a spelling index (version {_VERSION})")
+        position = _HEADER.size
+        view = memoryview(self._map)
+        self._hashes = view[position:position + 4 * delete_count].cast("I")
+        position += 4 * delete_count
+        self._ids = view[position:position + 4 * delete_count].cast("I")
+        position += 4 * delete_count
+        self._offsets = view[position:position + 4 * (word_count + 1)].cast("I")
+        position += 4 * (word_count + 1)
+        self._blob = view[position:position + blob_size]
+        self.word_count = word_count
+        # (word, max distance, limit) -> suggestions; documents are re-checked on every edit
+        self._suggestions = OrderedDict()
+        self._suggestions_lock = threading.Lock()
+
+    def word(self, word_id):
+        return bytes(self._blob[self._offsets[word_id]:self._offsets[word_id + 1] - 1]).decode("utf-8")
+
+    def _length(self, word_id):
+        # Indexed words are ASCII, so the byte length is the length
+        return self._offsets[word_id + 1] - self._offsets[word_id] - 1
+
+    def _word_ids(self, variant):
+        key = _hash(variant)
+        start = bisect.bisect_left(self._hashes, key)
+        end = start
+        while end < len(self._hashes) and self._hashes[end] == key:
+            end += 1
+        return self._ids[start:end]
+
+    def __contains__(self, word):
+        return any(self.word(word_id) == word for word_id in self._word_ids(word[:self.prefix_length]))
+
+    def suggest(self, word, max_distance=None, limit=MAX_SUGGESTIONS):
+        """
+        Dictionary words within max_distance edits of word
+
+        Returns:
+            list: (word, distance) pairs, closest first, then most frequent first
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        key = (word, max_distance, limit)
+        with self._suggestions_lock:
+            cached = self._suggestions.get(key)
+            if cached is not None:
+                self._suggestions.move_to_end(key)
+                return list(cached)
+        suggestions = self._suggest(word, max_distance, limit)
+        with self._suggestions_lock:
+            self._suggestions[key] = tuple(suggestions)
+            while len(self._suggestions) > SUGGESTION_CACHE_SIZE:
+                self._suggestions.popitem(last=False)
+        return suggestions
+
+    def _suggest(self, word, max_distance, limit):
+        if limit < 1:
+            return []
+        candidates = set()
+        for variant in _deletes(word, max_distance, self.prefix_length):
+            candidates.update(self._word_ids(variant))
+        # Candidates are checked most frequent first. Once limit words are found,
+        # later ones only matter when strictly closer, so the bound shrinks and
+        # most candidates are rejected on length or early in the distance band.
+        ranked = []
+        bound = max_distance
+        for word_id in sorted(candidates):
+            if abs(self._length(word_id) - len(word)) > bound:
+                continue
+            distance = edit_distance(word, self.word(word_id), bound)
+            if not 0 < distance <= bound:
+                continue
+            ranked.append((distance, word_id))
+            if len(ranked) >= limit:
+                ranked = sorted(ranked)[:limit]
+                bound = ranked[-1][0] - 1
+                if bound < 1:
+                    break
+        return [(self.word(word_id), distance) for distance, word_id in sorted(ranked)[:limit]]
+
+
+_index = None
+_index_lock = threading.Lock()
+_index_checked = False
+
+
+def get_index():
+    """
+    The shared index, built from SPELLING_WORDLIST first if the file is missing
+
+    Returns:
+        SpellingIndex or None when no word list is configured
+    """
+    global _index, _index_checked
+    if _index_checked:
+        return _index
+    with _index_lock:
+        if _index_checked:
+            return _index
+        try:
+            if not os.path.exists(SPELLING_INDEX_PATH) and SPELLING_WORDLIST:
+                started = time.perf_counter()
+                count = build_index(_source_words(SPELLING_WORDLIST))
+                logger.info("spelling_index_built", extra={"words": count, "seconds": round(time.perf_counter() - started, 2)})
+            if os.path.exists(SPELLING_INDEX_PATH):
+                started = time.perf_counter()
+                _index = SpellingIndex(SPELLING_INDEX_PATH)
+                logger.info("spelling_index_loaded", extra={
+                    "words": _index.word_count, "ms": round((time.perf_counter() - started) * 1000, 2),
+                })
+            else:
+                # Without an index /spell-check answers 503; say why once, at startup
+                logger.warning("spelling_index_missing", extra={
+                    "index_path": SPELLING_INDEX_PATH,
+                    "hint": "set SPELLING_WORDLIST to a word list, or build the index with python spelling.py --wordlist <file>",
+                })
+        except (OSError, ValueError) as e:
+            logger.warning("spelling_index_unavailable", extra={"error": str(e)})
+            _index = None
+        _index_checked = True
+    return _index
+
+
+def _source_words(wordlist):
+    yield from read_wordlist(wordlist)
+    if os.path.exists(LEGAL_TERMS_PATH):
+        yield from read_wordlist(LEGAL_TERMS_PATH)
+
+
+# Per-user dictionaries: username -> (loaded at, words)
+_user_dictionaries = {}
+_user_lock = threading.Lock()
+
+
+def _dictionary_key(username):
+    return join_key("dictionaries", f"{username}.txt")
+
+
+def user_words(username):
+    """Words in a user's custom dictionary, lowercased, cached for USER_DICTIONARY_TTL seconds"""
+    if not username or username == "anonymous":
+        return frozenset()
+    now = time.monotonic()
+    with _user_lock:
+        cached = _user_dictionaries.get(username)
+        if cached is not None and now - cached[0] < USER_DICTIONARY_TTL:
+            return cached[1]
+    try:
+        text = get_storage().read_text(_dictionary_key(username))
+        words = frozenset(line.strip().lower() for line in text.splitlines() if line.strip())
+    except FileNotFoundError:
+        words = frozenset()
+    with _user_lock:
+        _user_dictionaries[username] = (now, words)
+    return words
+
+
+def add_user_words(username, words):
+    """
+    Add words to a user's custom dictionary
+
+    Returns:
+        list: The dictionary after the update, sorted
+    """
+    current = set(user_words(username))
+    current.update(word.strip().lower() for word in words if word.strip())
+    get_storage().write_text(_dictionary_key(username), "\n".join(sorted(current)) + "\n")
+    with _user_lock:
+        _user_dictionaries[username] = (time.monotonic(), frozenset(current))
+    return sorted(current)
+
+
+def _match_case(original, suggestion):
+    if original.isupper():
+        return suggestion.upper()
+    if original[:1].isupper():
+        return suggestion[:1].upper() + suggestion[1:]
+    return suggestion
+
+
+def check_text(text, username=None, index=None):
+    """
+    Spell-check every word of text in one pass
+
+    Each distinct word is looked up once. Unknown words are only reported
+    when the index has a close suggestion; capitalized words (often names)
+    only when it is one edit away. All-caps words (acronyms) are skipped.
+
+    Returns:
+        list: Structured "Spelling" issues, with other candidates in "alternatives"
+    """
+    index = index if index is not None else get_index()
+    if index is None:
+        return []
+    custom = user_words(username)
+    occurrences = {}
+    for match in _WORD.finditer(text):
+        word = match.group(0)
+        if len(word) < 3 or word.isupper():
+            continue
+        occurrences.setdefault(_POSSESSIVE.sub("", word.lower()), []).append(match)
+
+    issues = []
+    for lowered, matches in occurrences.items():
+        if lowered in custom or lowered in index:
+            continue
+        suggestions = index.suggest(lowered)
+        if not suggestions:
+            continue
+        for match in matches:
+            original = match.group(0)
+            capitalized = original[:1].isupper()
+            candidates = [word for word, distance in suggestions if not capitalized or distance == 1]
+            if not candidates:
+                continue
+            start = match.start()
+            end = start + len(lowered)
+            suggestion = _match_case(original, candidates[0])
+            issues.append(make_issue(
+                "Spelling", text[start:end], suggestion, f'Spelling error: Did you mean "{suggestion}"?',
+                start, end, source="rules",
+                alternatives=[_match_case(original, word) for word in candidates[1:]],
+            ))
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the spelling index from a word list")
+    parser.add_argument("--wordlist", default=SPELLING_WORDLIST, help="Word list (one word per line, or hunspell .dic)")
+    parser.add_argument("--output", default=SPELLING_INDEX_PATH, help="Index file to write")
+    parser.add_argument("--max-distance", type=int, default=SPELLING_MAX_DISTANCE, help="Largest edit distance suggested")
+    args = parser.parse_args()
+    if not args.wordlist:
+        parser.error("--wordlist (or SPELLING_WORDLIST) is required")
+    started = time.perf_counter()
+    count = build_index(_source_words(args.wordlist), args.output, args.max_distance)
+    print(f"Indexed {count} words into {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
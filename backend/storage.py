@@ -0,0 +1,575 @@
+"""
+Pluggable storage for projects, logs and transcripts
+
+Endpoints address files by key ("projects/alice/memo/memo_extracted.txt")
+instead of local paths. STORAGE_BACKEND selects the implementation:
+
+    local  - files under STORAGE_ROOT (default: the working directory)
+    s3     - objects in S3_BUCKET_NAME, optionally on an S3-compatible
+             endpoint (S3_ENDPOINT_URL, e.g. MinIO), with multipart uploads,
+             parallel ranged downloads and a read-through local cache
+
+Text artifacts go through read_text/write_text/append_text, which apply the
+compression codec from compression_utils.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import record_cache_lookup
+from compression_utils import (
+    get_codec, codec_from_name, logical_name, stored_name, variant_names,
+    compress_bytes, decompress_bytes, wrap_reader, STREAM_CHUNK_SIZE,
+)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", ".")
+S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "insync-edits-storage")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "storage-cache"))
+MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+MULTIPART_PART_SIZE = int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024)))
+TRANSFER_WORKERS = int(os.getenv("S3_TRANSFER_WORKERS", "8"))
+
+
+def join_key(*parts):
+    """
+    Build a storage key from path components
+
+    Raises:
+        ValueError: If a component would escape its parent (e.g. "..")
+    """
+    for part in parts:
+        if part in ("", ".", "..") or "/" in part or "\\" in part:
+            raise ValueError(f"Invalid key component: {part!r}")
+    return "/".join(parts)
+
+
+class StorageBackend:
+    """Common interface; subclasses implement the raw byte operations"""
+
+    def read_bytes(self, key):
+        raise NotImplementedError
+
+    def write_bytes(self, key, data):
+        raise NotImplementedError
+
+    def append_bytes(self, key, data):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Return {"name", "key", "size", "modified"} or None"""
+        raise NotImplementedError
+
+    def list_tree(self, prefix):
+        """Return info dicts for every file below prefix, with "key" relative to it"""
+        raise NotImplementedError
+
+    def open_reader(self, key):
+        """Open a stored key as a binary file object"""
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """Return a local filesystem path holding the stored bytes of key"""
+        raise NotImplementedError
+
+    def dir_exists(self, prefix):
+        """Check whether anything is stored below prefix"""
+        dirs, files = self.list_dir(prefix)
+        return bool(dirs or files)
+
+    def list_dir(self, prefix):
+        """
+        List the immediate children of prefix
+
+        Returns:
+            tuple: (sorted list of sub-directory names, list of file info dicts)
+        """
+        dirs = set()
+        files = []
+        for info in self.list_tree(prefix):
+            head, sep, _ = info["key"].partition("/")
+            if sep:
+                dirs.add(head)
+            else:
+                files.append(info)
+        return sorted(dirs), files
+
+    # Text helpers with transparent compression
+
+    def resolve(self, key):
+        """Find the stored variant (plain, .gz or .zst) of a logical key"""
+        for candidate in variant_names(key):
+            if self.exists(candidate):
+                return candidate
+        return None
+
+    def read_text(self, key):
+        """Read the full text of a logical key, decompressing as needed"""
+        stored_key = self.resolve(key)
+        if stored_key is None:
+            raise FileNotFoundError(key)
+        return self.read_stored_text(stored_key)
+
+    @contextmanager
+    def open_text_reader(self, key):
+        """Stream the text of a logical key, decompressing on the fly"""
+        stored_key = self.resolve(key)
+        if stored_key is None:
+            raise FileNotFoundError(key)
+        raw = self.open_reader(stored_key)
+        try:
+            with io.TextIOWrapper(wrap_reader(raw, codec_from_name(stored_key)), encoding="utf-8") as reader:
+                yield reader
+        finally:
+            raw.close()
+
+    def read_stored_text(self, stored_key):
+        """Read the text of a stored key (as returned by a listing), decompressing as needed"""
+        return decompress_bytes(self.read_bytes(stored_key), codec_from_name(stored_key)).decode("utf-8")
+
+    def iter_text_chunks(self, key, chunk_size=STREAM_CHUNK_SIZE):
+        """Yield decompressed text chunks without loading the whole file"""
+        with self.open_text_reader(key) as reader:
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def write_text(self, key, text, codec=None):
+        """Write text to a logical key with the configured codec, returning the stored key"""
+        codec = get_codec(codec)
+        stored_key = stored_name(key, codec)
+        self.write_bytes(stored_key, compress_bytes(text.encode("utf-8"), codec))
+        self._remove_other_variants(key, stored_key)
+        return stored_key
+
+    def append_text(self, key, text):
+        """
+        Append text to a logical key
+
+        An existing file keeps its codec; each append is written as a separate
+        gzip member or zstd frame, which both formats decode as one stream.
+        On S3 this rewrites the object and is not atomic (S3Storage.append_bytes).
+        """
+        stored_key = self.resolve(key) or stored_name(key)
+        self.append_bytes(stored_key, compress_bytes(text.encode("utf-8"), codec_from_name(stored_key)))
+        return stored_key
+
+    def recompress(self, stored_key, codec=None):
+        """
+        Rewrite a stored key with a different codec
+
+        Returns:
+            tuple: (new key, bytes before, bytes after), or None if unchanged
+        """
+        codec = get_codec(codec)
+        if codec_from_name(stored_key) == codec:
+            return None
+        data = self.read_bytes(stored_key)
+        plain = decompress_bytes(data, codec_from_name(stored_key))
+        key = logical_name(stored_key)
+        new_key = stored_name(key, codec)
+        compressed = compress_bytes(plain, codec)
+        self.write_bytes(new_key, compressed)
+        self._remove_other_variants(key, new_key)
+        return new_key, len(data), len(compressed)
+
+    def _remove_other_variants(self, key, keep):
+        for candidate in variant_names(key):
+            if candidate != keep and self.exists(candidate):
+                self.delete(candidate)
+
+
+class LocalStorage(StorageBackend):
+    """Storage backed by a directory on the local filesystem"""
+
+    def __init__(self, root=STORAGE_ROOT):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, *key.split("/")))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key escapes storage root: {key}")
+        return path
+
+    def _info(self, path, key):
+        stats = os.stat(path)
+        return {
+            "name": key.rsplit("/", 1)[-1],
+            "key": key,
+            "size": stats.st_size,
+            "modified": stats.st_mtime,
+        }
+
+    def read_bytes(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def write_bytes(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def append_bytes(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(data)
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def stat(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        return self._info(path, key)
+
+    def list_tree(self, prefix):
+        base = self._path(prefix) if prefix else self.root
+        if not os.path.isdir(base):
+            return []
+        entries = []
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                relative_key = os.path.relpath(path, base).replace(os.sep, "/")
+                entries.append(self._info(path, relative_key))
+        return entries
+
+    def list_dir(self, prefix):
+        # Cheaper than walking the whole tree for one level
+        base = self._path(prefix) if prefix else self.root
+        if not os.path.isdir(base):
+            return [], []
+        dirs = []
+        files = []
+        for entry in os.scandir(base):
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(self._info(entry.path, entry.name))
+        return sorted(dirs), files
+
+    def dir_exists(self, prefix):
+        return os.path.isdir(self._path(prefix))
+
+    def open_reader(self, key):
+        return open(self._path(key), "rb")
+
+    def local_path(self, key):
+        return self._path(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    Storage backed by an S3-compatible object store
+
+    Large objects are uploaded with multipart uploads and downloaded with
+    parallel ranged GETs. Reads go through a local cache validated by ETag,
+    so repeated reads of unchanged objects cost one conditional request.
+    S3 has no append, so append_bytes rewrites the object from the cached copy
+    (see append_bytes for what that means for concurrent writers).
+    """
+
+    def __init__(self, bucket=S3_BUCKET_NAME, prefix=S3_PREFIX, client=None,
+                 cache_dir=STORAGE_CACHE_DIR, multipart_threshold=MULTIPART_THRESHOLD,
+                 part_size=MULTIPART_PART_SIZE, max_workers=TRANSFER_WORKERS):
+        if client is None:
+            import boto3
+            from botocore.config import Config
+            client = boto3.client(
+                "s3",
+                endpoint_url=S3_ENDPOINT_URL,
+                config=Config(max_pool_connections=max(10, max_workers * 2)),
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = cache_dir
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self._cache_lock = threading.Lock()
+        self._cache_etags = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _relative_key(self, object_key):
+        return object_key[len(self.prefix) + 1:] if self.prefix else object_key
+
+    def _cache_path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _is_not_found(self, error):
+        code = str(error.response.get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def _is_not_modified(self, error):
+        code = str(error.response.get("Error", {}).get("Code", ""))
+        return code in ("304", "NotModified")
+
+    # Cache
+
+    def _store_in_cache(self, key, data, etag):
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._cache_lock:
+            self._cache_etags[key] = etag
+
+    def _drop_from_cache(self, key):
+        with self._cache_lock:
+            self._cache_etags.pop(key, None)
+        path = self._cache_path(key)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def _fetch(self, key):
+        """Make sure the cache holds the current bytes of key and return its path"""
+        from botocore.exceptions import ClientError
+
+        path = self._cache_path(key)
+        with self._cache_lock:
+            etag = self._cache_etags.get(key)
+        if etag and not os.path.exists(path):
+            etag = None
+
+        request = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if etag:
+            request["IfNoneMatch"] = etag
+        try:
+            head = self.client.head_object(**request)
+        except ClientError as e:
+            if etag and self._is_not_modified(e):
+                record_cache_lookup("storage", True)
+                return path
+            if self._is_not_found(e):
+                self._drop_from_cache(key)
+                raise FileNotFoundError(key)
+            raise
+
+        record_cache_lookup("storage", False)
+        size = head["ContentLength"]
+        if size >= self.multipart_threshold:
+            data = self._download_ranges(key, size)
+        else:
+            data = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"].read()
+        self._store_in_cache(key, data, head["ETag"])
+        return path
+
+    def _download_ranges(self, key, size):
+        """Download a large object as parallel ranged GETs"""
+        ranges = [(start, min(start + self.part_size, size) - 1) for start in range(0, size, self.part_size)]
+
+        def fetch_range(byte_range):
+            response = self.client.get_object(
+                Bucket=self.bucket,
+                Key=self._object_key(key),
+                Range=f"bytes={byte_range[0]}-{byte_range[1]}",
+            )
+            return response["Body"].read()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return b"".join(executor.map(fetch_range, ranges))
+
+    # Byte operations
+
+    def read_bytes(self, key):
+        with open(self._fetch(key), "rb") as f:
+            return f.read()
+
+    def write_bytes(self, key, data):
+        if len(data) >= self.multipart_threshold:
+            response = self._upload_multipart(key, data)
+        else:
+            response = self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+        self._store_in_cache(key, data, response["ETag"])
+
+    def _upload_multipart(self, key, data):
+        """Upload a large object with parts sent in parallel"""
+        object_key = self._object_key(key)
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key)
+        upload_id = upload["UploadId"]
+
+        def upload_part(part):
+            number, start = part
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=data[start:start + self.part_size],
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        parts = [(index + 1, start) for index, start in enumerate(range(0, len(data), self.part_size))]
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                completed = list(executor.map(upload_part, parts))
+            return self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+            raise
+
+    def append_bytes(self, key, data):
+        """
+        Append by rewriting the whole object: a read-modify-write, not atomic
+
+        Each append costs a download (unless cached) and an upload of the
+        whole object, and two writers appending at once can lose one of the
+        appends. Fine for low-volume logs written by one request at a time;
+        data written often or concurrently belongs in separate keys (as the
+        transcript index and sessions do).
+        """
+        try:
+            existing = self.read_bytes(key)
+        except FileNotFoundError:
+            existing = b""
+        self.write_bytes(key, existing + data)
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        self._drop_from_cache(key)
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        return {
+            "name": key.rsplit("/", 1)[-1],
+            "key": key,
+            "size": head["ContentLength"],
+            "modified": head["LastModified"].timestamp(),
+        }
+
+    def _object_prefix(self, prefix):
+        if prefix:
+            return self._object_key(prefix).rstrip("/") + "/"
+        return f"{self.prefix}/" if self.prefix else ""
+
+    def _list_objects(self, prefix, delimiter=None, name=""):
+        object_prefix = self._object_prefix(prefix)
+        paginator = self.client.get_paginator("list_objects_v2")
+        request = {"Bucket": self.bucket, "Prefix": object_prefix + name}
+        if delimiter:
+            request["Delimiter"] = delimiter
+        for page in paginator.paginate(**request):
+            yield object_prefix, page
+
+    def list_tree(self, prefix):
+        entries = []
+        for object_prefix, page in self._list_objects(prefix):
+            for obj in page.get("Contents", []):
+                relative_key = obj["Key"][len(object_prefix):]
+                entries.append({
+                    "name": relative_key.rsplit("/", 1)[-1],
+                    "key": relative_key,
+                    "size": obj["Size"],
+                    "modified": obj["LastModified"].timestamp(),
+                })
+        return entries
+
+    def list_dir(self, prefix):
+        dirs = []
+        files = []
+        for object_prefix, page in self._list_objects(prefix, delimiter="/"):
+            for common in page.get("CommonPrefixes", []):
+                dirs.append(common["Prefix"][len(object_prefix):].rstrip("/"))
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(object_prefix):]
+                files.append({
+                    "name": name,
+                    "key": name,
+                    "size": obj["Size"],
+                    "modified": obj["LastModified"].timestamp(),
+                })
+        return sorted(dirs), files
+
+    def dir_exists(self, prefix):
+        response = self.client.list_objects_v2(
+            Bucket=self.bucket,
+            Prefix=self._object_prefix(prefix),
+            MaxKeys=1,
+        )
+        return response.get("KeyCount", 0) > 0
+
+    def resolve(self, key):
+        # One listing call finds every variant instead of one HEAD per suffix
+        parent, _, name = key.rpartition("/")
+        found = set()
+        for object_prefix, page in self._list_objects(parent, delimiter="/", name=name):
+            for obj in page.get("Contents", []):
+                found.add(obj["Key"][len(object_prefix):])
+        for candidate in variant_names(name):
+            if candidate in found:
+                return f"{parent}/{candidate}" if parent else candidate
+        return None
+
+    def open_reader(self, key):
+        return open(self._fetch(key), "rb")
+
+    def local_path(self, key):
+        return self._fetch(key)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the process-wide storage backend, creating it on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "s3":
+                    _storage = S3Storage()
+                else:
+                    _storage = LocalStorage()
+    return _storage
+
+
+def set_storage(backend):
+    """Install a storage backend (used by the Lambda handler and tests)"""
+    global _storage
+    with _storage_lock:
+        _storage = backend
@@ -0,0 +1,145 @@
+"""
+Merging overlapping suggestions
+
+Rule findings, learned corrections, spelling hits and model issues can
+cover the same characters: a misspelled word inside a sentence the model
+rewrites, or two rules firing on one phrase. The editor can only apply one
+change per stretch of text, so merge_suggestions() turns the combined list
+into non-overlapping suggestions:
+
+1. Identical suggestions (same span, same replacement) collapse into one,
+   listing every source that made it.
+2. The remaining suggestions are ranked by source (SOURCE_PRIORITY), then
+   confidence, then position and span length.
+3. In rank order, each suggestion not already displaced is kept, and the
+   suggestions overlapping it are attached to it as "alternates".
+
+Overlaps are found with a static interval tree over all suggestions, so
+the whole merge is O(n log n + overlaps).
+
+Sentence-level findings (a message, no replacement) and unlocated issues
+are not replacements of a span and pass through unchanged.
+"""
+
+# Preferred source when suggestions conflict or duplicate each other
+SOURCE_PRIORITY = {"learned": 3, "llm": 2, "rules": 1}
+# Model confidences given as words
+CONFIDENCE_LEVELS = {"high": 0.9, "medium": 0.6, "low": 0.3}
+# Fields copied into an alternate; offsets stay so the editor can apply it instead
+ALTERNATE_FIELDS = ("category", "original_text", "suggested_text", "explanation", "start", "end", "source", "confidence")
+
+
+class IntervalTree:
+    """
+    Static interval tree over half-open (start, end) spans
+
+    The spans are sorted by start and laid out as an implicit balanced
+    binary search tree over that array; each node stores the largest end in
+    its subtree, so subtrees that end before a query are skipped.
+    """
+
+    def __init__(self, spans):
+        self.order = sorted(range(len(spans)), key=lambda index: spans[index][0])
+        self.starts = [spans[index][0] for index in self.order]
+        self.ends = [spans[index][1] for index in self.order]
+        self.max_end = list(self.ends)
+        self._augment(0, len(self.order) - 1)
+
+    def _augment(self, low, high):
+        if low > high:
+            return -1
+        middle = (low + high) // 2
+        self.max_end[middle] = max(self.ends[middle], self._augment(low, middle - 1), self._augment(middle + 1, high))
+        return self.max_end[middle]
+
+    def overlapping(self, start, end):
+        """Indices (into the spans given to the constructor) of the spans overlapping [start, end)"""
+        found = []
+        stack = [(0, len(self.order) - 1)]
+        while stack:
+            low, high = stack.pop()
+            if low > high:
+                continue
+            middle = (low + high) // 2
+            if self.max_end[middle] <= start:
+                # Nothing in this subtree reaches the query
+                continue
+            stack.append((low, middle - 1))
+            if self.starts[middle] < end:
+                if self.ends[middle] > start:
+                    found.append(self.order[middle])
+                stack.append((middle + 1, high))
+        return found
+
+
+def _confidence(issue):
+    confidence = issue.get("confidence")
+    if isinstance(confidence, str):
+        return CONFIDENCE_LEVELS.get(confidence.lower(), 0)
+    return confidence or 0
+
+
+def _rank(issue):
+    return (
+        -SOURCE_PRIORITY.get(issue.get("source"), 0),
+        -_confidence(issue),
+        issue["start"],
+        issue["end"] - issue["start"],
+    )
+
+
+def _alternate(issue):
+    return {field: issue.get(field) for field in ALTERNATE_FIELDS}
+
+
+def merge_suggestions(issues):
+    """
+    Resolve overlapping suggestions into a non-overlapping set
+
+    Args:
+        issues (list): Structured issues from any mix of sources
+
+    Returns:
+        list: New issue dicts sorted by position, unlocated issues last. Kept
+            suggestions carry "alternates" (the overlapping suggestions they
+            displaced) and "sources" when several sources made them.
+    """
+    passthrough = []
+    unique = {}
+    for issue in issues:
+        if issue.get("start") is None or not issue.get("suggested_text") or issue["end"] <= issue["start"]:
+            passthrough.append(issue)
+            continue
+        key = (issue["start"], issue["end"], issue["suggested_text"].lower())
+        unique.setdefault(key, []).append(issue)
+
+    candidates = []
+    for duplicates in unique.values():
+        duplicates.sort(key=_rank)
+        best = dict(duplicates[0])
+        sources = sorted({duplicate.get("source") for duplicate in duplicates if duplicate.get("source")},
+                         key=lambda source: -SOURCE_PRIORITY.get(source, 0))
+        if len(sources) > 1:
+            best["sources"] = sources
+        candidates.append(best)
+    candidates.sort(key=_rank)
+
+    tree = IntervalTree([(issue["start"], issue["end"]) for issue in candidates])
+    displaced = [False] * len(candidates)
+    kept = []
+    for index, issue in enumerate(candidates):
+        if displaced[index]:
+            continue
+        alternates = []
+        for other in sorted(tree.overlapping(issue["start"], issue["end"])):
+            if other != index and not displaced[other]:
+                displaced[other] = True
+                alternates.append(_alternate(candidates[other]))
+        if alternates:
+            issue["alternates"] = alternates
+        kept.append(issue)
+
+    return sorted(
+        kept + passthrough,
+        key=lambda issue: (issue.get("start") is None, issue.get("start") or 0, issue.get("end") or 0),
+    )
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (from issues import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    previous = storage.get_storage()
+    backend = storage.LocalStorage(str(tmp_path))
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(previous)
@@ -0,0 +1,102 @@
+import pytest
+
+import anchoring
+from anchoring import TextIndex, anchor_issues, normalize
+
+
+def issue(original_text, **fields):
+    return {"type": "Grammar", "original_text": original_text, "suggested_text": "x", **fields}
+
+
+def spans(issues):
+    return [(item.get("start"), item.get("end"), item["original_text"]) for item in issues]
+
+
+@pytest.fixture(params=["scan", "index"])
+def lookup(request, monkeypatch):
+    # Small documents are scanned; force the word index too
+    if request.param == "index":
+        monkeypatch.setattr(anchoring, "ANCHOR_SCAN_BUDGET", 0)
+    return request.param
+
+
+def test_normalize_folds_case_quotes_dashes_and_whitespace():
+    assert normalize("  The “Tenant”—who\r\n\tpays rent ") == 'the "tenant"-who pays rent'
+
+
+def test_index_maps_normalized_offsets_back_to_the_original():
+    text = "The  ‘Lessee’\r\n\r\nshall\tpay."
+    index = TextIndex(text)
+
+    assert index.normalized == "the 'lessee' shall pay."
+    start = index.normalized.index("'lessee' shall")
+    assert text[slice(*index.original_span(start, start + len("'lessee' shall")))] == "‘Lessee’\r\n\r\nshall"
+    assert index.original_offset(len(index.normalized)) == len(text)
+
+
+def test_snippet_anchors_across_line_breaks_and_quotes(lookup):
+    text = "Whereas the “Landlord”\nand the  Tenant agree:\n\nthe rent is due."
+    issues = [issue('the "landlord" and the tenant'), issue("Rent  is due")]
+
+    anchor_issues(text, issues)
+
+    first, second = "the “Landlord”\nand the  Tenant", "rent is due"
+    assert spans(issues) == [
+        (text.index(first), text.index(first) + len(first), first),
+        (text.index(second), text.index(second) + len(second), second),
+    ]
+    assert all("anchor" not in item for item in issues)
+
+
+def test_repeated_snippets_take_successive_occurrences(lookup):
+    text = "The party shall pay. The party shall sign. The party shall leave."
+    issues = [issue("the party shall"), issue("The party shall"), issue("the  party shall")]
+
+    anchor_issues(text, issues)
+
+    assert [item["start"] for item in issues] == [0, 21, 43]
+
+
+def test_occurrences_follow_report_order_and_wrap_around(lookup):
+    text = "alpha beta. gamma beta. delta beta."
+    issues = [issue("gamma"), issue("beta"), issue("alpha"), issue("beta")]
+
+    anchor_issues(text, issues)
+
+    # "beta" after gamma, then "alpha", then the first beta after the cursor
+    assert [item["start"] for item in issues] == [12, 18, 0, 6]
+
+
+def test_missing_snippet_and_located_issues_are_left_alone(lookup):
+    text = "The tenant pays rent."
+    located = issue("tenant", start=4, end=10)
+    missing = issue("the landlord")
+
+    anchor_issues(text, [located, missing])
+
+    assert spans([located, missing]) == [(4, 10, "tenant"), (None, None, "the landlord")]
+
+
+def test_matches_are_limited_to_ranges(lookup):
+    text = "The fee is due. The fee is due."
+    issues = [issue("the fee is due")]
+
+    anchor_issues(text, issues, ranges=[(16, 31)])
+
+    assert issues[0]["start"] == 16
+
+
+def test_rewritten_snippet_anchors_fuzzily():
+    text = "Notice must be given in writting to the other party within thirty days."
+    issues = [issue("notice must be given in writing to the other party")]
+
+    anchor_issues(text, issues)
+
+    assert issues[0]["anchor"] == "fuzzy"
+    assert issues[0]["original_text"] == "Notice must be given in writting to the other party"
+
+
+def test_unrelated_snippet_is_not_anchored_fuzzily():
+    index = TextIndex("Notice must be given in writing to the other party.")
+
+    assert index.fuzzy(normalize("payment is due to the landlord on demand")) is None
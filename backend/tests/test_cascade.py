@@ -0,0 +1,29 @@
+from cascade import flag_paragraphs
+from incremental_analysis import split_paragraphs
+from rule_engine import run_rules
+
+TEXT = (
+    "The lease was signed by the tenant.\n\n"
+    "The tenant will recieve the keys on Monday.\n\n"
+    "The landlord keeps the deposit in a separate account."
+)
+
+
+def test_only_word_level_findings_flag_a_paragraph():
+    issues = run_rules(TEXT)
+    # The passive first paragraph has a sentence-level finding only
+    assert any(issue.get("message") and issue["start"] == 0 for issue in issues)
+
+    assert flag_paragraphs(split_paragraphs(TEXT), issues) == [1]
+
+
+def test_threshold_counts_findings_per_paragraph():
+    paragraphs = split_paragraphs(TEXT)
+    second = paragraphs[1]
+    issues = [
+        {"start": second.start + 4, "end": second.start + 10, "suggested_text": "renter"},
+        {"start": second.start + 16, "end": second.start + 23, "suggested_text": "receive"},
+        {"start": paragraphs[2].start, "end": paragraphs[2].start + 3, "suggested_text": "A"},
+    ]
+
+    assert flag_paragraphs(paragraphs, issues, min_findings=2) == [1]
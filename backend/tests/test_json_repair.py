@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from json_repair import IncrementalJSONParser, parse_model_json
+
+ISSUES = {
+    "issues": [
+        {"type": "Grammar", "original_text": "We was", "suggested_text": "We were", "confidence": 0.9},
+        {"type": "Style", "original_text": "utilise", "suggested_text": "use", "tags": ["plain", "english"]},
+        {"type": "Clarity", "original_text": "a \"quoted\" {brace}, [bracket]", "suggested_text": "x"},
+    ],
+}
+DOCUMENT = json.dumps(ISSUES)
+
+
+def test_valid_json_is_not_repaired():
+    assert parse_model_json(DOCUMENT) == (ISSUES, False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"issues": []}\n```', {"issues": []}),
+    ('Here is the result: {"issues": [1, 2]} Hope it helps!', {"issues": [1, 2]}),
+    ('{"issues": [1, 2,], "total": 2,}', {"issues": [1, 2], "total": 2}),
+    ('{"issues": [1 2 3]}', {"issues": [1, 2, 3]}),
+    ('{"a" "b", "c": "d"}', {"a": "b", "c": "d"}),
+    ('{"a": {"b": 1] }', {"a": {"b": 1}}),
+    ('{"a": 1, "b":}', {"a": 1}),
+])
+def test_common_defects_are_repaired(text, expected):
+    assert parse_model_json(text) == (expected, True)
+
+
+def test_every_truncation_keeps_only_complete_issues():
+    # Cut the document at every offset; whatever comes back must be a prefix of the issues
+    lengths = set()
+    for cut in range(DOCUMENT.index("[") + 1, len(DOCUMENT)):
+        data, repaired = parse_model_json(DOCUMENT[:cut])
+
+        assert repaired
+        issues = data["issues"]
+        assert issues == ISSUES["issues"][:len(issues)]
+        lengths.add(len(issues))
+    assert lengths == {0, 1, 2, 3}
+
+
+def test_truncated_inside_a_string_drops_the_partial_issue():
+    text = DOCUMENT[:DOCUMENT.index("utilise") + 3]
+
+    data, repaired = parse_model_json(text)
+
+    assert repaired
+    assert data == {"issues": ISSUES["issues"][:1]}
+
+
+def test_truncated_number_is_dropped():
+    data, _ = parse_model_json('{"total": 3, "score": 1.')
+
+    assert data == {"total": 3}
+
+
+def test_nothing_to_recover_raises():
+    with pytest.raises(ValueError):
+        parse_model_json("Sorry, I cannot help with that.")
+
+
+def test_stream_yields_each_issue_once_complete():
+    parser = IncrementalJSONParser()
+    completed = []
+    for start in range(0, len(DOCUMENT), 7):
+        completed.append(parser.feed(DOCUMENT[start:start + 7]))
+
+    items = [item for chunk in completed for item in chunk]
+    assert items == ISSUES["issues"]
+    # Items arrive as they close, not all at the end
+    assert sum(1 for chunk in completed if chunk) == 3
+    assert parser.result() == ISSUES
+    assert not parser.repaired
+
+
+def test_stream_cut_off_mid_issue():
+    cut = DOCUMENT.index('{"type": "Clarity"') + 20
+    parser = IncrementalJSONParser()
+
+    items = parser.feed(DOCUMENT[:cut])
+
+    assert items == ISSUES["issues"][:2]
+    assert parser.result() == {"issues": ISSUES["issues"][:2]}
+    assert parser.repaired
+
+
+def test_only_the_configured_array_is_collected():
+    parser = IncrementalJSONParser(collect_key="findings")
+
+    assert parser.feed('{"issues": [{"a": 1}], "findings": [{"b": 2}, {"c": ') == [{"b": 2}]
+    assert parser.result() == {"issues": [{"a": 1}], "findings": [{"b": 2}]}
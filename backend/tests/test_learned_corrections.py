@@ -0,0 +1,31 @@
+from learned_corrections import LearnedCorrections
+from rule_engine import run_rules
+
+
+def test_invalid_table_is_treated_as_empty(local_storage):
+    local_storage.write_text("corrections/users/alice.json", "{not json")
+    corrections = LearnedCorrections(min_accepts=1)
+
+    assert corrections.table("alice").entries == {}
+    assert corrections.issues("Wheras the parties agree", "alice") == []
+
+
+def test_invalid_table_does_not_break_the_rule_engine(local_storage):
+    local_storage.write_text("corrections/users/alice.json", "[1, 2, 3]")
+
+    issues = run_rules("We might agree.", username="alice")
+
+    assert any(issue["suggested_text"] == "may" for issue in issues)
+
+
+def test_accepted_changes_become_suggestions(local_storage):
+    corrections = LearnedCorrections(min_accepts=2)
+    corrections.record("alice", "utilise", "use", "Style")
+    assert corrections.issues("We utilise it", "alice") == []
+
+    corrections.record("alice", "utilise", "use", "Style")
+    issues = corrections.issues("We utilise it", "alice")
+
+    assert [(issue["start"], issue["end"], issue["suggested_text"], issue["source"]) for issue in issues] == [
+        (3, 10, "use", "learned"),
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, QueueTimeout
+
+
+def test_waiter_timing_out_in_the_queue_restores_the_users_tag():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=1_000_000)
+    running = scheduler.acquire("bob", 100)
+    # An ETA of zero lets the call queue, so it times out while waiting
+    scheduler._avg_call_seconds = 0.0
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire("alice", 10_000, deadline=time.monotonic() + 0.05)
+    assert "alice" not in scheduler._last_tag
+    scheduler.release(running)
+
+
+def test_rejected_waiter_restores_the_previous_tag():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=1_000_000)
+    first = scheduler.acquire("alice", 100)
+    tag = scheduler._last_tag["alice"]
+    # The queue ETA exceeds the deadline, so the call is rejected up front
+    scheduler._avg_call_seconds = 60.0
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire("alice", 100, deadline=time.monotonic() + 1)
+    assert scheduler._last_tag["alice"] == tag
+    scheduler.release(first)
+
+
+def test_async_waiter_starts_when_a_slot_is_released():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=1_000_000)
+
+    async def scenario():
+        running = scheduler.acquire("bob", 100)
+        waiter = asyncio.ensure_future(scheduler.acquire_async("alice", 100))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        # Released from another thread, as the LLM call pool does
+        await asyncio.get_running_loop().run_in_executor(None, scheduler.release, running)
+        ticket = await asyncio.wait_for(waiter, 1)
+        scheduler.release(ticket)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=1_000_000)
+
+    async def scenario():
+        running = scheduler.acquire("bob", 100)
+        waiter = asyncio.ensure_future(scheduler.acquire_async("alice", 100))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.status()["queued"] == 0
+        scheduler.release(running)
+
+    asyncio.run(scenario())
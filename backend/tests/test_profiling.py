@@ -0,0 +1,38 @@
+import asyncio
+import contextvars
+import time
+
+import profiling
+
+
+def wait_on_upstream():
+    with profiling.follow_thread():
+        time.sleep(0.2)
+
+
+async def app(scope, receive, send):
+    context = contextvars.copy_context()
+    await asyncio.get_running_loop().run_in_executor(None, context.run, wait_on_upstream)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_profile_includes_the_worker_thread_of_the_request(local_storage, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/analyze", "headers": [(b"x-profile", b"secret")], "query_string": b""}
+    asyncio.run(profiling.ProfilingMiddleware(app)(scope, receive, send))
+
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    stacks = profiling.load_profile(profile_id)
+    worker_stacks = [line for line in stacks.splitlines() if line.startswith("[")]
+    assert worker_stacks
+    assert all("wait_on_upstream" in line for line in worker_stacks)
@@ -0,0 +1,55 @@
+import random
+import time
+
+import pytest
+
+import repetition
+from repetition import repetition_issues
+
+
+def found(text):
+    return [(issue["original_text"], issue["suggested_text"]) for issue in repetition_issues(text)]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def implementation(request, monkeypatch):
+    if request.param and not repetition.NUMPY_SUPPORT:
+        pytest.skip("NumPy is not installed")
+    monkeypatch.setattr(repetition, "NUMPY_SUPPORT", request.param)
+
+
+def test_doubled_words_and_phrases(implementation):
+    assert found("Pay the the rent to the party the party now.") == [
+        ("the the", "the"), ("the party the party", "the party"),
+    ]
+
+
+def test_allowed_doubles_numbers_and_punctuation_are_not_flagged(implementation):
+    assert found("He had had enough. Said that that clause. Pages 12 12. The party. The party.") == []
+
+
+def test_longest_run_is_one_issue_with_offsets_in_the_original_text(implementation):
+    text = "«Ünïcode» very very very “quoted” text"
+    issues = repetition_issues(text)
+
+    assert len(issues) == 1
+    assert text[issues[0]["start"]:issues[0]["end"]] == "very very very"
+    assert issues[0]["suggested_text"] == "very"
+
+
+def test_ten_megabytes_are_analysed_in_well_under_a_second():
+    if not repetition.NUMPY_SUPPORT:
+        pytest.skip("the target applies to the NumPy path")
+    rng = random.Random(0)
+    vocabulary = [f"word{index}" for index in range(20000)]
+    clean = " ".join(rng.choice(vocabulary) + rng.choice(["", "", "", ",", "."]) for _ in range(1_200_000))
+    repeats = " ".join(rng.choice("the a party tenant shall pay rent".split()) for _ in range(2_000_000))
+
+    def seconds(text):
+        started = time.perf_counter()
+        repetition_issues(text[:10_000_000])
+        return time.perf_counter() - started
+
+    assert min(seconds(clean), seconds(clean)) < 1.0
+    # Every seventh word is a repeat here, so most of the time goes into building ~270,000 issues
+    assert seconds(repeats) < 2.5
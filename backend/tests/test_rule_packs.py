@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from rule_packs import RulePack, RulePackError, RulePackRegistry, parse_pack
+
+
+def pack_file(rules, name="house"):
+    return json.dumps({"name": name, "version": "1", "rules": rules}).encode("utf-8")
+
+
+@pytest.mark.parametrize("pattern", [
+    "(?i)utilise",
+    r"(\w+) \1",
+    r"(?P<word>\w+) (?P=word)",
+    r"(a)?(?(1)b|c)",
+    r"(?P<word>colour)",
+])
+def test_patterns_that_break_the_combined_expression_are_rejected(pattern):
+    with pytest.raises(RulePackError):
+        parse_pack(pack_file([{"category": "Style", "pattern": pattern, "suggestion": "x"}]), "house")
+
+
+def test_scoped_flags_and_numbered_groups_are_accepted():
+    pack = parse_pack(pack_file([
+        {"category": "Style", "pattern": "(?i:utilise)", "suggestion": "use"},
+        {"category": "Grammar", "pattern": r"\b(your)(?=\s+going\b)", "suggestion": "you're"},
+    ]), "house")
+
+    assert len(pack.rules) == 2
+
+
+@pytest.fixture
+def registry(tmp_path):
+    (tmp_path / "house.json").write_bytes(pack_file([{"category": "Style", "match": "utilise", "suggestion": "use"}]))
+    (tmp_path / "assignments.json").write_text(json.dumps({"default": ["house"]}))
+    return RulePackRegistry(str(tmp_path), poll_seconds=3600)
+
+
+def broken_pack():
+    # As a pack from before the validation, or one the checks miss
+    return RulePack("house", "2", "broken", {}, [{"category": "Style", "pattern": "(?i)utilise", "suggestion": "use"}])
+
+
+def test_a_pack_that_fails_the_combined_compile_keeps_the_last_good_rules(registry):
+    good = registry.rules_for("alice")
+    registry._packs["house"] = broken_pack()
+
+    compiled = registry.rules_for("alice")
+
+    assert compiled is good
+    assert [issue["suggested_text"] for issue in compiled.issues("We utilise it.")] == ["use"]
+
+
+def test_a_pack_that_never_compiled_is_left_out(registry):
+    registry.refresh()
+    registry._packs["house"] = broken_pack()
+
+    assert registry.rules_for("alice").issues("We utilise it.") == []
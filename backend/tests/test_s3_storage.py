@@ -0,0 +1,103 @@
+import pytest
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+from storage import S3Storage  # noqa: E402
+
+BUCKET = "test-bucket"
+PART_SIZE = 5 * 1024 * 1024  # the smallest part S3 accepts
+
+
+@pytest.fixture
+def s3_client():
+    mock = getattr(moto, "mock_aws", None) or moto.mock_s3
+    with mock():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def calls(s3_client, monkeypatch):
+    """Record the S3 calls (and their arguments) made through the client"""
+    recorded = []
+    for method in ("create_multipart_upload", "upload_part", "get_object", "head_object", "put_object"):
+        original = getattr(s3_client, method)
+
+        def spy(*args, _original=original, _method=method, **kwargs):
+            recorded.append((_method, kwargs))
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(s3_client, method, spy)
+    return recorded
+
+
+def make_storage(client, tmp_path, name):
+    return S3Storage(
+        bucket=BUCKET, prefix="app", client=client, cache_dir=str(tmp_path / name),
+        multipart_threshold=PART_SIZE, part_size=PART_SIZE, max_workers=4,
+    )
+
+
+def test_large_objects_use_multipart_upload_and_ranged_gets(s3_client, calls, tmp_path):
+    data = bytes(range(256)) * (PART_SIZE * 2 // 256) + b"tail"
+    make_storage(s3_client, tmp_path, "writer").write_bytes("big.bin", data)
+
+    assert [name for name, _ in calls].count("create_multipart_upload") == 1
+    assert [name for name, _ in calls].count("upload_part") == 3
+    assert s3_client.head_object(Bucket=BUCKET, Key="app/big.bin")["ContentLength"] == len(data)
+
+    calls.clear()
+    assert make_storage(s3_client, tmp_path, "reader").read_bytes("big.bin") == data
+    ranges = sorted(kwargs["Range"] for name, kwargs in calls if name == "get_object")
+    assert ranges == sorted([
+        f"bytes=0-{PART_SIZE - 1}",
+        f"bytes={PART_SIZE}-{2 * PART_SIZE - 1}",
+        f"bytes={2 * PART_SIZE}-{len(data) - 1}",
+    ])
+
+
+def test_small_objects_use_a_single_put_and_get(s3_client, calls, tmp_path):
+    make_storage(s3_client, tmp_path, "writer").write_text("notes/a.txt", "hello")
+    calls.clear()
+
+    assert make_storage(s3_client, tmp_path, "reader").read_text("notes/a.txt") == "hello"
+    gets = [kwargs for name, kwargs in calls if name == "get_object"]
+    assert len(gets) == 1 and "Range" not in gets[0]
+
+
+def test_cached_copy_is_reused_until_the_etag_changes(s3_client, calls, tmp_path):
+    writer = make_storage(s3_client, tmp_path, "writer")
+    reader = make_storage(s3_client, tmp_path, "reader")
+    writer.write_bytes("doc.txt", b"first version")
+    assert reader.read_bytes("doc.txt") == b"first version"
+
+    calls.clear()
+    assert reader.read_bytes("doc.txt") == b"first version"
+    # Unchanged: one conditional HEAD, no download
+    assert [name for name, _ in calls] == ["head_object"]
+    assert calls[0][1].get("IfNoneMatch")
+
+    writer.write_bytes("doc.txt", b"second version")
+    assert reader.read_bytes("doc.txt") == b"second version"
+
+
+def test_deleted_object_is_dropped_from_the_cache(s3_client, tmp_path):
+    writer = make_storage(s3_client, tmp_path, "writer")
+    reader = make_storage(s3_client, tmp_path, "reader")
+    writer.write_bytes("doc.txt", b"content")
+    assert reader.read_bytes("doc.txt") == b"content"
+
+    writer.delete("doc.txt")
+
+    with pytest.raises(FileNotFoundError):
+        reader.read_bytes("doc.txt")
+
+
+def test_append_rewrites_the_object(s3_client, tmp_path):
+    storage = make_storage(s3_client, tmp_path, "writer")
+    storage.append_text("logs/activity.log", "one\n")
+    storage.append_text("logs/activity.log", "two\n")
+
+    assert make_storage(s3_client, tmp_path, "reader").read_text("logs/activity.log") == "one\ntwo\n"
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import spelling
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Most frequent first, as a real word list would be
+WORDS = ["the", "agreement", "party", "parties", "contract", "receive", "necessary", "tenant", "between", "hereby"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "spelling.idx")
+    spelling.build_index(WORDS, path, max_distance=2)
+    return spelling.SpellingIndex(path)
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_dictionaries():
+    spelling._user_dictionaries.clear()
+    yield
+    spelling._user_dictionaries.clear()
+
+
+def test_lookup_at_distance_one_and_two(index):
+    assert "agreement" in index
+    assert "agrement" not in index
+    assert index.suggest("agrement") == [("agreement", 1)]
+    assert index.suggest("recieve") == [("receive", 1)]
+    assert index.suggest("neccesary") == [("necessary", 2)]
+    assert index.suggest("neccesary", max_distance=1) == []
+
+
+def test_suggestions_rank_closest_then_most_frequent(index):
+    assert index.suggest("partie") == [("parties", 1), ("party", 2)]
+    assert index.suggest("partie", limit=1) == [("parties", 1)]
+
+
+@pytest.mark.parametrize("word", ["partys", "tenent", "betwen", "herby", "contrct", "thee", "agremeent"])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_pruned_search_matches_a_full_scan(index, word, limit):
+    distances = [(spelling.edit_distance(word, candidate, 2), rank) for rank, candidate in enumerate(WORDS)]
+    expected = [(WORDS[rank], distance) for distance, rank in sorted(distances) if 0 < distance <= 2][:limit]
+
+    assert index.suggest(word, limit=limit) == expected
+
+
+def test_repeated_lookups_are_cached(index):
+    first = index.suggest("contrakt")
+    first.append(("mutated", 9))
+
+    assert index.suggest("contrakt") == [("contract", 1)]
+
+
+def test_check_text_reports_each_occurrence(index, local_storage):
+    text = "The tennant and the Tennant recieve it."
+
+    issues = spelling.check_text(text, index=index)
+
+    assert [(issue["start"], issue["original_text"], issue["suggested_text"]) for issue in issues] == [
+        (4, "tennant", "tenant"),
+        (20, "Tennant", "Tenant"),
+        (28, "recieve", "receive"),
+    ]
+
+
+def test_capitalized_words_need_a_single_edit(index, local_storage):
+    assert spelling.check_text("Neccesary", index=index) == []
+    assert [issue["suggested_text"] for issue in spelling.check_text("neccesary", index=index)] == ["necessary"]
+
+
+def test_user_dictionary_suppresses_findings(index, local_storage):
+    text = "The tennant shall recieve notice."
+    assert len(spelling.check_text(text, username="alice", index=index)) == 2
+
+    assert spelling.add_user_words("alice", ["Tennant", " "]) == ["tennant"]
+
+    issues = spelling.check_text(text, username="alice", index=index)
+    assert [issue["original_text"] for issue in issues] == ["recieve"]
+    assert local_storage.read_text("dictionaries/alice.txt") == "tennant\n"
+    # Other users still get the finding
+    assert len(spelling.check_text(text, username="bob", index=index)) == 2
+
+
+def test_user_dictionary_is_read_from_storage(index, local_storage):
+    local_storage.write_text("dictionaries/alice.txt", "Recieve\n\n")
+
+    issues = spelling.check_text("We recieve it.", username="alice", index=index)
+
+    assert issues == []
+
+
+def test_cli_index_round_trips_through_mmap(tmp_path):
+    wordlist = tmp_path / "words.dic"
+    wordlist.write_text("3\n# comment\nAgreement/S\nparty\nreceive/M\nparty\n", encoding="utf-8")
+    output = tmp_path / "built" / "spelling.idx"
+
+    subprocess.run(
+        [sys.executable, "spelling.py", "--wordlist", str(wordlist), "--output", str(output), "--max-distance", "1"],
+        cwd=BACKEND_DIR, check=True, capture_output=True,
+    )
+    index = spelling.SpellingIndex(str(output))
+
+    assert index.max_distance == 1
+    # The word list keeps its order; bundled legal terms follow it
+    assert [index.word(word_id) for word_id in range(3)] == ["agreement", "party", "receive"]
+    assert index.word_count > 3
+    assert "receive" in index
+    assert index.suggest("recieve") == [("receive", 1)]
+    assert index.suggest("agremnt") == []
+
+
+def test_rejects_files_that_are_not_an_index(tmp_path):
+    path = tmp_path / "spelling.idx"
+    path.write_bytes(b"\0" * 64)
+
+    with pytest.raises(ValueError):
+        spelling.SpellingIndex(str(path))
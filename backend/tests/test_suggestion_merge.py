@@ -0,0 +1,125 @@
+import random
+
+from suggestion_merge import IntervalTree, merge_suggestions
+
+
+def suggestion(start, end, suggested_text="x", source="rules", **fields):
+    return {
+        "category": "Grammar", "original_text": "o" * (end - start), "suggested_text": suggested_text,
+        "explanation": "", "start": start, "end": end, "source": source, **fields,
+    }
+
+
+def summary(issues):
+    return [(issue.get("start"), issue.get("end"), issue.get("suggested_text"), issue.get("source")) for issue in issues]
+
+
+def test_interval_tree_matches_a_full_scan():
+    generator = random.Random(7)
+    spans = []
+    for _ in range(300):
+        start = generator.randrange(1000)
+        spans.append((start, start + generator.randrange(1, 40)))
+    tree = IntervalTree(spans)
+
+    for _ in range(200):
+        start = generator.randrange(1000)
+        end = start + generator.randrange(1, 60)
+        expected = [index for index, (low, high) in enumerate(spans) if low < end and high > start]
+        assert sorted(tree.overlapping(start, end)) == expected
+
+
+def test_touching_spans_do_not_overlap():
+    issues = [suggestion(0, 5, "a"), suggestion(5, 10, "b")]
+
+    merged = merge_suggestions(issues)
+
+    assert summary(merged) == [(0, 5, "a", "rules"), (5, 10, "b", "rules")]
+    assert all("alternates" not in issue for issue in merged)
+
+
+def test_identical_suggestions_collapse_with_their_sources():
+    issues = [
+        suggestion(4, 9, "Their", source="rules"),
+        suggestion(4, 9, "their", source="llm", confidence=0.4),
+        suggestion(4, 9, "their", source="rules"),
+    ]
+
+    merged = merge_suggestions(issues)
+
+    assert summary(merged) == [(4, 9, "their", "llm")]
+    assert merged[0]["sources"] == ["llm", "rules"]
+    assert "alternates" not in merged[0]
+
+
+def test_source_priority_beats_confidence():
+    issues = [
+        suggestion(0, 20, "rewrite", source="rules", confidence=1.0),
+        suggestion(5, 10, "word", source="llm", confidence=0.2),
+        suggestion(8, 12, "learned", source="learned"),
+    ]
+
+    merged = merge_suggestions(issues)
+
+    assert summary(merged) == [(8, 12, "learned", "learned")]
+    # Alternates are listed best first
+    assert [(alternate["start"], alternate["source"]) for alternate in merged[0]["alternates"]] == [
+        (5, "llm"), (0, "rules"),
+    ]
+
+
+def test_confidence_breaks_priority_ties():
+    issues = [
+        suggestion(0, 10, "low", source="llm", confidence="low"),
+        suggestion(2, 8, "high", source="llm", confidence="High"),
+        suggestion(4, 12, "number", source="llm", confidence=0.7),
+    ]
+
+    merged = merge_suggestions(issues)
+
+    assert summary(merged) == [(2, 8, "high", "llm")]
+    assert [alternate["suggested_text"] for alternate in merged[0]["alternates"]] == ["number", "low"]
+
+
+def test_full_ties_keep_the_earlier_then_shorter_span():
+    earlier = merge_suggestions([suggestion(3, 9, "later"), suggestion(0, 6, "earlier")])
+    shorter = merge_suggestions([suggestion(0, 8, "longer"), suggestion(0, 4, "shorter")])
+
+    assert summary(earlier) == [(0, 6, "earlier", "rules")]
+    assert earlier[0]["alternates"][0]["suggested_text"] == "later"
+    assert summary(shorter) == [(0, 4, "shorter", "rules")]
+
+
+def test_displaced_suggestions_do_not_displace_others():
+    # b loses to a; c overlaps only b, so it survives
+    issues = [
+        suggestion(0, 10, "a", source="learned"),
+        suggestion(8, 15, "b", source="llm"),
+        suggestion(12, 20, "c", source="rules"),
+    ]
+
+    merged = merge_suggestions(issues)
+
+    assert summary(merged) == [(0, 10, "a", "learned"), (12, 20, "c", "rules")]
+    assert [alternate["suggested_text"] for alternate in merged[0]["alternates"]] == ["b"]
+    assert "alternates" not in merged[1]
+
+
+def test_sentence_notes_and_unlocated_issues_pass_through():
+    note = {"category": "Clarity", "original_text": "A long sentence.", "suggested_text": "", "start": 0, "end": 16}
+    unlocated = {"category": "Style", "original_text": "somewhere", "suggested_text": "else"}
+    empty = suggestion(3, 3, "inserted")
+    issues = [unlocated, suggestion(2, 6, "word"), note, empty]
+
+    merged = merge_suggestions(issues)
+
+    assert merged == [note, suggestion(2, 6, "word"), empty, unlocated]
+
+
+def test_input_issues_are_not_modified():
+    issues = [suggestion(0, 10, "a", source="learned"), suggestion(5, 15, "b")]
+    before = [dict(issue) for issue in issues]
+
+    merge_suggestions(issues)
+
+    assert issues == before
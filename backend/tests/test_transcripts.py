@@ -0,0 +1,57 @@
+import pytest
+
+import transcript_index
+import transcript_sessions
+
+
+@pytest.fixture
+def no_appends(local_storage, monkeypatch):
+    monkeypatch.setattr(transcript_index, "_indexes", {})
+
+    def append_bytes(key, data):
+        raise AssertionError(f"append to {key}")
+
+    monkeypatch.setattr(local_storage, "append_bytes", append_bytes)
+    return local_storage
+
+
+def segment(text, duration, speaker="Doctor"):
+    return {"text": text, "duration": duration, "timestamp": f"00:0{duration}", "speaker": speaker}
+
+
+def test_session_batches_are_written_as_parts_and_read_in_order(no_appends):
+    session = transcript_sessions.open_session("alice", {"startTime": "2026-01-05T10:00:00Z"})
+    session_id = session["session_id"]
+    transcript_sessions.append_segments("alice", session_id, [segment("first", 1), segment("second", 2)])
+    transcript_sessions.append_segments("alice", session_id, [segment("third", 3)])
+
+    texts = [item["text"] for item in transcript_sessions.iter_segments("alice", session_id)]
+
+    assert texts == ["first", "second", "third"]
+    _, parts = no_appends.list_dir(f"transcripts/alice/sessions/{session_id}/segments")
+    assert len(parts) == 2
+
+
+def test_finalized_session_is_searchable_from_another_worker(no_appends, monkeypatch):
+    session_id = transcript_sessions.open_session("alice")["session_id"]
+    transcript_sessions.append_segments("alice", session_id, [segment("blood pressure is normal", 1)])
+    transcript_sessions.finalize_session("alice", session_id)
+    transcript_index.index_transcript("alice", "visit.txt", {}, [segment("pressure rising", 4, "Patient")])
+
+    # A fresh process state, as on another worker
+    monkeypatch.setattr(transcript_index, "_indexes", {})
+    results = transcript_index.get_index("alice").search("pressure")
+
+    assert [result["transcript_id"] for result in results] == ["visit.txt", session_id]
+
+
+def test_legacy_logs_are_still_read(no_appends):
+    no_appends.write_text("transcripts/alice/sessions/old/session.json", '{"session_id": "old", "session_info": {}}')
+    no_appends.write_text("transcripts/alice/sessions/old/segments.jsonl", '{"text": "legacy"}\n')
+    no_appends.write_text(
+        "transcripts/alice/index/segments.jsonl",
+        '{"transcript_id": "old", "segment": 0, "time": null, "timestamp": "", "speaker": "", "text": "legacy"}\n',
+    )
+
+    assert [item["text"] for item in transcript_sessions.iter_segments("alice", "old")] == ["legacy"]
+    assert transcript_index.get_index("alice").search("legacy")[0]["transcript_id"] == "old"
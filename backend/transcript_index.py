@@ -0,0 +1,261 @@
+"""
+Keyword and time-range search over saved transcripts
+
+Each user's index is backed by JSON-lines parts in storage, one per
+indexed transcript (transcripts/{username}/index/segments/{part}.jsonl),
+holding one record per transcript segment. Saving a transcript writes one
+new object; nothing is rewritten, so a save costs the same however long
+the history is, and saves on different workers never overwrite each other.
+An index written by older versions as a single segments.jsonl log is read
+first. The parts are loaded once per process into:
+
+    - an inverted index: token -> sorted list of record ids
+    - a time index: sorted list of (absolute time, record id)
+
+Parts written by other workers are picked up by listing the directory on
+each lookup; queries never scan transcript files.
+"""
+import bisect
+import json
+import re
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from compression_utils import logical_name
+from storage import get_storage, join_key
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-case word tokens of a text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def new_part_name():
+    """Name of a new JSON-lines part; parts sort in the order they were written"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{secrets.token_hex(4)}.jsonl"
+
+
+def stored_parts(storage, directory):
+    """Stored keys of the parts in directory, oldest first"""
+    _, files = storage.list_dir(directory)
+    names = sorted(info["name"] for info in files if logical_name(info["name"]).endswith(".jsonl"))
+    return [f"{directory}/{name}" for name in names]
+
+
+def read_part(storage, stored_key):
+    """JSON records of one part"""
+    return [json.loads(line) for line in storage.read_stored_text(stored_key).splitlines() if line.strip()]
+
+
+def parse_time(value):
+    """Parse an ISO timestamp, including the trailing "Z" sent by browsers"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def segment_time(session_info, segment, fallback):
+    """
+    Absolute time of a segment
+
+    Segments carry "duration" (seconds since the session started); the
+    session start comes from session_info["startTime"], falling back to the
+    time the transcript was saved.
+    """
+    start = parse_time(session_info.get("startTime")) or fallback
+    if start is None:
+        return None
+    try:
+        offset = float(segment.get("duration") or 0)
+    except (TypeError, ValueError):
+        offset = 0.0
+    return (start + timedelta(seconds=offset)).timestamp()
+
+
+class UserTranscriptIndex:
+    """In-memory index of one user's transcript segments"""
+
+    def __init__(self, username):
+        self.username = username
+        self.legacy_key = join_key("transcripts", username, "index", "segments.jsonl")
+        self.parts_dir = join_key("transcripts", username, "index", "segments")
+        self.records = []
+        self.postings = {}
+        self.time_index = []
+        self.transcripts = set()
+        self.lock = threading.Lock()
+        self.loaded_parts = set()
+        self.legacy_loaded = False
+
+    def _add_record(self, record):
+        record_id = len(self.records)
+        self.records.append(record)
+        self.transcripts.add(record["transcript_id"])
+        for token in set(tokenize(record["text"])):
+            # Record ids only grow, so postings stay sorted without insort
+            self.postings.setdefault(token, []).append(record_id)
+        if record.get("time") is not None:
+            bisect.insort(self.time_index, (record["time"], record_id))
+
+    def refresh(self, storage):
+        """Load parts written since the last load (e.g. by other workers)"""
+        if not self.legacy_loaded:
+            if storage.resolve(self.legacy_key):
+                with storage.open_text_reader(self.legacy_key) as reader:
+                    for line in reader:
+                        if line.strip():
+                            self._add_record(json.loads(line))
+            self.legacy_loaded = True
+        for stored_key in stored_parts(storage, self.parts_dir):
+            if stored_key not in self.loaded_parts:
+                for record in read_part(storage, stored_key):
+                    self._add_record(record)
+                self.loaded_parts.add(stored_key)
+
+    def add_segments(self, storage, transcript_id, session_info, segments, saved_at):
+        """Write a transcript's segments as a new part and add them to the in-memory index"""
+        with self.lock:
+            self.refresh(storage)
+            if transcript_id in self.transcripts:
+                return 0
+            records = []
+            for position, segment in enumerate(segments):
+                text = str(segment.get("text", ""))
+                if not text.strip():
+                    continue
+                records.append({
+                    "transcript_id": transcript_id,
+                    "segment": position,
+                    "time": segment_time(session_info, segment, saved_at),
+                    "timestamp": segment.get("timestamp", ""),
+                    "speaker": segment.get("speaker", ""),
+                    "text": text,
+                })
+            if not records:
+                return 0
+            lines = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+            stored_key = storage.write_text(f"{self.parts_dir}/{new_part_name()}", lines)
+            for record in records:
+                self._add_record(record)
+            self.loaded_parts.add(stored_key)
+            return len(records)
+
+    def _time_candidates(self, start, end):
+        low = bisect.bisect_left(self.time_index, (start, -1)) if start is not None else 0
+        high = bisect.bisect_right(self.time_index, (end, len(self.records))) if end is not None else len(self.time_index)
+        return {record_id for _, record_id in self.time_index[low:high]}
+
+    def search(self, query="", start=None, end=None, speaker=None, limit=50):
+        """
+        Find segments matching all query terms within an optional time range
+
+        A query in double quotes must match as a contiguous phrase.
+
+        Returns:
+            list: Matching records, newest first
+        """
+        phrase = None
+        query = (query or "").strip()
+        if len(query) >= 2 and query.startswith('"') and query.endswith('"'):
+            phrase = " ".join(tokenize(query[1:-1]))
+        tokens = tokenize(query)
+
+        with self.lock:
+            candidates = None
+            # Intersect the shortest posting lists first
+            for token in sorted(set(tokens), key=lambda t: len(self.postings.get(t, []))):
+                posting = self.postings.get(token)
+                if not posting:
+                    return []
+                candidates = set(posting) if candidates is None else candidates.intersection(posting)
+                if not candidates:
+                    return []
+
+            if start is not None or end is not None:
+                in_range = self._time_candidates(start, end)
+                candidates = in_range if candidates is None else candidates & in_range
+
+            if candidates is None:
+                candidates = range(len(self.records))
+
+            results = []
+            speaker = speaker.lower() if speaker else None
+            for record_id in sorted(candidates, reverse=True):
+                record = self.records[record_id]
+                if speaker and record["speaker"].lower() != speaker:
+                    continue
+                if phrase and f" {phrase} " not in f" {' '.join(tokenize(record['text']))} ":
+                    continue
+                results.append(record)
+                if len(results) >= limit:
+                    break
+            return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(username):
+    """Return the loaded index for a user, reading its log on first use"""
+    with _indexes_lock:
+        index = _indexes.get(username)
+        if index is None:
+            index = _indexes[username] = UserTranscriptIndex(username)
+    with index.lock:
+        index.refresh(get_storage())
+    return index
+
+
+def index_transcript(username, transcript_id, session_info, segments, saved_at=None):
+    """Add a saved transcript's segments to the user's index"""
+    index = get_index(username)
+    return index.add_segments(get_storage(), transcript_id, session_info or {}, segments or [], saved_at or datetime.now())
+
+
+def reindex_user(username):
+    """
+    Backfill the index from transcripts and sessions saved before indexing existed
+
+    Already-indexed transcripts are skipped, so this is safe to re-run.
+
+    Returns:
+        int: Number of segments added
+    """
+    import transcript_sessions
+
+    storage = get_storage()
+    added = 0
+    user_dir = join_key("transcripts", username)
+    session_ids, files = storage.list_dir(user_dir)
+    for info in files:
+        name = logical_name(info["name"])
+        if not name.endswith("_metadata.json"):
+            continue
+        metadata = json.loads(storage.read_text(f"{user_dir}/{name}"))
+        added += index_transcript(
+            username,
+            metadata.get("transcript_file") or name,
+            metadata.get("session_info", {}),
+            metadata.get("segments", []),
+            datetime.fromtimestamp(info["modified"]),
+        )
+
+    if "sessions" in session_ids:
+        for session_id in storage.list_dir(f"{user_dir}/sessions")[0]:
+            session = transcript_sessions.get_session(username, session_id)
+            if session.get("finalized"):
+                added += index_transcript(
+                    username,
+                    session_id,
+                    session.get("session_info", {}),
+                    list(transcript_sessions.iter_segments(username, session_id)),
+                    parse_time(session.get("opened_at")),
+                )
+    return added
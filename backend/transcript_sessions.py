@@ -0,0 +1,158 @@
+"""
+Append-only transcript sessions
+
+A session is stored under transcripts/{username}/sessions/{session_id}/:
+
+    session.json     - session info and state (small, rewritten on open/finalize)
+    segments/        - one JSON-lines part per appended batch, one segment per
+                       line; parts sort in the order they were written
+    transcript.txt   - full transcript text, materialized on first read after
+                       finalize
+
+Appending a batch writes one new object, independent of how long the session
+already is; nothing is read back or rewritten, which S3 could not do
+atomically. Sessions from older versions keep their single segments.jsonl,
+which is read before any parts.
+"""
+import json
+import secrets
+from datetime import datetime
+
+from storage import get_storage, join_key
+import transcript_index
+from transcript_index import new_part_name, parse_time, read_part, stored_parts
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionFinalized(Exception):
+    pass
+
+
+def _session_dir(username, session_id):
+    return join_key("transcripts", username, "sessions", session_id)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _load_session(storage, username, session_id):
+    session_key = f"{_session_dir(username, session_id)}/session.json"
+    try:
+        return json.loads(storage.read_text(session_key))
+    except FileNotFoundError:
+        raise SessionNotFound(session_id)
+
+
+def get_session(username, session_id):
+    """Return the stored session record"""
+    return _load_session(get_storage(), username, session_id)
+
+
+def open_session(username, session_info=None):
+    """
+    Start a new transcript session
+
+    Args:
+        username (str): Owner of the session
+        session_info (dict): Client-provided session details (start time, patient, ...)
+
+    Returns:
+        dict: The stored session record, including its session_id
+    """
+    storage = get_storage()
+    session_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
+    session = {
+        "session_id": session_id,
+        "username": username,
+        "session_info": session_info or {},
+        "opened_at": datetime.now().isoformat(),
+        "finalized": False,
+    }
+    storage.write_text(f"{_session_dir(username, session_id)}/session.json", _dumps(session))
+    return session
+
+
+def append_segments(username, session_id, segments):
+    """
+    Append a batch of segments to an open session
+
+    Returns:
+        int: Number of segments appended
+    """
+    storage = get_storage()
+    session = _load_session(storage, username, session_id)
+    if session.get("finalized"):
+        raise SessionFinalized(session_id)
+    if not segments:
+        return 0
+    lines = "".join(_dumps(segment) + "\n" for segment in segments)
+    storage.write_text(f"{_session_dir(username, session_id)}/segments/{new_part_name()}", lines)
+    return len(segments)
+
+
+def iter_segments(username, session_id):
+    """Stream the segments of a session in the order they were appended"""
+    storage = get_storage()
+    session_dir = _session_dir(username, session_id)
+    legacy_key = f"{session_dir}/segments.jsonl"
+    if storage.resolve(legacy_key):
+        with storage.open_text_reader(legacy_key) as reader:
+            for line in reader:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    for stored_key in stored_parts(storage, f"{session_dir}/segments"):
+        yield from read_part(storage, stored_key)
+
+
+def finalize_session(username, session_id, session_info=None):
+    """
+    Close a session to further appends
+
+    The transcript text itself is not built here; it is materialized by the
+    first call to get_transcript_text.
+
+    Returns:
+        dict: The updated session record
+    """
+    storage = get_storage()
+    session = _load_session(storage, username, session_id)
+    if session.get("finalized"):
+        return session
+    if session_info:
+        session["session_info"].update(session_info)
+    session["finalized"] = True
+    session["finalized_at"] = datetime.now().isoformat()
+    segments = list(iter_segments(username, session_id))
+    session["total_segments"] = len(segments)
+    storage.write_text(f"{_session_dir(username, session_id)}/session.json", _dumps(session))
+    transcript_index.index_transcript(username, session_id, session["session_info"], segments, parse_time(session["opened_at"]))
+    return session
+
+
+def format_segment(segment):
+    """Render a segment the same way the transcriber UI does"""
+    return f"[{segment.get('timestamp', '')}] {segment.get('speaker', 'Unknown')}: {segment.get('text', '')}\n\n"
+
+
+def get_transcript_text(username, session_id):
+    """
+    Return the full transcript text of a session
+
+    Finalized sessions cache the materialized text so it is only built once;
+    open sessions are rendered from the segments on every call.
+    """
+    storage = get_storage()
+    session = _load_session(storage, username, session_id)
+    transcript_key = f"{_session_dir(username, session_id)}/transcript.txt"
+    if session.get("finalized") and storage.resolve(transcript_key):
+        return storage.read_text(transcript_key)
+
+    text = "".join(format_segment(segment) for segment in iter_segments(username, session_id))
+    if session.get("finalized"):
+        storage.write_text(transcript_key, text)
+    return text